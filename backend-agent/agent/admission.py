@@ -0,0 +1,267 @@
+"""
+Controle de admissão do chat
+Limite global de perguntas em processamento, fila limitada com prazo, justiça
+entre sessões e recusa rápida (429/503 com Retry-After) quando saturado
+"""
+
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import asyncio
+import math
+import os
+import time
+
+from .metrics import ADMISSION, ADMISSION_WAIT_SECONDS
+
+
+class AdmissionRejected(Exception):
+    """Pergunta recusada pelo controle de admissão (status HTTP + Retry-After em segundos)"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Vagas ocupadas por uma pergunta (ou lote) admitida; release() devolve as vagas (idempotente)"""
+
+    def __init__(self, controller: "AdmissionController", key: str, weight: int = 1):
+        self._controller = controller
+        self._key = key
+        self.weight = weight
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        # Tempo de um lote não é tempo de uma pergunta: fica fora da média do Retry-After
+        seconds = time.monotonic() - self._started if self.weight == 1 else None
+        self._controller._release(self._key, self.weight, seconds)
+
+    async def __aenter__(self) -> "AdmissionTicket":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """
+    Admissão das perguntas antes do TaticoProAgent
+
+    Até max_in_flight perguntas são processadas ao mesmo tempo; as demais
+    esperam numa fila de até max_queue posições, atendida em rodízio entre
+    sessões (uma sessão com muitas perguntas não passa na frente das outras).
+    Cada sessão tem no máximo max_per_session perguntas entre processamento e
+    fila. Quem não cabe, ou esperaria além do prazo (queue_timeout ou o prazo
+    do cliente, descontado o tempo médio de resposta), é recusado na hora, antes
+    de gastar tokens. Retry-After vem do tempo médio de resposta recente.
+
+    Roda no event loop do worker (sem locks): cada processo uvicorn tem o seu.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 64,
+        queue_timeout_ms: float = 5000,
+        max_per_session: int = 2
+    ):
+        """
+        Configurar limites
+
+        Args:
+            max_in_flight: Perguntas processadas ao mesmo tempo
+            max_queue: Perguntas esperando vaga (0 = recusar quando cheio)
+            queue_timeout_ms: Espera máxima na fila
+            max_per_session: Perguntas por sessão entre processamento e fila (0 = sem limite)
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.max_per_session = max_per_session
+        self.in_flight = 0
+        self._queue: "OrderedDict[str, Deque[Tuple[int, asyncio.Future]]]" = OrderedDict()  # rodízio por sessão
+        self._queued = 0
+        self._per_session: Dict[str, int] = {}
+        self._service_seconds: Optional[float] = None  # média móvel (EWMA) do tempo de resposta
+        self.admitted = 0
+        self.queued_total = 0
+        self.shed: Dict[str, int] = {
+            "queue_full": 0,
+            "session_limit": 0,
+            "queue_timeout": 0,
+            "deadline": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> Optional["AdmissionController"]:
+        """Criar a partir das variáveis ADMISSION_* (None se ADMISSION_ENABLED=false)"""
+        if os.getenv("ADMISSION_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+            queue_timeout_ms=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "5000")),
+            max_per_session=int(os.getenv("ADMISSION_MAX_PER_SESSION", "2"))
+        )
+
+    def _estimated_wait(self, position: int) -> float:
+        """Espera estimada para a posição position da fila (vagas liberadas em paralelo)"""
+        service = self._service_seconds or 0.0
+        return math.ceil(position / self.max_in_flight) * service
+
+    def _retry_after(self, position: int) -> int:
+        return max(1, math.ceil(self._estimated_wait(position) or (self._service_seconds or 1.0)))
+
+    def _reject(self, status_code: int, reason: str, position: int, message: str) -> AdmissionRejected:
+        self.shed[reason] += 1
+        ADMISSION.inc(outcome=reason)
+        retry_after = self._retry_after(position)
+        print(f"🚦 Pergunta recusada ({reason}): em processamento={self.in_flight} fila={self._queued} retry_after={retry_after}s")
+        return AdmissionRejected(status_code, reason, retry_after, message)
+
+    async def acquire(
+        self,
+        key: str,
+        client_timeout: Optional[float] = None,
+        limit_session: bool = True,
+        weight: int = 1
+    ) -> AdmissionTicket:
+        """
+        Obter vaga para uma pergunta (esperando na fila se preciso)
+
+        Args:
+            key: Chave de justiça (session_id ou identidade do cliente)
+            client_timeout: Prazo restante do cliente em segundos (None = só queue_timeout)
+            limit_session: Aplicar max_per_session à chave (False para chaves
+                compartilhadas por vários usuários, ex: IP atrás de proxy/NAT)
+            weight: Vagas ocupadas (lotes: itens processados em paralelo; limitado a max_in_flight)
+
+        Returns:
+            AdmissionTicket (chamar release() ao terminar)
+
+        Raises:
+            AdmissionRejected: 429 (limite da sessão) ou 503 (fila cheia / prazo)
+        """
+        weight = max(1, min(weight, self.max_in_flight))
+        active = self._per_session.get(key, 0)
+        if limit_session and self.max_per_session > 0 and active + weight > self.max_per_session:
+            raise self._reject(
+                429, "session_limit", 1,
+                f"Muitas perguntas em andamento nesta sessão (máximo {self.max_per_session})"
+            )
+
+        if self.in_flight + weight <= self.max_in_flight and not self._queued:
+            self.in_flight += weight
+            self._per_session[key] = active + weight
+            return self._grant(key, weight, 0.0)
+
+        position = self._queued + 1
+        if self._queued >= self.max_queue:
+            raise self._reject(503, "queue_full", position, "Servidor ocupado, tente novamente em instantes")
+
+        wait_budget = self.queue_timeout
+        if client_timeout is not None:
+            # Só vale esperar se ainda der tempo de responder dentro do prazo do cliente
+            wait_budget = min(wait_budget, client_timeout - (self._service_seconds or 0.0))
+            if wait_budget <= 0 or self._estimated_wait(position) > wait_budget:
+                raise self._reject(503, "deadline", position, "Servidor ocupado: a resposta não sairia dentro do prazo")
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (weight, waiter)
+        self._queue.setdefault(key, deque()).append(entry)
+        self._queued += 1
+        self._per_session[key] = active + weight  # conta já na fila (limite por sessão)
+        self.queued_total += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=wait_budget)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                pass  # vaga concedida junto com o timeout: segue admitido
+            else:
+                self._dequeue(key, entry)
+                raise self._reject(503, "queue_timeout", self._queued + 1, "Servidor ocupado, tente novamente em instantes")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(key, weight, None)  # cliente desistiu depois de ganhar a vaga
+            else:
+                self._dequeue(key, entry)
+            raise
+        return self._grant(key, weight, time.monotonic() - queued_at)
+
+    def _grant(self, key: str, weight: int, waited: float) -> AdmissionTicket:
+        # Vagas já contadas em acquire (sessão) e em acquire/_dispatch (in_flight)
+        self.admitted += 1
+        ADMISSION.inc(outcome="admitted")
+        ADMISSION_WAIT_SECONDS.observe(waited)
+        return AdmissionTicket(self, key, weight)
+
+    def _dequeue(self, key: str, entry: Tuple[int, asyncio.Future]) -> None:
+        """Tirar da fila quem desistiu (timeout ou cliente desconectado)"""
+        weight, waiter = entry
+        waiter.cancel()
+        waiters = self._queue.get(key)
+        if waiters is not None and entry in waiters:
+            waiters.remove(entry)
+            self._queued -= 1
+            if not waiters:
+                del self._queue[key]
+        self._leave_session(key, weight)
+        self._dispatch()  # um lote grande na frente pode ter liberado espaço para os próximos
+
+    def _leave_session(self, key: str, weight: int) -> None:
+        remaining = self._per_session.get(key, 0) - weight
+        if remaining > 0:
+            self._per_session[key] = remaining
+        else:
+            self._per_session.pop(key, None)
+
+    def _release(self, key: str, weight: int, service_seconds: Optional[float]) -> None:
+        self.in_flight -= weight
+        self._leave_session(key, weight)
+        if service_seconds is not None:
+            previous = self._service_seconds
+            self._service_seconds = service_seconds if previous is None else 0.8 * previous + 0.2 * service_seconds
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """
+        Passar vagas livres para a fila, uma sessão por vez (rodízio)
+
+        Um lote na vez espera vagas suficientes para o seu peso (sem ser
+        ultrapassado, para não ficar para trás indefinidamente).
+        """
+        while self._queue:
+            key, waiters = next(iter(self._queue.items()))
+            weight, waiter = waiters[0]
+            if not waiter.done() and self.in_flight + weight > self.max_in_flight:
+                return
+            waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._queue.move_to_end(key)  # próxima da mesma sessão vai para o fim do rodízio
+            else:
+                del self._queue[key]
+            if waiter.done():
+                continue
+            self.in_flight += weight
+            waiter.set_result(True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self._queued,
+            "queued_sessions": len(self._queue),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "shed": dict(self.shed),
+            "avg_service_ms": round(self._service_seconds * 1000, 1) if self._service_seconds is not None else None,
+        }
@@ -0,0 +1,162 @@
+"""
+Cache em memória com LRU + TTL
+Usado para respostas do agente e resultados de SQL
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Cache LRU com expiração por tempo e contadores de hit/miss
+
+    Seguro para uso a partir do event loop e do pool de threads do LlamaSQLRetriever.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Inicializar cache
+
+        Args:
+            maxsize: Número máximo de entradas (0 desativa o cache)
+            ttl: Tempo de vida de cada entrada em segundos
+            clock: Fonte de tempo (injetável para testes)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Buscar entrada válida
+
+        Args:
+            key: Chave
+
+        Returns:
+            Valor armazenado ou None (ausente/expirado)
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, _ = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        """
+        Armazenar entrada (remove a menos usada se o cache estiver cheio)
+
+        Args:
+            key: Chave
+            value: Valor
+            tags: Rótulos para invalidação seletiva (ex: tabelas lidas)
+        """
+        if not self.enabled:
+            return
+
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, self._clock() + self.ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        """Remover entrada e seus rótulos (chamar com o lock adquirido)"""
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> int:
+        """
+        Remover uma entrada ou limpar o cache inteiro
+
+        Args:
+            key: Chave a remover (None limpa tudo)
+
+        Returns:
+            Número de entradas removidas
+        """
+        with self._lock:
+            if key is None:
+                removed = len(self._data)
+                self._data.clear()
+                self._tags.clear()
+                return removed
+            if key not in self._data:
+                return 0
+            self._remove(key)
+            return 1
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Remover todas as entradas marcadas com algum dos rótulos
+
+        Args:
+            tags: Rótulos (ex: nomes de tabelas atualizadas)
+
+        Returns:
+            Número de entradas removidas
+        """
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Contadores do cache
+
+        Returns:
+            Dict com tamanho, hits, misses, hit rate e evictions
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+        }
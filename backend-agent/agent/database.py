@@ -0,0 +1,125 @@
+"""
+Conexões com o banco de dados
+Cria engines SQLAlchemy (síncrono e assíncrono) com pool configurável
+"""
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from typing import Any, Dict, Optional
+import os
+
+
+def get_pool_settings() -> Dict[str, Any]:
+    """
+    Ler configurações do pool de conexões das variáveis de ambiente
+
+    Returns:
+        Dict com tamanho do pool, overflow, timeouts e cache de statements
+    """
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000")),
+        "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")),
+    }
+
+
+def _is_postgres(database_url: str) -> bool:
+    return make_url(database_url).get_backend_name() == "postgresql"
+
+
+def _pool_kwargs(settings: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+        "pool_timeout": settings["pool_timeout"],
+        "pool_recycle": settings["pool_recycle"],
+        "pool_pre_ping": True,
+    }
+
+
+def create_sync_engine(database_url: str) -> Engine:
+    """
+    Criar engine síncrono (usado pelo LlamaIndex)
+
+    Args:
+        database_url: URL de conexão PostgreSQL
+
+    Returns:
+        Engine SQLAlchemy com pool e statement_timeout configurados
+    """
+    if not _is_postgres(database_url):
+        return create_engine(database_url)
+
+    settings = get_pool_settings()
+    return create_engine(
+        database_url,
+        connect_args={"options": f"-c statement_timeout={settings['statement_timeout_ms']}"},
+        **_pool_kwargs(settings)
+    )
+
+
+def to_async_url(database_url: str) -> Optional[str]:
+    """
+    Converter URL síncrona para o driver assíncrono equivalente
+
+    Args:
+        database_url: URL de conexão (postgresql:// ou sqlite://)
+
+    Returns:
+        URL com driver asyncpg/aiosqlite, ou None se não houver driver assíncrono
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend == "postgresql":
+        query = dict(url.query)
+        # asyncpg não entende "sslmode" (parâmetro da libpq)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    else:
+        return None
+
+    return url.render_as_string(hide_password=False)
+
+
+def create_async_db_engine(database_url: str) -> Optional[AsyncEngine]:
+    """
+    Criar engine assíncrono (asyncpg) com pool, reuso de prepared statements e timeout
+
+    Args:
+        database_url: URL de conexão PostgreSQL
+
+    Returns:
+        AsyncEngine, ou None se o driver assíncrono não estiver disponível
+    """
+    async_url = to_async_url(database_url)
+    if not async_url:
+        return None
+
+    try:
+        if not _is_postgres(database_url):
+            return create_async_engine(async_url)
+
+        settings = get_pool_settings()
+        url = make_url(async_url).update_query_dict({
+            "prepared_statement_cache_size": str(settings["statement_cache_size"])
+        })
+        return create_async_engine(
+            url,
+            connect_args={
+                "server_settings": {
+                    "statement_timeout": str(settings["statement_timeout_ms"])
+                }
+            },
+            **_pool_kwargs(settings)
+        )
+    except ImportError as e:
+        print(f"⚠️ Driver assíncrono indisponível ({str(e)}), usando engine síncrono")
+        return None
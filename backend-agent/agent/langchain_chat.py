@@ -6,111 +6,25 @@ Responsável pela interface conversacional com o usuário
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import asyncio
+import time
 import uuid
 import os
 
-class TaticoProAgent:
-    """
-    Agente conversacional do Tático Pro
-    Usa LangChain para manter contexto e LlamaIndex para queries SQL
-    """
-    
-    def __init__(self, llama_sql):
-        """
-        Inicializar agente
-        
-        Args:
-            llama_sql: Instância do LlamaSQLRetriever
-        """
-        self.llama_sql = llama_sql
-        self.sessions = {}  # Memória por sessão (InMemoryChatMessageHistory)
-        
-        # Configurar LLM principal (GPT-4o - mais recente)
-        self.llm = ChatOpenAI(
-            model="gpt-4o",  # GPT-4o - modelo mais recente e rápido
-            temperature=0.7,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        
-        print("✅ TaticoProAgent inicializado")
-    
-    def get_or_create_session(self, session_id: Optional[str] = None) -> tuple:
-        """
-        Obter ou criar sessão de conversa
-        
-        Args:
-            session_id: ID da sessão (opcional)
-            
-        Returns:
-            Tuple (session_id, chat_history)
-        """
-        if session_id and session_id in self.sessions:
-            return session_id, self.sessions[session_id]
-        
-        # Criar nova sessão
-        new_session_id = session_id or str(uuid.uuid4())
-        chat_history = InMemoryChatMessageHistory()
-        self.sessions[new_session_id] = chat_history
-        
-        return new_session_id, chat_history
-    
-    async def process_message(
-        self,
-        user_message: str,
-        conversation_history: List[Dict] = None,
-        session_id: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """
-        Processar mensagem do usuário
-        
-        Args:
-            user_message: Mensagem do usuário
-            conversation_history: Histórico de conversa
-            session_id: ID da sessão
-            
-        Returns:
-            Dict com resposta e metadados
-        """
-        try:
-            # Obter/criar sessão
-            session_id, chat_history = self.get_or_create_session(session_id)
-            
-            # Restaurar histórico na memória
-            if conversation_history:
-                for msg in conversation_history[-5:]:  # Últimas 5 mensagens apenas
-                    # Acessar atributos do objeto Pydantic ou dicionário
-                    role = msg.role if hasattr(msg, 'role') else msg['role']
-                    content = msg.content if hasattr(msg, 'content') else msg['content']
-                    
-                    if role == 'user':
-                        chat_history.add_message(HumanMessage(content=content))
-                    else:
-                        chat_history.add_message(AIMessage(content=content))
-            
-            # Detectar se é uma pergunta que precisa de dados
-            needs_data = self.requires_database_query(user_message)
-            
-            sql_query = None
-            data_preview = None
-            database_context = ""
-            
-            if needs_data:
-                # Usar LlamaIndex para buscar dados
-                print(f"🔍 Pergunta requer dados do banco...")
-                query_result = await self.llama_sql.natural_language_query(user_message)
-                
-                print(f"📊 Resultado da query: {query_result}")  # DEBUG
-                
-                if query_result['success']:
-                    database_context = f"\n\n**DADOS REAIS DO BANCO DE DADOS:**\n{query_result['answer']}\n\n**INSTRUÇÕES CRÍTICAS:**\n- Use EXATAMENTE os nomes de times/jogadores que aparecem acima\n- NÃO invente ou generalize nomes (não use 'Time A', 'Time B', etc)\n- Cite os números EXATOS fornecidos\n- NÃO diga que não tem acesso aos dados!"
-                    sql_query = query_result.get('sql_query')
-                    print(f"✅ Dados obtidos: {database_context[:500]}...")  # DEBUG - aumentei para ver mais
-            
-            # Gerar resposta usando LLM diretamente
-            system_prompt = """Você é o **Agente Inteligente do Tático Pro**, um assistente especializado em análise tática de futebol.
+from .cache import TTLCache
+from .metrics import log_sampled, record_stage, stage, traced_request
+from .normalize import normalize_question
+from .prompt import PromptAssembler
+from .router import IntentRouter, RouteDecision
+from .sessions import create_session_store, merge_history
+from .singleflight import SingleFlight
+from .sql_utils import referenced_tables
+
+# Prompt de sistema do agente (igual em todas as requisições)
+SYSTEM_PROMPT = """Você é o **Agente Inteligente do Tático Pro**, um assistente especializado em análise tática de futebol.
 
 Você tem acesso a um banco de dados completo com:
 - Jogos do Brasileirão 2024
@@ -173,43 +87,475 @@ Em seguida temos:
 
 **LEMBRE-SE: Se os dados foram fornecidos, USE-OS EXPLICITAMENTE NA RESPOSTA!**"""
 
-            # Montar mensagens
-            messages = [
-                HumanMessage(content=system_prompt)
-            ]
+class TaticoProAgent:
+    """
+    Agente conversacional do Tático Pro
+    Usa LangChain para manter contexto e LlamaIndex para queries SQL
+    """
+    
+    def __init__(self, llama_sql):
+        """
+        Inicializar agente
+        
+        Args:
+            llama_sql: Instância do LlamaSQLRetriever
+        """
+        self.llama_sql = llama_sql
+        # Memória por sessão (limitada por LRU + TTL; memory ou sqlite via SESSION_BACKEND)
+        self.sessions = create_session_store()
+        self.history_sync_window = int(os.getenv("HISTORY_SYNC_WINDOW", "10"))
+        
+        # Roteador de intenções (entidades carregadas do banco em load_router_entities)
+        self.router = IntentRouter()
+        
+        # Configurar LLM principal (GPT-4o - mais recente), no mesmo pool HTTP do LlamaIndex
+        transport = llama_sql.llm_transport
+        answer_deadline = transport.stage_deadline("answer", 60)
+        self.llm = ChatOpenAI(
+            model="gpt-4o",  # GPT-4o - modelo mais recente e rápido
+            temperature=0.7,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=transport.base_url,
+            timeout=answer_deadline,
+            max_retries=0,  # retries no transporte compartilhado
+            http_client=transport.client("answer", answer_deadline),
+            http_async_client=transport.async_client("answer", answer_deadline),
+            stream_usage=True  # tokens também no streaming (métricas)
+        )
+        
+        # Cache de respostas para perguntas de dados (chave = pergunta normalizada)
+        self.answer_cache = TTLCache(
+            maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+        )
+        
+        # Perguntas de dados idênticas em andamento compartilham a mesma resposta
+        self.inflight = SingleFlight()
+        
+        # Prompt com orçamento de tokens (prompt de sistema sempre como prefixo fixo)
+        self.prompt = PromptAssembler(
+            SYSTEM_PROMPT,
+            max_tokens=int(os.getenv("PROMPT_MAX_TOKENS", "6000")),
+            history_tokens=int(os.getenv("PROMPT_HISTORY_TOKENS", "1500")),
+            context_tokens=int(os.getenv("PROMPT_CONTEXT_TOKENS", "3000"))
+        )
+        
+        print("✅ TaticoProAgent inicializado")
+    
+    def invalidate_cache(self, tables: Optional[List[str]] = None) -> int:
+        """
+        Limpar cache de respostas (chamar quando as tabelas forem atualizadas)
+        
+        Args:
+            tables: Tabelas atualizadas (None limpa tudo)
+            
+        Returns:
+            Número de respostas removidas
+        """
+        if tables is None:
+            removed = self.answer_cache.invalidate()
+        else:
+            removed = self.answer_cache.invalidate_tags(tables)
+        print(f"🧹 Cache de respostas invalidado ({removed} entradas)")
+        return removed
+    
+    def get_or_create_session(self, session_id: Optional[str] = None) -> tuple:
+        """
+        Obter ou criar sessão de conversa
+        
+        Args:
+            session_id: ID da sessão (opcional)
+            
+        Returns:
+            Tuple (session_id, chat_history)
+        """
+        return self.sessions.get_or_create(session_id)
+    
+    async def _session_io(self, func, *args):
+        """
+        Executar uma operação do SessionStore (em thread quando o backend bloqueia, ex: sqlite)
+        
+        Args:
+            func: Função síncrona do store/histórico
+            *args: Argumentos da função
+            
+        Returns:
+            Retorno de func
+        """
+        if self.sessions.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+    
+    def _load_session(self, session_id: Optional[str], client_messages: List) -> tuple:
+        """
+        Obter a sessão, sincronizar o histórico do cliente e ler as mensagens (uma ida ao store)
+        
+        Returns:
+            Tuple (session_id, chat_history, mensagens do histórico)
+        """
+        session_id, chat_history = self.get_or_create_session(session_id)
+        if client_messages:
+            # Só entram mensagens que o servidor ainda não tem
+            merge_history(chat_history, client_messages)
+        return session_id, chat_history, chat_history.messages
+    
+    async def session_stats(self) -> Dict[str, Any]:
+        """Contadores do SessionStore (sem bloquear o event loop)"""
+        return await self._session_io(self.sessions.stats)
+    
+    async def _prepare_turn(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Preparar o turno: sessão, histórico, roteamento e cache de respostas
+        
+        Returns:
+            Dict de estado do turno (com "cached" preenchido em caso de hit)
+        """
+        # Histórico enviado pelo cliente (sincronizado com o da sessão)
+        client_messages = []
+        for msg in (conversation_history or [])[-self.history_sync_window:]:
+            # Acessar atributos do objeto Pydantic ou dicionário
+            role = msg.role if hasattr(msg, 'role') else msg['role']
+            content = msg.content if hasattr(msg, 'content') else msg['content']
             
-            # Adicionar histórico
-            messages.extend(chat_history.messages[-6:])  # Últimas 6 mensagens
+            if role == 'user':
+                client_messages.append(HumanMessage(content=content))
+            else:
+                client_messages.append(AIMessage(content=content))
+        
+        # Obter/criar sessão
+        session_id, chat_history, history = await self._session_io(
+            self._load_session, session_id, client_messages
+        )
+        
+        # Detectar se é uma pergunta que precisa de dados (e quais times/jogadores cita)
+        with stage("routing"):
+            route = self.route_message(user_message)
+        needs_data = route.needs_data
+        
+        turn = {
+            "user_message": user_message,
+            "session_id": session_id,
+            "chat_history": chat_history,
+            "history": history,
+            "needs_data": needs_data,
+            # Sem histórico o prompt depende só da pergunta e dos dados: resposta reaproveitável
+            "history_free": not history,
+            "route": route,
+            "cache_key": None,
+            "cached": None,
+            "sql_query": None,
+            "data_preview": None,
+            "database_context": "",
+            "prompt_tokens": None
+        }
+        
+        if needs_data:
+            turn["cache_key"] = normalize_question(user_message)
+            # Respostas geradas com histórico dependem da conversa ("e contra o Palmeiras?"):
+            # o cache só serve e guarda turnos sem histórico
+            cached = self.answer_cache.get(turn["cache_key"]) if turn["history_free"] else None
+            if cached is not None:
+                log_sampled(f"⚡ Resposta servida do cache: '{turn['cache_key']}'")
+                await self._session_io(chat_history.add_messages, [
+                    HumanMessage(content=user_message),
+                    AIMessage(content=cached["response"])
+                ])
+                turn["cached"] = {**cached, "session_id": session_id}
+        
+        return turn
+    
+    async def _fetch_data(self, turn: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Buscar dados no banco via LlamaIndex e montar o contexto do prompt
+        
+        Args:
+            turn: Estado do turno (atualizado in-place)
             
-            # Adicionar pergunta atual
-            full_question = user_message + database_context
-            messages.append(HumanMessage(content=full_question))
+        Returns:
+            Resultado bruto do LlamaSQLRetriever
+        """
+        # Usar LlamaIndex para buscar dados
+        query_result = await self.llama_sql.natural_language_query(
+            turn["user_message"],
+            route=turn["route"]
+        )
+        
+        if query_result['success']:
+            turn["database_context"] = query_result['answer'] or ""
+            turn["sql_query"] = query_result.get('sql_query')
+            turn["data_preview"] = query_result.get('data')
+            log_sampled(f"✅ Dados obtidos: {turn['database_context'][:500]}...")
+        else:
+            turn["cache_key"] = None  # Não guardar respostas sem dados reais
+        
+        return query_result
+    
+    def _build_messages(self, turn: Dict[str, Any]) -> list:
+        """
+        Montar mensagens para o LLM (system prompt + histórico + pergunta com dados)
+        
+        Args:
+            turn: Estado do turno (recebe "prompt_tokens")
             
-            # Gerar resposta
-            response = await self.llm.ainvoke(messages)
-            final_response = response.content
+        Returns:
+            Lista de mensagens LangChain
+        """
+        messages, info = self.prompt.build(
+            turn["history"],
+            turn["user_message"],
+            turn["database_context"]
+        )
+        turn["prompt_tokens"] = info["prompt_tokens"]
+        if info["history_dropped"] or info["context_truncated"]:
+            log_sampled(
+                f"✂️ Prompt: {info['prompt_tokens']} tokens, {info['history_messages']} mensagens de histórico "
+                f"({info['history_dropped']} resumidas), dados cortados: {info['context_truncated']}"
+            )
+        return messages
+    
+    async def _finish_turn(self, turn: Dict[str, Any], final_response: str) -> Dict[str, Any]:
+        """
+        Salvar resposta na memória/cache e montar o payload final
+        
+        Args:
+            turn: Estado do turno
+            final_response: Texto gerado pelo LLM
             
-            # Salvar na memória
-            chat_history.add_message(HumanMessage(content=user_message))
-            chat_history.add_message(AIMessage(content=final_response))
+        Returns:
+            Dict com resposta e metadados (campos do ChatResponse)
+        """
+        await self._session_io(turn["chat_history"].add_messages, [
+            HumanMessage(content=turn["user_message"]),
+            AIMessage(content=final_response)
+        ])
+        
+        result = {
+            "response": final_response,
+            "sql_query": turn["sql_query"],
+            "data_preview": turn["data_preview"]
+        }
+        
+        if turn["cache_key"] and turn["history_free"]:
+            self.answer_cache.set(
+                turn["cache_key"],
+                result,
+                tags=referenced_tables(turn["sql_query"] or "", self.llama_sql.include_tables)
+                or self.llama_sql.include_tables
+            )
+        
+        return {**result, "prompt_tokens": turn["prompt_tokens"], "session_id": turn["session_id"]}
+    
+    def _error_payload(self, session_id: Optional[str]) -> Dict[str, Any]:
+        return {
+            "response": f"Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente.",
+            "sql_query": None,
+            "data_preview": None,
+            "prompt_tokens": None,
+            "session_id": session_id or str(uuid.uuid4())
+        }
+    
+    async def process_message(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Processar mensagem do usuário
+        
+        Args:
+            user_message: Mensagem do usuário
+            conversation_history: Histórico de conversa
+            session_id: ID da sessão
             
-            return {
-                "response": final_response,
-                "sql_query": sql_query,
-                "data_preview": data_preview,
-                "session_id": session_id
-            }
+        Returns:
+            Dict com resposta e metadados
+        """
+        with traced_request("chat") as trace:
+            try:
+                turn = await self._prepare_turn(user_message, conversation_history, session_id)
+                if turn["cached"]:
+                    return turn["cached"]
+                
+                if turn["cache_key"] and turn["history_free"]:
+                    # Mesma pergunta já em andamento (ex: início de jogo): aguardar a mesma execução.
+                    # Só turnos sem histórico: o prompt (e a resposta) é o mesmo para todas as sessões
+                    shared, coalesced = await self.inflight.do(
+                        turn["cache_key"],
+                        lambda: self._answer_with_data(turn)
+                    )
+                    if coalesced:
+                        log_sampled(f"🔗 Resposta compartilhada com requisição em andamento: '{turn['cache_key']}'")
+                    turn.update(shared["turn"])
+                    return await self._finish_turn(turn, shared["response"])
+                
+                if turn["needs_data"]:
+                    # Com histórico, só a busca de dados é compartilhada (single-flight do
+                    # LlamaSQLRetriever); a resposta é gerada com o histórico desta sessão
+                    await self._fetch_data(turn)
+                
+                # Gerar resposta usando LLM diretamente
+                return await self._finish_turn(turn, await self._generate_answer(turn))
+            
+            except Exception as e:
+                trace.outcome = "error"
+                print(f"❌ Erro ao processar mensagem: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                return self._error_payload(session_id)
+    
+    async def process_batch(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: int
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Processar várias mensagens em paralelo (limite de concorrência por lote)
+        
+        Perguntas repetidas no lote compartilham consulta e resposta pelo
+        single-flight e pelo cache de respostas.
+        
+        Args:
+            requests: Argumentos de process_message de cada item
+            max_concurrency: Máximo de itens processando ao mesmo tempo
+            
+        Yields:
+            Tuple (índice do item no lote, resultado), na ordem de conclusão
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(index: int, request: Dict[str, Any]):
+            async with semaphore:
+                return index, await self.process_message(**request)
         
-        except Exception as e:
-            print(f"❌ Erro ao processar mensagem: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return {
-                "response": f"Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente.",
-                "sql_query": None,
-                "data_preview": None,
-                "session_id": session_id or str(uuid.uuid4())
+        tasks = [asyncio.ensure_future(run(i, request)) for i, request in enumerate(requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Cliente desconectou no meio do streaming: não deixar itens órfãos rodando
+            for task in tasks:
+                task.cancel()
+    
+    async def _generate_answer(self, turn: Dict[str, Any]) -> str:
+        """Chamada ao LLM conversacional (etapa "answer" das métricas)"""
+        started = time.perf_counter()
+        response = await self.llm.ainvoke(self._build_messages(turn))
+        self._record_answer(started, response.usage_metadata)
+        return response.content
+    
+    @staticmethod
+    def _record_answer(started: float, usage: Optional[Dict[str, int]]) -> None:
+        usage = usage or {}
+        record_stage(
+            "answer",
+            seconds=time.perf_counter() - started,
+            prompt_tokens=usage.get("input_tokens"),
+            completion_tokens=usage.get("output_tokens")
+        )
+    
+    async def _answer_with_data(self, turn: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Buscar dados e gerar a resposta (execução compartilhada pelo single-flight)
+        
+        Returns:
+            Dict com a resposta e os campos do turno a replicar nas requisições coalescidas
+        """
+        await self._fetch_data(turn)
+        return {
+            "response": await self._generate_answer(turn),
+            "turn": {
+                "sql_query": turn["sql_query"],
+                "data_preview": turn["data_preview"],
+                "cache_key": turn["cache_key"],
+                "prompt_tokens": turn["prompt_tokens"]
             }
+        }
+    
+    async def stream_message(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Processar mensagem emitindo eventos à medida que cada etapa acontece
+        
+        Eventos: "status" (consultando dados), "sql" (SQL gerado), "token" (trecho
+        da resposta do LLM) e "done" (mesmos campos do ChatResponse) ou "error".
+        
+        Args:
+            user_message: Mensagem do usuário
+            conversation_history: Histórico de conversa
+            session_id: ID da sessão
+            
+        Yields:
+            Tuple (nome do evento, dados)
+        """
+        with traced_request("stream") as trace:
+            try:
+                turn = await self._prepare_turn(user_message, conversation_history, session_id)
+                if turn["cached"]:
+                    yield "token", {"content": turn["cached"]["response"]}
+                    yield "done", turn["cached"]
+                    return
+                
+                if turn["needs_data"]:
+                    yield "status", {"stage": "querying_data", "message": "Consultando dados..."}
+                    await self._fetch_data(turn)
+                    if turn["sql_query"]:
+                        yield "sql", {"sql_query": turn["sql_query"]}
+                
+                yield "status", {"stage": "generating", "message": "Gerando resposta..."}
+                
+                chunks = []
+                usage = None
+                started = time.perf_counter()
+                async for chunk in self.llm.astream(self._build_messages(turn)):
+                    if chunk.usage_metadata:
+                        usage = chunk.usage_metadata
+                    if chunk.content:
+                        chunks.append(chunk.content)
+                        yield "token", {"content": chunk.content}
+                self._record_answer(started, usage)
+                
+                yield "done", await self._finish_turn(turn, "".join(chunks))
+            
+            except Exception as e:
+                trace.outcome = "error"
+                print(f"❌ Erro ao processar mensagem (stream): {str(e)}")
+                import traceback
+                traceback.print_exc()
+                yield "error", self._error_payload(session_id)
+    
+    async def load_router_entities(self) -> int:
+        """
+        Carregar nomes de times e jogadores do banco no roteador
+        
+        Returns:
+            Número de entidades indexadas
+        """
+        teams, players = await self.llama_sql.load_entity_names()
+        self.router.load_entities(teams, players)
+        print(f"🧭 Roteador: {len(teams)} times e {len(players)} jogadores indexados")
+        return self.router.entity_count
+    
+    def route_message(self, message: str) -> RouteDecision:
+        """
+        Rotear mensagem (precisa de dados? qual intenção? quais entidades?)
+        
+        Args:
+            message: Mensagem do usuário
+            
+        Returns:
+            RouteDecision
+        """
+        return self.router.route(message)
     
     def requires_database_query(self, message: str) -> bool:
         """
@@ -221,20 +567,4 @@ Em seguida temos:
         Returns:
             True se precisa de dados, False caso contrário
         """
-        # Keywords que indicam necessidade de dados
-        data_keywords = [
-            "quantos", "quanto", "qual", "quais", "quem",
-            "estatística", "média", "total", "últimos", "próximos", "proximo", "proximos",
-            "classificação", "posição", "pontos", "gols",
-            "jogadores", "artilheiros", "time", "confronto",
-            "histórico", "resultados", "jogos", "partidas", "jogo", "adversário", "adversario",
-            "compare", "comparar", "diferença", "melhor", "pior",
-            "substituído", "substituídos", "substituições", "substituir",
-            "mais utilizados", "titulares", "escalação", "formação",
-            "minutos", "tempo de jogo", "resistentes", "quando", "onde", "data"
-        ]
-        
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in data_keywords)
-    
-
+        return self.route_message(message).needs_data
@@ -3,65 +3,237 @@ LlamaIndex SQL Retriever
 Responsável por gerar e executar queries SQL seguras no Supabase
 """
 
-from llama_index.core import SQLDatabase, VectorStoreIndex
+from llama_index.core import VectorStoreIndex
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events.llm import LLMChatEndEvent
 from llama_index.core.query_engine import NLSQLTableQueryEngine
 from llama_index.llms.openai import OpenAI
-from sqlalchemy import create_engine, text
-from typing import List, Dict, Any
+from sqlalchemy import bindparam, inspect, text
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+import asyncio
+import contextvars
+import time
 import os
 
+from .cache import TTLCache
+from .llm_transport import LLMTransport
+from .metrics import current_trace, log_sampled, record_stage
+from .database import create_sync_engine, create_async_db_engine
+from .schema_snapshot import (
+    build_snapshot,
+    compute_fingerprint,
+    get_snapshot_path,
+    load_snapshot,
+    save_snapshot
+)
+from .replica import TableReplica
+from .normalize import normalize_question
+from .query_log import QueryLog, get_query_log_path
+from .query_planner import QueryPlanner, SubQuery
+from .router import RouteDecision
+from .singleflight import SingleFlight
+from .sql_database import TaticoSQLDatabase
+from .sql_guard import SQLCostGuard
+from .sql_stream import SQLRowStream
+from .sql_utils import keyset_query
+from .sql_templates import ROUND_CALENDAR_SQL, RoundCalendar, SQLTemplateLibrary
+from .table_retrieval import TableSelector, get_embed_model
+
+class LLMUsageHandler(BaseEventHandler):
+    """Registra os tokens de cada chamada LLM do LlamaIndex na etapa atual do trace"""
+    
+    @classmethod
+    def class_name(cls) -> str:
+        return "TaticoLLMUsageHandler"
+    
+    def handle(self, event, **kwargs) -> None:
+        if not isinstance(event, LLMChatEndEvent) or event.response is None:
+            return
+        usage = event.response.additional_kwargs or {}
+        if "prompt_tokens" not in usage:
+            return
+        trace = current_trace()
+        record_stage(
+            trace.llm_stage if trace else "sql_generation",
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage.get("completion_tokens", 0)
+        )
+
+
+get_dispatcher().add_event_handler(LLMUsageHandler())
+
+# Origem dos nomes de times/jogadores para o roteador: tabela → colunas candidatas
+ENTITY_SOURCES = {
+    "teams": [
+        ("Times_2024", ["team_name", "name", "nome", "time"]),
+        ("int_classificacao_campeonato", ["time"]),
+    ],
+    "players": [
+        ("Jogadores_por_Time_2024_2", ["player_name", "name", "nome", "jogador"]),
+    ],
+}
+
+# Lista de TODAS as tabelas e suas descrições DETALHADAS
+TABLE_DESCRIPTIONS = {
+    # Tabelas brutas de dados (USE APENAS SE NÃO EXISTIR TABELA int_* EQUIVALENTE)
+    "Jogos_Completos_2024": """⭐ JOGOS DO BRASILEIRÃO 2024 - USE PARA PRÓXIMOS JOGOS:
+        Colunas: fixture_id, round (ex: 'Regular Season - 36'), date, home_team_name, away_team_name, venue_name, venue_city, status
+        ⚠️ Para PRÓXIMOS JOGOS DO FLAMENGO, filtre por: (home_team_name = 'Flamengo' OR away_team_name = 'Flamengo')
+        ⚠️ Estamos nas rodadas finais: 36, 37, 38 (total de 38 rodadas)""",
+    "Estatisticas_Por_Jogo_2024": "Estatísticas detalhadas por jogo (chutes, posse, faltas, cartões, escanteios, passes)",
+    "Estatisticas_Jogadores_Por_Jogo_2024": "Estatísticas individuais de jogadores por jogo (rating, gols, assistências, passes, dribles, tackles)",
+    "Eventos_Jogos_2024": "Eventos dos jogos (gols, cartões, substituições, momento/minuto do evento)",
+    "Jogadores_por_Time_2024_2": "Lista de jogadores por time (nome, posição, número, idade)",
+    "Relacionados_por_Jogo_2024": "⚠️ NÃO USE para contar substituições! Use int_jogadores_detalhados. Escalações por jogo (titulares, reservas)",
+    "Resultados_Jogos_2024": "Resultados finais dos jogos (placar, vencedor, estádio, árbitro)",
+    "Tecnicos_2024": "Informações sobre técnicos (nome, time, idade, nacionalidade)",
+    "Times_2024": "Informações gerais dos times (nome, estádio, cidade, fundação)",
+    
+    # ✅ TABELAS ANALÍTICAS PRÉ-PROCESSADAS - USE ESTAS SEMPRE QUE POSSÍVEL!
+    "int_stats_comparativas": """⭐ Comparação Flamengo vs Internacional (JÁ CALCULADO):
+        Colunas: time, media_chutes, chutes_no_gol, media_escanteios, media_posse, media_faltas
+        Use para: comparar estatísticas médias entre os times""",
+    
+    "int_jogadores_detalhados": """⭐⭐⭐ PRINCIPAL TABELA DE JOGADORES (JÁ PROCESSADO):
+        Colunas importantes:
+        - mais_substituidos (STRING): "Thiago Maia (14x aos 63.6min), Bruno Henrique (12x aos 66.5min)"
+        - principais_artilheiros (STRING): "Rafael Borré (8g, 3a), Wesley (8g, 1a)"
+        - jogadores_mais_utilizados (STRING): "Sergio Rochet (~25 jogos), Vitão (~24 jogos)"
+        - titulares_provaveis (STRING): lista de 11 jogadores
+        - formacao_preferida (STRING): ex: "4-3-3"
+        - jogadores_resistentes (STRING): raramente substituídos
+        ⚠️ IMPORTANTE: Use SELECT [coluna] FROM int_jogadores_detalhados WHERE adversario = 'Internacional'
+        ⚠️ NÃO FAÇA: COUNT, GROUP BY, ou cálculos - os dados JÁ estão prontos!""",
+    
+    "int_inteligencia_tatica": """Inteligência tática avançada:
+        Colunas: padrao_substituicoes, principais_recuperadores, criadores_jogadas, especialistas_penaltis,
+        periodo_mais_perigoso, periodo_menos_perigoso""",
+    
+    "int_momentum_atual": """Momentum recente (últimos 5 jogos):
+        Colunas: time, pontos_recentes, sequencia_recente, gols_marcados_recentes, gols_sofridos_recentes""",
+    
+    "int_classificacao_campeonato": """Classificação COMPLETA do Brasileirão:
+        Colunas: posicao, time, pontos_total, jogos_disputados, total_vitorias, total_empates, total_derrotas,
+        gols_marcados, gols_sofridos, saldo_gols, aproveitamento_pct, ultimos_5_jogos""",
+    
+    "int_proximo_adversario": "⚠️ DESATUALIZADO! Não use. Para próximos jogos, use Jogos_Completos_2024",
+    "int_vulnerabilidades_taticas": "Vulnerabilidades táticas do Inter (falhas_goleiro, disciplina, eficiencia_escanteios)",
+    "int_analise_pressao": "Análise psicológica sob pressão (comportamento_jogos_grandes, performance_final_campeonato)",
+    "int_analise_tatica_avancada": "Análise tática avançada (padroes_gols, vulnerabilidades_casa_fora, indisciplina)",
+    "int_confrontos_diretos": "Histórico Flamengo x Inter (total_jogos, vitorias_flamengo, vitorias_inter, empates)",
+    "int_impacto_jogadores": "Impacto de jogadores chave (jogadores_fundamentais, jogadores_problematicos, maior_impacto_ofensivo)",
+    "int_reacao_pos_gol": "Reação após sofrer gol (comportamento_pos_gol, media_cartoes_pos_gol)",
+    "int_vulnerabilidades_campo": "Vulnerabilidades por área (tipo_gols_sofridos, periodo_fadiga, melhor_periodo)",
+    "int_perfil_psicologico": "Perfil psicológico (periodo_jogo_intenso, capacidade_reacao, controle_emocional, dna_tatico)"
+}
+
 class LlamaSQLRetriever:
     """
     Classe responsável por consultas SQL usando LlamaIndex
     """
     
-    def __init__(self, database_url: str):
+    def __init__(self, database_url: str, llm_transport: Optional[LLMTransport] = None):
         """
         Inicializar conexão com banco e LlamaIndex
         
         Args:
             database_url: URL de conexão PostgreSQL
+            llm_transport: Pool HTTP dos LLMs (None = criado a partir das variáveis LLM_*)
         """
         self.database_url = database_url
-        self.engine = create_engine(database_url)
+        self._owns_llm_transport = llm_transport is None
+        self.llm_transport = llm_transport or LLMTransport.from_env()
+        self.engine = create_sync_engine(database_url)
+        
+        # Engine assíncrono (asyncpg) para consultas diretas sem bloquear o event loop
+        self.async_engine = create_async_db_engine(database_url)
+        
+        # Cache de resultados SQL (chave = SQL canônico, invalidação por tabela)
+        self.result_cache = TTLCache(
+            maxsize=int(os.getenv("SQL_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("SQL_CACHE_TTL_SECONDS", "600"))
+        )
+        self._table_versions: Dict[str, int] = {}
         
         # Inicializar LlamaIndex SQL Database com TODAS as tabelas importantes
-        self.sql_database = SQLDatabase(
+        self.include_tables = [
+            # Tabelas brutas de dados
+            "Jogos_Completos_2024",
+            "Estatisticas_Por_Jogo_2024",
+            "Estatisticas_Jogadores_Por_Jogo_2024",
+            "Eventos_Jogos_2024",
+            "Jogadores_por_Time_2024_2",
+            "Relacionados_por_Jogo_2024",
+            "Resultados_Jogos_2024",
+            "Tecnicos_2024",
+            "Times_2024",
+            # Tabelas analíticas do Internacional (int_*)
+            "int_stats_comparativas",
+            "int_jogadores_detalhados",
+            "int_inteligencia_tatica",
+            "int_momentum_atual",
+            "int_classificacao_campeonato",
+            "int_vulnerabilidades_taticas",
+            "int_analise_pressao",
+            "int_analise_tatica_avancada",
+            "int_confrontos_diretos",
+            "int_impacto_jogadores",
+            "int_reacao_pos_gol",
+            "int_vulnerabilidades_campo",
+            "int_perfil_psicologico",
+            "int_proximo_adversario"
+        ]
+        
+        # Snapshot do schema em disco (evita refletir as tabelas pela rede no boot)
+        self.snapshot_path = get_snapshot_path()
+        self.schema_snapshot = load_snapshot(
+            self.snapshot_path, self.include_tables, self.engine.dialect.name
+        )
+        if self.schema_snapshot:
+            print(f"📦 Schema carregado do snapshot ({self.snapshot_path})")
+        
+        # Réplica em memória das tabelas int_* (carregada em segundo plano por refresh_replica)
+        self.replica = None
+        if os.getenv("REPLICA_ENABLED", "true").lower() == "true":
+            self.replica = TableReplica(
+                self.engine,
+                [table for table in self.include_tables if table.startswith("int_")],
+                max_rows=int(os.getenv("REPLICA_MAX_ROWS", "50000"))
+            )
+        
+        # Guarda de custo: LIMIT, EXPLAIN e statement_timeout para o SQL gerado
+        self.guard = None
+        if os.getenv("SQL_GUARD_ENABLED", "true").lower() == "true":
+            self.guard = SQLCostGuard(
+                max_cost=float(os.getenv("SQL_GUARD_MAX_COST", "100000")),
+                max_rows_estimate=float(os.getenv("SQL_GUARD_MAX_ROWS_ESTIMATE", "1000000")),
+                default_limit=int(os.getenv("SQL_GUARD_DEFAULT_LIMIT", "200")),
+                statement_timeout_ms=int(os.getenv("SQL_GUARD_STATEMENT_TIMEOUT_MS", "5000"))
+            )
+        
+        self.sql_database = TaticoSQLDatabase(
             self.engine,
-            include_tables=[
-                # Tabelas brutas de dados
-                "Jogos_Completos_2024",
-                "Estatisticas_Por_Jogo_2024",
-                "Estatisticas_Jogadores_Por_Jogo_2024",
-                "Eventos_Jogos_2024",
-                "Jogadores_por_Time_2024_2",
-                "Relacionados_por_Jogo_2024",
-                "Resultados_Jogos_2024",
-                "Tecnicos_2024",
-                "Times_2024",
-                # Tabelas analíticas do Internacional (int_*)
-                "int_stats_comparativas",
-                "int_jogadores_detalhados",
-                "int_inteligencia_tatica",
-                "int_momentum_atual",
-                "int_classificacao_campeonato",
-                "int_vulnerabilidades_taticas",
-                "int_analise_pressao",
-                "int_analise_tatica_avancada",
-                "int_confrontos_diretos",
-                "int_impacto_jogadores",
-                "int_reacao_pos_gol",
-                "int_vulnerabilidades_campo",
-                "int_perfil_psicologico",
-                "int_proximo_adversario"
-            ]
+            result_cache=self.result_cache,
+            snapshot=self.schema_snapshot,
+            replica=self.replica,
+            guard=self.guard,
+            include_tables=self.include_tables
         )
         
         # Configurar LLM (GPT-4o - mais recente e rápido)
+        # Retries, prazo e hedging ficam no transporte compartilhado (max_retries=0 no SDK)
+        sql_deadline = self.llm_transport.stage_deadline("sql_generation", 30)
         self.llm = OpenAI(
             model="gpt-4o",  # GPT-4o - modelo mais recente
             temperature=0,  # Mais determinístico para SQL
-            api_key=os.getenv("OPENAI_API_KEY")
+            api_key=os.getenv("OPENAI_API_KEY"),
+            api_base=self.llm_transport.base_url,
+            timeout=sql_deadline,
+            max_retries=0,
+            http_client=self.llm_transport.client("sql_generation", sql_deadline),
+            async_http_client=self.llm_transport.async_client("sql_generation", sql_deadline)
         )
         
         # Criar Query Engine com instruções SQL personalizadas
@@ -123,39 +295,304 @@ class LlamaSQLRetriever:
         - SEMPRE retorne o valor COMPLETO da coluna, NÃO tente parsear ou extrair partes
         """
         
+        # Rodadas do campeonato (próximos jogos), carregadas por load_round_calendar
+        self.round_calendar = RoundCalendar()
+        
+        # Queries validadas para intenções conhecidas (dispensam o LLM)
+        self.templates = None
+        if os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true":
+            self.templates = SQLTemplateLibrary(calendar=self.round_calendar)
+        
+        # Perguntas com várias partes → sub-consultas em paralelo
+        self.planner = None
+        if os.getenv("QUERY_PLANNER_ENABLED", "true").lower() == "true":
+            self.planner = QueryPlanner(calendar=self.round_calendar)
+        
+        # Seleção das top-k tabelas por pergunta (0 = enviar todas no prompt; padrão até
+        # a seleção ser validada contra o log de queries)
+        table_top_k = int(os.getenv("TABLE_RETRIEVAL_TOP_K", "0"))
+        self.table_selector = None
+        if table_top_k > 0:
+            self.table_selector = TableSelector(
+                self.sql_database,
+                TABLE_DESCRIPTIONS,
+                top_k=table_top_k,
+                embed_model=get_embed_model(os.getenv("TABLE_RETRIEVAL_EMBED_MODEL", "local"))
+            )
+        
+        # "rows": devolve as linhas ao agente conversacional (sem a chamada de síntese do LlamaIndex)
+        # "synthesize": o LlamaIndex resume o resultado em texto antes
+        self.response_mode = os.getenv("SQL_RESPONSE_MODE", "rows")
+        self.max_rows = int(os.getenv("SQL_ROWS_MAX", "50"))
+        
+        # Log das queries executadas (tempo e linhas), analisado offline pelo agent.query_advisor
+        self.query_log = None
+        if os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true":
+            self.query_log = QueryLog(
+                get_query_log_path(),
+                max_bytes=int(float(os.getenv("QUERY_LOG_MAX_MB", "50")) * 1024 * 1024)
+            )
+        
+        # /webhook/sql-query: linhas por bloco lido do cursor e teto de linhas por requisição
+        self.query_chunk_rows = int(os.getenv("SQL_QUERY_CHUNK_ROWS", "1000"))
+        self.query_max_rows = int(os.getenv("SQL_QUERY_MAX_ROWS", "100000"))
+        
         self.query_engine = NLSQLTableQueryEngine(
             sql_database=self.sql_database,
             llm=self.llm,
-            synthesize_response=True,
-            context_str_prefix=sql_context_str
+            synthesize_response=self.response_mode == "synthesize",
+            context_str_prefix=sql_context_str,
+            table_retriever=self.table_selector
+        )
+        
+        # Pool limitado para o pipeline NL→SQL (LLM + execução são síncronos no LlamaIndex)
+        self.max_concurrency = int(os.getenv("SQL_AGENT_MAX_CONCURRENCY", "8"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="llama-sql"
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        
+        # Perguntas idênticas em andamento aguardam a mesma execução
+        self.inflight = SingleFlight()
+        
+        print(f"✅ LlamaSQLRetriever inicializado (concorrência máx: {self.max_concurrency})")
+    
+    def get_concurrency_stats(self) -> Dict[str, int]:
+        """
+        Estado atual do pool de consultas NL→SQL
+        
+        Returns:
+            Dict com limite, consultas em execução e consultas aguardando vaga
+        """
+        return {
+            "limit": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting
+        }
+    
+    async def _run_in_pool(self, func, *args):
+        """
+        Executar função bloqueante no pool limitado sem travar o event loop
+        
+        Args:
+            func: Função síncrona a executar
+            *args: Argumentos da função
+            
+        Returns:
+            Tuple (resultado, estatísticas de concorrência da requisição)
+        """
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        
+        try:
+            self._in_flight += 1
+            stats = {
+                "limit": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queue_wait_ms": round((time.perf_counter() - queued_at) * 1000, 2)
+            }
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()  # trace da requisição visível na thread
+            result = await loop.run_in_executor(self._executor, context.run, func, *args)
+            return result, stats
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+    
+    async def close(self):
+        """Liberar pool de threads e conexões"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.query_log is not None:
+            self.query_log.close()
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        self.engine.dispose()
+        if self._owns_llm_transport:
+            await self.llm_transport.aclose()
+    
+    def _query_sync(self, question: str) -> tuple:
+        """
+        Pipeline NL→SQL síncrono (executado no pool)
+        
+        Returns:
+            Tuple (resposta do LlamaIndex, tabelas selecionadas e economia de tokens,
+            segundos de execução do SQL ou None sem trace)
+        """
+        trace = current_trace()
+        execution_before = 0.0
+        if trace is not None:
+            trace.llm_stage = "sql_generation"
+            trace.marks.pop("sql_executed", None)
+            trace.sql_source = None
+            execution_before = trace.stages.get("sql_execution", {}).get("seconds", 0.0)
+        
+        started = time.perf_counter()
+        response = self.query_engine.query(question)
+        finished = time.perf_counter()
+        
+        # Separar geração de SQL / execução / síntese pelo instante em que o SQL terminou
+        executed_at = trace.marks.pop("sql_executed", None) if trace is not None else None
+        execution = (
+            trace.stages.get("sql_execution", {}).get("seconds", 0.0) - execution_before
+            if trace is not None else 0.0
+        )
+        generation_end = executed_at if executed_at is not None else finished
+        record_stage("sql_generation", seconds=max(generation_end - started - execution, 0.0))
+        if executed_at is not None and self.response_mode == "synthesize":
+            record_stage("synthesis", seconds=finished - executed_at)
+        
+        table_selection = self.table_selector.last_selection() if self.table_selector else None
+        return response, table_selection, execution if trace is not None else None
+    
+    @staticmethod
+    def _sql_execution_seconds() -> Optional[float]:
+        """Tempo de execução de SQL acumulado no trace da requisição (None sem trace)"""
+        trace = current_trace()
+        if trace is None:
+            return None
+        return trace.stages.get("sql_execution", {}).get("seconds", 0.0)
+    
+    def _log_query(self, kind: str, sql: str, seconds: Optional[float], rows: Optional[int]) -> None:
+        """Registrar SQL executado no log de queries (origem vem do trace: cache, replica, db...)"""
+        if self.query_log is None or not sql:
+            return
+        trace = current_trace()
+        self.query_log.record(
+            kind=kind,
+            sql=sql,
+            ms=round(seconds * 1000, 2) if seconds is not None else None,
+            rows=rows,
+            src=trace.sql_source if trace is not None else None
+        )
+    
+    def _rows_payload(self, columns: List[str], rows: List[tuple]) -> Dict[str, Any]:
+        """
+        Linhas estruturadas (limitadas a max_rows) para o agente e o data_preview
+        
+        Args:
+            columns: Nomes das colunas
+            rows: Linhas retornadas pelo banco (valores tipados)
+            
+        Returns:
+            Dict com colunas, linhas, total de linhas e se houve corte
+        """
+        return {
+            "columns": list(columns),
+            "rows": [list(row) for row in rows[:self.max_rows]],
+            "row_count": len(rows),
+            "truncated": len(rows) > self.max_rows
+        }
+    
+    @staticmethod
+    def _format_rows(data: Dict[str, Any]) -> str:
+        """Resultado tabular em texto (cabeçalho + uma linha por registro)"""
+        lines = [" | ".join(data["columns"])]
+        lines.extend(" | ".join(str(value) for value in row) for row in data["rows"])
+        if data["truncated"]:
+            lines.append(f"... ({data['row_count'] - len(data['rows'])} linhas omitidas)")
+        return "\n".join(lines)
+    
+    async def _run_template(self, question: str, route: Optional[RouteDecision]) -> Optional[Dict[str, Any]]:
+        """
+        Responder com uma query validada, se a pergunta casar com um template
+        
+        Returns:
+            Dict no formato de natural_language_query ou None (usar o LLM)
+        """
+        matched = self.templates.match(question, route)
+        if matched is None:
+            return None
+        
+        template, sql = matched
+        execution_before = self._sql_execution_seconds()
+        trace = current_trace()
+        if trace is not None:
+            trace.sql_source = None
+        try:
+            (_, metadata), concurrency = await self._run_in_pool(self.sql_database.run_sql, sql)
+        except Exception as e:
+            log_sampled(f"⚠️ Template {template.name} falhou, usando o LLM: {str(e)}")
+            self.templates.record_miss()
+            return None
+        
+        rows = metadata.get("result") or []
+        execution_after = self._sql_execution_seconds()
+        self._log_query(
+            f"template:{template.name}", sql,
+            execution_after - execution_before if execution_after is not None else None,
+            len(rows)
         )
+        if not rows:
+            self.templates.record_miss(empty_result=True)
+            return None
         
-        print("✅ LlamaSQLRetriever inicializado")
+        self.templates.record_hit(template)
+        log_sampled(f"📐 Template SQL: {template.name}")
+        data = self._rows_payload(metadata["col_keys"], rows)
+        return {
+            "answer": self._format_rows(data),
+            "sql_query": sql,
+            "success": True,
+            "data": data,
+            "concurrency": concurrency,
+            "table_selection": None,
+            "template": template.name
+        }
     
-    async def natural_language_query(self, question: str) -> Dict[str, Any]:
+    async def natural_language_query(
+        self,
+        question: str,
+        route: Optional[RouteDecision] = None
+    ) -> Dict[str, Any]:
         """
         Executar query em linguagem natural
         
+        Perguntas que casam com um template validado executam o SQL direto;
+        perguntas com várias partes (intenções ou times) viram sub-consultas
+        executadas em paralelo; as demais passam pelo NLSQLTableQueryEngine.
+        Chamadas concorrentes com a mesma pergunta normalizada compartilham uma
+        única execução.
+        
         Args:
             question: Pergunta em linguagem natural
+            route: Decisão do roteador de intenções (habilita os templates)
             
         Returns:
-            Dict com resposta, SQL gerado e dados
+            Dict com resposta (texto ou tabela), SQL gerado e linhas ("data")
         """
+        result, coalesced = await self.inflight.do(
+            normalize_question(question),
+            lambda: self._natural_language_query(question, route)
+        )
+        if coalesced:
+            log_sampled("🔗 Consulta compartilhada com requisição em andamento")
+        return result
+    
+    async def _natural_language_query(
+        self,
+        question: str,
+        route: Optional[RouteDecision]
+    ) -> Dict[str, Any]:
+        """Pipeline de natural_language_query (template, plano de sub-consultas ou NL→SQL)"""
         try:
-            # Executar query
-            response = self.query_engine.query(question)
+            if self.templates is not None:
+                template_result = await self._run_template(question, route)
+                if template_result is not None:
+                    return template_result
             
-            # Extrair SQL gerado (se disponível)
-            sql_query = None
-            if hasattr(response, 'metadata') and 'sql_query' in response.metadata:
-                sql_query = response.metadata['sql_query']
+            if self.planner is not None:
+                plan = self.planner.plan(question, route)
+                if plan:
+                    return await self._run_plan(plan)
             
-            return {
-                "answer": str(response),
-                "sql_query": sql_query,
-                "success": True
-            }
+            return await self._run_nl(question)
         
         except Exception as e:
             print(f"❌ Erro na query LlamaIndex: {str(e)}")
@@ -163,32 +600,203 @@ class LlamaSQLRetriever:
                 "answer": f"Desculpe, não consegui processar sua pergunta: {str(e)}",
                 "sql_query": None,
                 "success": False,
+                "data": None,
                 "error": str(e)
             }
     
-    async def execute_raw_query(self, sql: str) -> List[Dict]:
+    async def _run_nl(self, question: str, kind: str = "nl") -> Dict[str, Any]:
+        """
+        NL→SQL pelo NLSQLTableQueryEngine
+        
+        Args:
+            question: Pergunta em linguagem natural
+            kind: Tipo no log de queries
+            
+        Returns:
+            Dict no formato de natural_language_query
+        """
+        # Executar query fora do event loop (pool limitado)
+        (response, table_selection, execution), concurrency = await self._run_in_pool(
+            self._query_sync, question
+        )
+        
+        # Extrair SQL gerado (se disponível)
+        sql_query = None
+        metadata = getattr(response, 'metadata', None) or {}
+        if 'sql_query' in metadata:
+            sql_query = metadata['sql_query']
+            result_rows = metadata.get('result')
+            self._log_query(
+                kind, sql_query, execution,
+                len(result_rows) if isinstance(result_rows, list) else None
+            )
+        
+        # Linhas estruturadas (também no modo "synthesize", para o data_preview)
+        data = None
+        if 'col_keys' in metadata and isinstance(metadata.get('result'), list):
+            data = self._rows_payload(metadata['col_keys'], metadata['result'])
+        
+        answer = str(response)
+        if self.response_mode == "rows" and data is not None:
+            answer = self._format_rows(data)
+        
+        if table_selection:
+            log_sampled(f"📋 Tabelas: {table_selection['tables']} "
+                        f"(-{table_selection['tokens_saved']} tokens de schema)")
+        
+        return {
+            "answer": answer,
+            "sql_query": sql_query,
+            "success": True,
+            "data": data,
+            "concurrency": concurrency,
+            "table_selection": table_selection,
+            "template": None
+        }
+    
+    def _timed_run_sql(self, sql: str) -> tuple:
+        """run_sql medindo o próprio tempo (sub-consultas paralelas dividem o mesmo trace)"""
+        started = time.perf_counter()
+        result = self.sql_database.run_sql(sql)
+        return result, time.perf_counter() - started
+    
+    async def _run_subquery(self, subquery: SubQuery) -> Dict[str, Any]:
+        """Executar uma sub-consulta do plano (SQL validado ou NL→SQL)"""
+        if subquery.sql is None:
+            result = await self._run_nl(subquery.question, kind="plan:nl")
+            return {**result, "label": subquery.label}
+        
+        ((_, metadata), seconds), concurrency = await self._run_in_pool(self._timed_run_sql, subquery.sql)
+        data = self._rows_payload(metadata.get("col_keys") or [], metadata.get("result") or [])
+        self._log_query("plan", subquery.sql, seconds, data["row_count"])
+        return {
+            "label": subquery.label,
+            "answer": self._format_rows(data) if data["row_count"] else "(sem linhas)",
+            "sql_query": subquery.sql,
+            "data": data,
+            "concurrency": concurrency
+        }
+    
+    async def _run_plan(self, plan: List[SubQuery]) -> Dict[str, Any]:
+        """
+        Executar as sub-consultas em paralelo e juntar os resultados
+        
+        O tempo total acompanha a sub-consulta mais lenta (limitado pelo pool
+        de SQL_AGENT_MAX_CONCURRENCY). Sub-consultas que falham ficam de fora;
+        se todas falharem, o erro sobe para natural_language_query.
+        
+        Args:
+            plan: Sub-consultas do QueryPlanner
+            
+        Returns:
+            Dict no formato de natural_language_query ("data" com uma parte por sub-consulta)
+        """
+        results = await asyncio.gather(
+            *[self._run_subquery(subquery) for subquery in plan],
+            return_exceptions=True
+        )
+        parts = []
+        for subquery, result in zip(plan, results):
+            if isinstance(result, BaseException):
+                log_sampled(f"⚠️ Sub-consulta '{subquery.label}' falhou: {str(result)}")
+            else:
+                parts.append(result)
+        if not parts:
+            raise results[0]
+        
+        log_sampled(f"🧩 Plano com {len(plan)} sub-consultas: {[p['label'] for p in parts]}")
+        return {
+            "answer": "\n\n".join(f"### {part['label']}\n{part['answer']}" for part in parts),
+            "sql_query": ";\n".join(part["sql_query"] for part in parts if part["sql_query"]),
+            "success": True,
+            "data": {
+                "parts": [
+                    {"label": part["label"], "sql_query": part["sql_query"], **(part["data"] or {})}
+                    for part in parts
+                ]
+            },
+            "concurrency": max((part["concurrency"] for part in parts), key=lambda c: c["queue_wait_ms"]),
+            "table_selection": None,
+            "template": None,
+            "plan": [part["label"] for part in parts]
+        }
+    
+    async def execute_raw_query(self, sql: str, max_rows: Optional[int] = None) -> List[Dict]:
         """
         Executar query SQL direta (para debugging)
         
         Args:
             sql: Query SQL
+            max_rows: Limite de linhas (padrão: SQL_QUERY_MAX_ROWS)
             
         Returns:
             Lista de resultados
         """
         try:
-            with self.engine.connect() as conn:
-                result = conn.execute(text(sql))
-                rows = result.fetchall()
-                
-                # Converter para dict
-                columns = result.keys()
-                return [dict(zip(columns, row)) for row in rows]
+            stream = await self.stream_raw_query(sql, max_rows=max_rows)
+            rows = [row async for chunk in stream for row in chunk]
+            return [dict(zip(stream.columns, row)) for row in rows]
         
         except Exception as e:
             print(f"❌ Erro ao executar SQL: {str(e)}")
             raise e
     
+    async def stream_raw_query(
+        self,
+        sql: str,
+        chunk_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        key: Optional[str] = None,
+        after: Any = None
+    ) -> SQLRowStream:
+        """
+        Executar query SQL direta lendo o resultado em blocos (cursor no servidor)
+        
+        Args:
+            sql: Query SQL
+            chunk_size: Linhas por bloco (padrão: SQL_QUERY_CHUNK_ROWS)
+            max_rows: Limite de linhas (padrão e teto: SQL_QUERY_MAX_ROWS)
+            key: Coluna para paginação por chave (None = sem paginação)
+            after: Último valor de key da página anterior
+            
+        Returns:
+            SQLRowStream já aberto (colunas disponíveis)
+        """
+        chunk_size = max(1, chunk_size or self.query_chunk_rows)
+        max_rows = min(max_rows or self.query_max_rows, self.query_max_rows)
+        params: Dict[str, Any] = {}
+        if key is not None:
+            # Uma linha a mais que o limite: indica se existe próxima página
+            sql, params = keyset_query(sql, key, after, max_rows + 1)
+        
+        if self.async_engine is None:
+            chunks = self._stream_sync(sql, params, chunk_size)
+        else:
+            chunks = self._stream_async(sql, params, chunk_size)
+        return await SQLRowStream(chunks, max_rows=max_rows, key=key).open()
+    
+    async def _stream_async(self, sql: str, params: Dict[str, Any], chunk_size: int):
+        async with self.async_engine.connect() as conn:
+            result = await conn.stream(text(sql), params)
+            yield list(result.keys()), []
+            async for rows in result.partitions(chunk_size):
+                yield None, rows
+    
+    async def _stream_sync(self, sql: str, params: Dict[str, Any], chunk_size: int):
+        """Fallback síncrono: cada bloco é lido no pool (o slot é liberado entre blocos)"""
+        conn, _ = await self._run_in_pool(self.engine.connect)
+        try:
+            streaming = conn.execution_options(stream_results=True, max_row_buffer=chunk_size)
+            result, _ = await self._run_in_pool(streaming.execute, text(sql), params)
+            yield list(result.keys()), []
+            while True:
+                rows, _ = await self._run_in_pool(result.fetchmany, chunk_size)
+                if not rows:
+                    break
+                yield None, rows
+        finally:
+            await self._run_in_pool(conn.close)
+    
     async def get_available_tables(self) -> List[str]:
         """
         Listar todas as tabelas disponíveis
@@ -208,7 +816,198 @@ class LlamaSQLRetriever:
         Returns:
             String com schema da tabela
         """
-        return self.sql_database.get_single_table_info(table_name)
+        cached = self.sql_database.cached_table_info(table_name)
+        if cached is not None:
+            return cached
+        
+        if self.async_engine is None:
+            info, _ = await self._run_in_pool(self.sql_database.get_single_table_info, table_name)
+            return info
+        
+        async with self.async_engine.connect() as conn:
+            return await conn.run_sync(self._describe_table, table_name)
+    
+    @staticmethod
+    def _describe_table(sync_conn, table_name: str) -> str:
+        """Montar descrição da tabela no mesmo formato do SQLDatabase do LlamaIndex"""
+        inspector = inspect(sync_conn)
+        columns = ", ".join(
+            f"{column['name']} ({column['type']!s})"
+            for column in inspector.get_columns(table_name)
+        )
+        foreign_keys = ", ".join(
+            f"{fk['constrained_columns']} -> {fk['referred_table']}.{fk['referred_columns']}"
+            for fk in inspector.get_foreign_keys(table_name)
+        )
+        foreign_key_str = f" and foreign keys: {foreign_keys}" if foreign_keys else ""
+        return f"Table '{table_name}' has columns: {columns}, {foreign_key_str}."
+    
+    def _refresh_schema_snapshot_sync(self) -> bool:
+        """Versão síncrona de refresh_schema_snapshot (executada no pool)"""
+        fingerprint = compute_fingerprint(self.engine, self.include_tables)
+        if self.schema_snapshot and self.schema_snapshot["fingerprint"] == fingerprint:
+            return False
+        
+        table_info = self.sql_database.describe_tables()
+        self.sql_database.apply_table_info(table_info)
+        if self.table_selector is not None:
+            self.table_selector.refresh_token_counts()
+        self.schema_snapshot = build_snapshot(self.engine.dialect.name, fingerprint, table_info)
+        save_snapshot(self.snapshot_path, self.schema_snapshot)
+        return True
+    
+    async def refresh_schema_snapshot(self) -> bool:
+        """
+        Conferir o snapshot contra o catálogo do banco e atualizá-lo se estiver velho
+        
+        Returns:
+            True se o snapshot foi (re)gerado
+        """
+        refreshed, _ = await self._run_in_pool(self._refresh_schema_snapshot_sync)
+        if refreshed:
+            print(f"📦 Snapshot do schema atualizado ({self.snapshot_path})")
+        return refreshed
+    
+    def _load_entity_names_sync(self) -> Dict[str, List[str]]:
+        """Versão síncrona de load_entity_names (executada no pool)"""
+        names = {}
+        with self.engine.connect() as conn:
+            for kind, sources in ENTITY_SOURCES.items():
+                values = set()
+                for table, candidates in sources:
+                    try:
+                        columns = list(conn.execute(text(f'SELECT * FROM "{table}" LIMIT 0')).keys())
+                        column = next((c for c in candidates if c in columns), None)
+                        if column:
+                            values.update(
+                                v for v in conn.execute(
+                                    text(f'SELECT DISTINCT "{column}" FROM "{table}"')
+                                ).scalars() if isinstance(v, str)
+                            )
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"⚠️ Não foi possível ler nomes de {table}: {str(e)}")
+                names[kind] = sorted(values)
+        return names
+    
+    async def load_entity_names(self) -> tuple:
+        """
+        Ler nomes de times e jogadores (para o roteador de intenções)
+        
+        Returns:
+            Tuple (times, jogadores)
+        """
+        names, _ = await self._run_in_pool(self._load_entity_names_sync)
+        return names["teams"], names["players"]
+    
+    def _load_round_calendar_sync(self) -> int:
+        """Versão síncrona de load_round_calendar (executada no pool)"""
+        with self.engine.connect() as conn:
+            return self.round_calendar.load(conn.execute(text(ROUND_CALENDAR_SQL)).fetchall())
+    
+    async def load_round_calendar(self) -> int:
+        """
+        Ler o calendário de rodadas (próximos jogos nos templates e no planejador)
+        
+        Returns:
+            Número de rodadas no calendário
+        """
+        rounds, _ = await self._run_in_pool(self._load_round_calendar_sync)
+        print(f"📅 Calendário: {rounds} rodadas, próximas: {list(self.round_calendar.upcoming())}")
+        return rounds
+    
+    def invalidate_tables(self, tables: List[str] = None) -> int:
+        """
+        Invalidar resultados SQL em cache (hook para quando as tabelas forem atualizadas)
+        
+        Args:
+            tables: Tabelas atualizadas (None invalida tudo)
+            
+        Returns:
+            Número de resultados removidos
+        """
+        if tables is None:
+            removed = self.result_cache.invalidate()
+        else:
+            removed = self.result_cache.invalidate_tags(tables)
+        print(f"🧹 Cache SQL invalidado: {tables or 'todas as tabelas'} ({removed} entradas)")
+        return removed
+    
+    async def refresh_replica(self, tables: List[str] = None) -> Dict[str, int]:
+        """
+        Recarregar a réplica local das tabelas int_*
+        
+        Args:
+            tables: Tabelas atualizadas (None recarrega todas)
+            
+        Returns:
+            Dict tabela → linhas na réplica (vazio se nada foi recarregado)
+        """
+        if self.replica is None:
+            return {}
+        if tables is not None:
+            tables = [table for table in tables if table in self.replica.tables]
+            if not tables:
+                return {}
+        
+        row_counts, _ = await self._run_in_pool(self.replica.load, tables)
+        print(f"🪞 Réplica local: {len(row_counts)} tabelas, "
+              f"{sum(row_counts.values())} linhas ({self.replica.load_ms}ms)")
+        return row_counts
+    
+    async def probe_table_versions(self) -> Dict[str, int]:
+        """
+        Ler uma "versão" barata de cada tabela
+        
+        No PostgreSQL usa os contadores de escrita de pg_stat_user_tables (uma única
+        query); nos demais bancos, a contagem de linhas.
+        
+        Returns:
+            Dict tabela → versão
+        """
+        if self.engine.dialect.name == "postgresql":
+            query = text(
+                "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS versao "
+                "FROM pg_stat_user_tables WHERE relname IN :tables"
+            ).bindparams(bindparam("tables", expanding=True))
+            params = {"tables": self.include_tables}
+        else:
+            query = text(" UNION ALL ".join(
+                f"SELECT '{table}', COUNT(*) FROM \"{table}\"" for table in self.include_tables
+            ))
+            params = {}
+        
+        if self.async_engine is None:
+            def probe():
+                with self.engine.connect() as conn:
+                    return conn.execute(query, params).fetchall()
+            rows, _ = await self._run_in_pool(probe)
+        else:
+            async with self.async_engine.connect() as conn:
+                rows = (await conn.execute(query, params)).fetchall()
+        
+        return {row[0]: int(row[1]) for row in rows}
+    
+    async def refresh_changed_tables(self) -> List[str]:
+        """
+        Comparar versões das tabelas e invalidar só as que mudaram
+        
+        Returns:
+            Lista de tabelas alteradas desde a última verificação
+        """
+        versions = await self.probe_table_versions()
+        changed = [
+            table for table, version in versions.items()
+            if table in self._table_versions and self._table_versions[table] != version
+        ]
+        self._table_versions = versions
+        
+        if changed:
+            await self.refresh_replica(changed)
+            self.invalidate_tables(changed)
+            if "Jogos_Completos_2024" in changed:
+                await self.load_round_calendar()
+        return changed
     
     def get_context_for_question(self, question: str) -> str:
         """
@@ -220,63 +1019,9 @@ class LlamaSQLRetriever:
         Returns:
             Contexto formatado
         """
-        # Lista de TODAS as tabelas e suas descrições DETALHADAS
-        table_descriptions = {
-            # Tabelas brutas de dados (USE APENAS SE NÃO EXISTIR TABELA int_* EQUIVALENTE)
-            "Jogos_Completos_2024": """⭐ JOGOS DO BRASILEIRÃO 2024 - USE PARA PRÓXIMOS JOGOS:
-                Colunas: fixture_id, round (ex: 'Regular Season - 36'), date, home_team_name, away_team_name, venue_name, venue_city, status
-                ⚠️ Para PRÓXIMOS JOGOS DO FLAMENGO, filtre por: (home_team_name = 'Flamengo' OR away_team_name = 'Flamengo')
-                ⚠️ Estamos nas rodadas finais: 36, 37, 38 (total de 38 rodadas)""",
-            "Estatisticas_Por_Jogo_2024": "Estatísticas detalhadas por jogo (chutes, posse, faltas, cartões, escanteios, passes)",
-            "Estatisticas_Jogadores_Por_Jogo_2024": "Estatísticas individuais de jogadores por jogo (rating, gols, assistências, passes, dribles, tackles)",
-            "Eventos_Jogos_2024": "Eventos dos jogos (gols, cartões, substituições, momento/minuto do evento)",
-            "Jogadores_por_Time_2024_2": "Lista de jogadores por time (nome, posição, número, idade)",
-            "Relacionados_por_Jogo_2024": "⚠️ NÃO USE para contar substituições! Use int_jogadores_detalhados. Escalações por jogo (titulares, reservas)",
-            "Resultados_Jogos_2024": "Resultados finais dos jogos (placar, vencedor, estádio, árbitro)",
-            "Tecnicos_2024": "Informações sobre técnicos (nome, time, idade, nacionalidade)",
-            "Times_2024": "Informações gerais dos times (nome, estádio, cidade, fundação)",
-            
-            # ✅ TABELAS ANALÍTICAS PRÉ-PROCESSADAS - USE ESTAS SEMPRE QUE POSSÍVEL!
-            "int_stats_comparativas": """⭐ Comparação Flamengo vs Internacional (JÁ CALCULADO):
-                Colunas: time, media_chutes, chutes_no_gol, media_escanteios, media_posse, media_faltas
-                Use para: comparar estatísticas médias entre os times""",
-            
-            "int_jogadores_detalhados": """⭐⭐⭐ PRINCIPAL TABELA DE JOGADORES (JÁ PROCESSADO):
-                Colunas importantes:
-                - mais_substituidos (STRING): "Thiago Maia (14x aos 63.6min), Bruno Henrique (12x aos 66.5min)"
-                - principais_artilheiros (STRING): "Rafael Borré (8g, 3a), Wesley (8g, 1a)"
-                - jogadores_mais_utilizados (STRING): "Sergio Rochet (~25 jogos), Vitão (~24 jogos)"
-                - titulares_provaveis (STRING): lista de 11 jogadores
-                - formacao_preferida (STRING): ex: "4-3-3"
-                - jogadores_resistentes (STRING): raramente substituídos
-                ⚠️ IMPORTANTE: Use SELECT [coluna] FROM int_jogadores_detalhados WHERE adversario = 'Internacional'
-                ⚠️ NÃO FAÇA: COUNT, GROUP BY, ou cálculos - os dados JÁ estão prontos!""",
-            
-            "int_inteligencia_tatica": """Inteligência tática avançada:
-                Colunas: padrao_substituicoes, principais_recuperadores, criadores_jogadas, especialistas_penaltis,
-                periodo_mais_perigoso, periodo_menos_perigoso""",
-            
-            "int_momentum_atual": """Momentum recente (últimos 5 jogos):
-                Colunas: time, pontos_recentes, sequencia_recente, gols_marcados_recentes, gols_sofridos_recentes""",
-            
-            "int_classificacao_campeonato": """Classificação COMPLETA do Brasileirão:
-                Colunas: posicao, time, pontos_total, jogos_disputados, total_vitorias, total_empates, total_derrotas,
-                gols_marcados, gols_sofridos, saldo_gols, aproveitamento_pct, ultimos_5_jogos""",
-            
-            "int_proximo_adversario": "⚠️ DESATUALIZADO! Não use. Para próximos jogos, use Jogos_Completos_2024",
-            "int_vulnerabilidades_taticas": "Vulnerabilidades táticas do Inter (falhas_goleiro, disciplina, eficiencia_escanteios)",
-            "int_analise_pressao": "Análise psicológica sob pressão (comportamento_jogos_grandes, performance_final_campeonato)",
-            "int_analise_tatica_avancada": "Análise tática avançada (padroes_gols, vulnerabilidades_casa_fora, indisciplina)",
-            "int_confrontos_diretos": "Histórico Flamengo x Inter (total_jogos, vitorias_flamengo, vitorias_inter, empates)",
-            "int_impacto_jogadores": "Impacto de jogadores chave (jogadores_fundamentais, jogadores_problematicos, maior_impacto_ofensivo)",
-            "int_reacao_pos_gol": "Reação após sofrer gol (comportamento_pos_gol, media_cartoes_pos_gol)",
-            "int_vulnerabilidades_campo": "Vulnerabilidades por área (tipo_gols_sofridos, periodo_fadiga, melhor_periodo)",
-            "int_perfil_psicologico": "Perfil psicológico (periodo_jogo_intenso, capacidade_reacao, controle_emocional, dna_tatico)"
-        }
-        
         context = "📊 **Banco de Dados - Tático Pro**\n\n"
         context += "Tabelas disponíveis:\n"
-        for table, desc in table_descriptions.items():
+        for table, desc in TABLE_DESCRIPTIONS.items():
             context += f"• {table}: {desc}\n"
         
         return context
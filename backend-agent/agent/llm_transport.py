@@ -0,0 +1,460 @@
+"""
+Transporte HTTP compartilhado dos LLMs
+Um único pool de conexões (keep-alive) para o ChatOpenAI do LangChain e o
+OpenAI do LlamaIndex, com prazo por etapa, retries com jitter e hedging
+(segunda requisição quando a primeira passa do p95 observado)
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from .metrics import LLM_TRANSPORT
+
+# Respostas que valem uma nova tentativa (limite de taxa e falhas do upstream)
+RETRY_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Falhas de rede antes da resposta (PoolTimeout fica de fora: repetir só aumenta a fila)
+RETRY_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.ReadTimeout,
+    httpx.WriteError,
+    httpx.ReadError,
+    httpx.RemoteProtocolError,
+)
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _retry_after(response: httpx.Response) -> float:
+    """Segundos pedidos no header Retry-After (0 se ausente ou em formato de data)"""
+    try:
+        return max(0.0, float(response.headers.get("retry-after", "0")))
+    except ValueError:
+        return 0.0
+
+
+class _StageState:
+    """Latências e contadores de uma etapa (compartilhados pelos clientes sync e async)"""
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.errors = 0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> List[float]:
+        with self._lock:
+            return list(self.latencies)
+
+
+class LLMTransport:
+    """
+    Dono do pool HTTP dos LLMs
+
+    client()/async_client() devolvem clientes httpx de uma etapa (ex:
+    "sql_generation", "answer") que compartilham o mesmo pool. Cada chamada
+    tem um prazo total (todas as tentativas, até os headers da resposta);
+    depois dos headers, o streaming fica limitado pelo read timeout entre
+    trechos. Retries usam backoff exponencial com jitter completo e respeitam
+    Retry-After. Com hedging ligado, uma segunda requisição é enviada quando a
+    primeira passa do percentil configurado das latências recentes da etapa;
+    vale a primeira resposta e a outra é cancelada.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_seconds: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        retry_base_ms: float = 250,
+        retry_max_ms: float = 4000,
+        hedge: bool = False,
+        hedge_percentile: float = 95,
+        hedge_min_delay_ms: float = 1000,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        base_url: Optional[str] = None
+    ):
+        """
+        Configurar pool e políticas
+
+        Args:
+            max_connections: Conexões simultâneas com o upstream
+            max_keepalive: Conexões ociosas mantidas abertas
+            keepalive_seconds: Tempo máximo de uma conexão ociosa
+            connect_timeout: Timeout de conexão (por tentativa)
+            read_timeout: Timeout entre bytes recebidos (por tentativa)
+            max_retries: Tentativas extras após falha de rede ou RETRY_STATUS
+            retry_base_ms: Base do backoff exponencial
+            retry_max_ms: Teto do backoff (antes do jitter)
+            hedge: Enviar requisição de reserva após o percentil de latência
+            hedge_percentile: Percentil das latências recentes que dispara o hedge
+            hedge_min_delay_ms: Espera mínima antes do hedge
+            hedge_min_samples: Amostras necessárias antes de usar o percentil
+            latency_window: Latências recentes guardadas por etapa
+            base_url: URL da API compatível com OpenAI (None = padrão dos clientes)
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_seconds
+        )
+        self._sync_base = httpx.HTTPTransport(limits=limits)
+        self._async_base = httpx.AsyncHTTPTransport(limits=limits)
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base_ms / 1000
+        self.retry_max = retry_max_ms / 1000
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay_ms / 1000
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        self.base_url = base_url
+        self._stages: Dict[str, _StageState] = {}
+        self._stages_lock = threading.Lock()
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        if hedge:
+            # Requisições de reserva dos clientes síncronos (LlamaIndex roda em threads)
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=max_connections, thread_name_prefix="llm-hedge"
+            )
+
+    @classmethod
+    def from_env(cls) -> "LLMTransport":
+        """Criar a partir das variáveis LLM_* (ver config.example.env)"""
+        return cls(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            max_keepalive=int(os.getenv("LLM_MAX_KEEPALIVE", "10")),
+            keepalive_seconds=float(os.getenv("LLM_KEEPALIVE_SECONDS", "30")),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "30")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            retry_base_ms=float(os.getenv("LLM_RETRY_BASE_MS", "250")),
+            retry_max_ms=float(os.getenv("LLM_RETRY_MAX_MS", "4000")),
+            hedge=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay_ms=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "1000")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            base_url=os.getenv("OPENAI_BASE_URL") or None
+        )
+
+    def stage_deadline(self, stage: str, default: float) -> float:
+        """Prazo da etapa (LLM_<STAGE>_DEADLINE_SECONDS, ex: LLM_ANSWER_DEADLINE_SECONDS)"""
+        return float(os.getenv(f"LLM_{stage.upper()}_DEADLINE_SECONDS", str(default)))
+
+    def _stage(self, stage: str) -> _StageState:
+        with self._stages_lock:
+            state = self._stages.get(stage)
+            if state is None:
+                state = self._stages[stage] = _StageState(self.latency_window)
+            return state
+
+    def _timeout(self, deadline: float) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=min(self.connect_timeout, deadline),
+            read=min(self.read_timeout, deadline),
+            write=min(self.read_timeout, deadline),
+            pool=min(self.connect_timeout, deadline)
+        )
+
+    def client(self, stage: str, deadline: float) -> httpx.Client:
+        """
+        Cliente síncrono de uma etapa
+
+        Args:
+            stage: Nome da etapa (métricas e latências do hedge)
+            deadline: Prazo total de cada chamada, em segundos
+
+        Returns:
+            httpx.Client sobre o pool compartilhado
+        """
+        transport = _SyncStageTransport(self, stage, deadline)
+        return httpx.Client(transport=transport, timeout=self._timeout(deadline))
+
+    def async_client(self, stage: str, deadline: float) -> httpx.AsyncClient:
+        """
+        Cliente assíncrono de uma etapa
+
+        Args:
+            stage: Nome da etapa (métricas e latências do hedge)
+            deadline: Prazo total de cada chamada, em segundos
+
+        Returns:
+            httpx.AsyncClient sobre o pool compartilhado
+        """
+        transport = _AsyncStageTransport(self, stage, deadline)
+        return httpx.AsyncClient(transport=transport, timeout=self._timeout(deadline))
+
+    def hedge_delay(self, stage: str) -> Optional[float]:
+        """Espera antes do hedge (None = hedging desligado)"""
+        if not self.hedge:
+            return None
+        latencies = self._stage(stage).snapshot()
+        if len(latencies) < self.hedge_min_samples:
+            return max(self.hedge_min_delay, self.read_timeout / 2)
+        return max(self.hedge_min_delay, _percentile(latencies, self.hedge_percentile))
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Espera antes da tentativa attempt+1 (jitter completo; Retry-After como mínimo)"""
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempt)))
+        if response is not None:
+            delay = max(delay, min(self.retry_max, _retry_after(response)))
+        return delay
+
+    def record(self, stage: str, event: str) -> None:
+        self._stage(stage).count(event)
+        LLM_TRANSPORT.inc(stage=stage, outcome=event)
+
+    def attempt_timeout(self, request: httpx.Request, remaining: float) -> None:
+        """Limitar os timeouts da tentativa ao que resta do prazo"""
+        remaining = max(remaining, 0.001)
+        request.extensions["timeout"] = {
+            "connect": min(self.connect_timeout, remaining),
+            "read": min(self.read_timeout, remaining),
+            "write": min(self.read_timeout, remaining),
+            "pool": min(self.connect_timeout, remaining),
+        }
+
+    def close(self) -> None:
+        self._sync_base.close()
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aclose(self) -> None:
+        """Fechar as conexões do pool"""
+        self.close()
+        await self._async_base.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        stages = {}
+        with self._stages_lock:
+            items = list(self._stages.items())
+        for name, state in items:
+            latencies = state.snapshot()
+            stages[name] = {
+                "requests": state.requests,
+                "retries": state.retries,
+                "hedges": state.hedges,
+                "hedge_wins": state.hedge_wins,
+                "deadline_exceeded": state.deadline_exceeded,
+                "errors": state.errors,
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 1) if latencies else None,
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 1) if latencies else None,
+                "hedge_delay_ms": round(self.hedge_delay(name) * 1000, 1) if self.hedge else None,
+            }
+        return {
+            "max_connections": self.max_connections,
+            "max_retries": self.max_retries,
+            "hedge": self.hedge,
+            "stages": stages,
+        }
+
+
+class _AsyncStageTransport(httpx.AsyncBaseTransport):
+    """Transporte assíncrono de uma etapa: prazo, retries e hedging sobre o pool"""
+
+    def __init__(self, owner: LLMTransport, stage: str, deadline: float):
+        self._owner = owner
+        self._stage = stage
+        self._state = owner._stage(stage)
+        self._deadline = deadline
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        owner = self._owner
+        deadline = time.monotonic() + self._deadline
+        owner.record(self._stage, "requests")
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            owner.attempt_timeout(request, remaining)
+            try:
+                response = await asyncio.wait_for(self._send_hedged(request), max(remaining, 0.001))
+            except asyncio.TimeoutError:
+                owner.record(self._stage, "deadline_exceeded")
+                raise httpx.TimeoutException(
+                    f"Prazo de {self._deadline:g}s esgotado na chamada ao LLM ({self._stage})",
+                    request=request
+                )
+            except RETRY_ERRORS as e:
+                delay = owner.backoff(attempt)
+                if attempt >= owner.max_retries or time.monotonic() + delay >= deadline:
+                    owner.record(self._stage, "errors")
+                    raise
+                print(f"🔁 LLM ({self._stage}): {type(e).__name__}, nova tentativa em {delay * 1000:.0f}ms")
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    return response
+                delay = owner.backoff(attempt, response)
+                if attempt >= owner.max_retries or time.monotonic() + delay >= deadline:
+                    owner.record(self._stage, "errors")
+                    return response
+                await response.aclose()
+                print(f"🔁 LLM ({self._stage}): HTTP {response.status_code}, nova tentativa em {delay * 1000:.0f}ms")
+            owner.record(self._stage, "retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = await self._owner._async_base.handle_async_request(request)
+        if response.status_code < 500:
+            self._state.observe(time.monotonic() - started)
+        return response
+
+    async def _send_hedged(self, request: httpx.Request) -> httpx.Response:
+        delay = self._owner.hedge_delay(self._stage)
+        if delay is None:
+            return await self._send(request)
+
+        primary = asyncio.ensure_future(self._send(request))
+        tasks = [primary]
+        winner: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(self._send(request)))
+                self._owner.record(self._stage, "hedges")
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+            if winner is None:
+                return primary.result()  # as duas falharam: erro da original
+            if winner is not primary:
+                self._owner.record(self._stage, "hedge_wins")
+            return winner.result()
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    _discard_task(task)
+
+
+def _discard_task(task: asyncio.Future) -> None:
+    """Cancelar tentativa perdedora (ou fechar a resposta se ela já chegou)"""
+    def close(finished: asyncio.Future) -> None:
+        if not finished.cancelled() and finished.exception() is None:
+            asyncio.ensure_future(finished.result().aclose())
+
+    task.cancel()
+    task.add_done_callback(close)
+
+
+class _SyncStageTransport(httpx.BaseTransport):
+    """Transporte síncrono de uma etapa (mesmas políticas; hedge em thread à parte)"""
+
+    def __init__(self, owner: LLMTransport, stage: str, deadline: float):
+        self._owner = owner
+        self._stage = stage
+        self._state = owner._stage(stage)
+        self._deadline = deadline
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        owner = self._owner
+        deadline = time.monotonic() + self._deadline
+        owner.record(self._stage, "requests")
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            owner.attempt_timeout(request, remaining)
+            try:
+                response = self._send_hedged(request, remaining)
+            except RETRY_ERRORS as e:
+                delay = owner.backoff(attempt)
+                if attempt >= owner.max_retries or time.monotonic() + delay >= deadline:
+                    owner.record(self._stage, "errors")
+                    raise
+                print(f"🔁 LLM ({self._stage}): {type(e).__name__}, nova tentativa em {delay * 1000:.0f}ms")
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    return response
+                delay = owner.backoff(attempt, response)
+                if attempt >= owner.max_retries or time.monotonic() + delay >= deadline:
+                    owner.record(self._stage, "errors")
+                    return response
+                response.close()
+                print(f"🔁 LLM ({self._stage}): HTTP {response.status_code}, nova tentativa em {delay * 1000:.0f}ms")
+            owner.record(self._stage, "retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = self._owner._sync_base.handle_request(request)
+        if response.status_code < 500:
+            self._state.observe(time.monotonic() - started)
+        return response
+
+    def _send_hedged(self, request: httpx.Request, remaining: float) -> httpx.Response:
+        delay = self._owner.hedge_delay(self._stage)
+        executor = self._owner._hedge_executor
+        if delay is None or executor is None:
+            return self._send(request)
+
+        primary = executor.submit(self._send, request)
+        futures = [primary]
+        winner: Optional[Future] = None
+        try:
+            done, _ = wait(futures, timeout=min(delay, remaining))
+            if not done and delay < remaining:
+                futures.append(executor.submit(self._send, request))
+                self._owner.record(self._stage, "hedges")
+            pending = set(futures)
+            ends_at = time.monotonic() + remaining
+            while pending and winner is None:
+                done, pending = wait(pending, timeout=max(0.0, ends_at - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    self._owner.record(self._stage, "deadline_exceeded")
+                    raise httpx.TimeoutException(
+                        f"Prazo de {self._deadline:g}s esgotado na chamada ao LLM ({self._stage})",
+                        request=request
+                    )
+                winner = next((future for future in done if future.exception() is None), None)
+            if winner is None:
+                return primary.result()
+            if winner is not primary:
+                self._owner.record(self._stage, "hedge_wins")
+            return winner.result()
+        finally:
+            for future in futures:
+                if future is not winner:
+                    _discard_future(future)
+
+
+def _discard_future(future: Future) -> None:
+    def close(finished: Future) -> None:
+        if not finished.cancelled() and finished.exception() is None:
+            finished.result().close()
+
+    future.cancel()
+    future.add_done_callback(close)
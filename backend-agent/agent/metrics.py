@@ -0,0 +1,278 @@
+"""
+Métricas e tracing por etapa
+Histogramas de latência, tokens e linhas por etapa do pipeline, exportados no
+formato texto do Prometheus (/metrics), e log amostrado por requisição
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import os
+import random
+import threading
+import time
+
+# Etapas do pipeline de uma pergunta
+STAGES = ("routing", "sql_generation", "sql_execution", "synthesis", "answer")
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 500, 1000, 5000)
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Histograma cumulativo (semântica do Prometheus) com labels"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List[float]] = {}  # labels → [contagem por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_label_str(labels, le)} {_format_value(count)}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(labels, le)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_label_str(labels)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_sum{_label_str(labels)} {_format_value(series[-1])}")
+        return lines
+
+
+class Counter:
+    """Contador monotônico com labels"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(labels)} {_format_value(value)}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "tatico_stage_duration_seconds", "Tempo de cada etapa do pipeline", SECONDS_BUCKETS
+)
+STAGE_TOKENS = Histogram(
+    "tatico_stage_tokens", "Tokens de prompt/completion por chamada LLM de cada etapa", TOKEN_BUCKETS
+)
+STAGE_ROWS = Histogram(
+    "tatico_stage_rows", "Linhas retornadas por etapa", ROW_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "tatico_request_duration_seconds", "Tempo total por requisição", SECONDS_BUCKETS
+)
+REQUESTS = Counter("tatico_requests_total", "Requisições por tipo e desfecho")
+SQL_GUARD = Counter(
+    "tatico_sql_guard_total", "Queries geradas pelo guarda de custo (admitted, limited, rejected)"
+)
+
+LLM_TRANSPORT = Counter(
+    "tatico_llm_transport_total", "Chamadas HTTP aos LLMs por etapa (requests, retries, hedges, hedge_wins, deadline_exceeded, errors)"
+)
+ADMISSION = Counter(
+    "tatico_admission_total", "Perguntas do chat por decisão de admissão (admitted, queue_full, session_limit, queue_timeout, deadline)"
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "tatico_admission_wait_seconds", "Espera na fila de admissão das perguntas admitidas", SECONDS_BUCKETS
+)
+
+METRICS = [
+    STAGE_SECONDS, STAGE_TOKENS, STAGE_ROWS, REQUEST_SECONDS, REQUESTS, SQL_GUARD, LLM_TRANSPORT,
+    ADMISSION, ADMISSION_WAIT_SECONDS
+]
+
+
+class RequestTrace:
+    """Resumo das etapas de uma requisição (para o log amostrado)"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.llm_stage = "sql_generation"  # etapa a que pertencem as chamadas LLM do LlamaIndex
+        self.marks: Dict[str, float] = {}  # instantes (perf_counter) de eventos dentro das etapas
+        self.sql_source: Optional[str] = None  # onde rodou o último SQL: cache, coalesced, replica, db
+        self.outcome = "ok"
+
+    def add(self, stage: str, **values: float) -> None:
+        entry = self.stages.setdefault(stage, {})
+        for key, value in values.items():
+            entry[key] = entry.get(key, 0) + value
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        parts = []
+        for stage, values in self.stages.items():
+            details = [f"{values.get('seconds', 0) * 1000:.0f}ms"]
+            if values.get("prompt_tokens") or values.get("completion_tokens"):
+                details.append(f"{int(values.get('prompt_tokens', 0))}+{int(values.get('completion_tokens', 0))}tok")
+            if "rows" in values:
+                details.append(f"{int(values['rows'])} linhas")
+            parts.append(f"{stage}={'/'.join(details)}")
+        return f"[{self.kind} {self.elapsed() * 1000:.0f}ms] " + " ".join(parts)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("tatico_trace", default=None)
+
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.05"))
+LOG_SLOW_REQUEST_SECONDS = float(os.getenv("LOG_SLOW_REQUEST_MS", "10000")) / 1000
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def log_sampled(message: str) -> None:
+    """Log de caminho quente: só uma fração (LOG_SAMPLE_RATE) é impressa"""
+    if LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE:
+        print(message)
+
+
+@contextmanager
+def traced_request(kind: str) -> Iterator[RequestTrace]:
+    """
+    Rastrear uma requisição (chat, stream...)
+
+    Ao final registra a duração total e imprime o resumo das etapas para uma
+    amostra das requisições e para todas as lentas (LOG_SLOW_REQUEST_MS).
+
+    Args:
+        kind: Tipo da requisição (label das métricas)
+    """
+    trace = RequestTrace(kind)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.outcome = "error"
+        raise
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            pass  # gerador assíncrono finalizado em outro contexto
+        elapsed = trace.elapsed()
+        REQUEST_SECONDS.observe(elapsed, kind=kind)
+        REQUESTS.inc(kind=kind, outcome=trace.outcome)
+        if elapsed >= LOG_SLOW_REQUEST_SECONDS:
+            print(f"🐢 {trace.summary()}")
+        else:
+            log_sampled(f"⏱️ {trace.summary()}")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Medir o tempo de uma etapa (histograma + trace da requisição atual)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, seconds=time.perf_counter() - started)
+
+
+def record_stage(
+    name: str,
+    seconds: Optional[float] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    rows: Optional[int] = None
+) -> None:
+    """
+    Registrar medidas de uma etapa
+
+    Args:
+        name: Etapa (ver STAGES)
+        seconds: Tempo de parede
+        prompt_tokens: Tokens de entrada da chamada LLM
+        completion_tokens: Tokens de saída da chamada LLM
+        rows: Linhas retornadas
+    """
+    trace = _current_trace.get()
+    values: Dict[str, float] = {}
+    if seconds is not None:
+        STAGE_SECONDS.observe(seconds, stage=name)
+        values["seconds"] = seconds
+    if prompt_tokens is not None:
+        STAGE_TOKENS.observe(prompt_tokens, stage=name, type="prompt")
+        values["prompt_tokens"] = prompt_tokens
+    if completion_tokens is not None:
+        STAGE_TOKENS.observe(completion_tokens, stage=name, type="completion")
+        values["completion_tokens"] = completion_tokens
+    if rows is not None:
+        STAGE_ROWS.observe(rows, stage=name)
+        values["rows"] = rows
+    if trace is not None:
+        trace.add(name, **values)
+
+
+def render_gauges(prefix: str, stats: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Exportar os valores numéricos de um dict de estatísticas como gauges
+
+    Args:
+        prefix: Prefixo do nome da métrica (ex: "tatico_sql_cache")
+        stats: Dict de estatísticas (ex: TTLCache.stats()); dicts aninhados viram sufixos
+
+    Returns:
+        Linhas no formato do Prometheus
+    """
+    lines = []
+    for key, value in (stats or {}).items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            lines.extend(render_gauges(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render_metrics(extra_lines: List[str] = ()) -> str:
+    """Texto completo do /metrics"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+"""
+Normalização de texto
+Usada para comparar perguntas equivalentes (cache, roteamento)
+"""
+
+import re
+import unicodedata
+
+# Palavras que não mudam o sentido da pergunta (artigos, preposições, cortesia)
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas",
+    "de", "do", "da", "dos", "das", "d",
+    "em", "no", "na", "nos", "nas", "num", "numa",
+    "por", "pelo", "pela", "pelos", "pelas", "para", "pra", "pro", "pros", "pras",
+    "com", "e", "ou", "que", "se", "ao", "aos",
+    "me", "mim", "eu", "voce", "vc", "favor", "porfavor", "pf", "pfv",
+    "diga", "diz", "fale", "fala", "mostre", "mostra", "informe", "sabe", "saber",
+    "gostaria", "queria", "quero", "poderia", "pode", "consegue",
+    "qual", "quais", "quem",
+    "eh", "ser", "esta", "estao", "ta", "tao",  # "sao" não: "São Paulo"
+    "oi", "ola", "ai", "entao", "ainda", "agora", "atual", "atuais",
+}
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def strip_accents(text: str) -> str:
+    """
+    Remover acentos (próximo → proximo)
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Texto sem diacríticos
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def fold_text(text: str) -> str:
+    """
+    Minúsculas, sem acentos, sem pontuação e com espaços colapsados
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Texto normalizado (mantém todas as palavras)
+    """
+    text = strip_accents(text.lower()).replace("_", " ")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Gerar chave canônica de uma pergunta
+
+    "Quais os artilheiros do Internacional?" → "artilheiros internacional"
+
+    Args:
+        question: Pergunta do usuário
+
+    Returns:
+        Chave normalizada (sem acentos, pontuação, caixa e stopwords)
+    """
+    tokens = [token for token in fold_text(question).split() if token not in STOPWORDS]
+    return " ".join(tokens)
@@ -0,0 +1,173 @@
+"""
+Montagem do prompt do agente com orçamento de tokens
+O prompt de sistema é sempre o mesmo prefixo (cache de prompt do provedor);
+histórico e dados do banco são cortados para caber no orçamento
+"""
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .sessions import recent_unique
+from .tokens import count_tokens
+
+# Instruções que acompanham os dados do banco na pergunta
+DATA_INSTRUCTIONS = (
+    "**INSTRUÇÕES CRÍTICAS:**\n"
+    "- Use EXATAMENTE os nomes de times/jogadores que aparecem acima\n"
+    "- NÃO invente ou generalize nomes (não use 'Time A', 'Time B', etc)\n"
+    "- Cite os números EXATOS fornecidos\n"
+    "- NÃO diga que não tem acesso aos dados!"
+)
+
+# Tokens extras por mensagem no formato de chat da OpenAI (papel, separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def truncate_lines(text: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Cortar um texto em fronteira de linha para caber em max_tokens
+
+    Args:
+        text: Texto (ex: tabela de linhas do banco)
+        max_tokens: Orçamento de tokens
+
+    Returns:
+        Tuple (texto cortado, número de linhas omitidas)
+    """
+    lines = text.split("\n")
+    kept: List[str] = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    omitted = len(lines) - len(kept)
+    if omitted and not kept:
+        # Uma única linha enorme (ex: resposta sintetizada): cortar por caracteres
+        kept = [lines[0][:max(0, max_tokens) * 4]]
+        omitted = len(lines) - 1
+    return "\n".join(kept), omitted
+
+
+class PromptAssembler:
+    """
+    Monta [sistema, resumo?, histórico..., pergunta + dados] dentro de um orçamento
+
+    Prioridade do orçamento: prompt de sistema e pergunta (sempre inteiros),
+    depois os dados do banco (até context_tokens) e por fim o histórico, das
+    mensagens mais recentes para as mais antigas (até history_tokens). As
+    mensagens antigas que não couberem viram um resumo curto das perguntas.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = 6000,
+        history_tokens: int = 1500,
+        context_tokens: int = 3000,
+        history_messages: int = 20,
+        summary_questions: int = 5
+    ):
+        """
+        Configurar orçamento
+
+        Args:
+            system_prompt: Prompt de sistema (prefixo fixo de todas as requisições)
+            max_tokens: Orçamento total do prompt
+            history_tokens: Máximo de tokens de histórico
+            context_tokens: Máximo de tokens dos dados do banco
+            history_messages: Máximo de mensagens de histórico consideradas
+            summary_questions: Perguntas antigas listadas no resumo
+        """
+        self.system_message = SystemMessage(content=system_prompt)
+        self.system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        self.max_tokens = max_tokens
+        self.history_tokens = history_tokens
+        self.context_tokens = context_tokens
+        self.history_messages = history_messages
+        self.summary_questions = summary_questions
+
+    def _database_context(self, data: str, budget: int) -> Tuple[str, bool]:
+        if not data:
+            return "", False
+        fixed = count_tokens(DATA_INSTRUCTIONS) + 16
+        text, omitted = truncate_lines(data, max(0, budget - fixed))
+        if omitted:
+            text += f"\n... ({omitted} linhas omitidas por tamanho)"
+        return f"\n\n**DADOS REAIS DO BANCO DE DADOS:**\n{text}\n\n{DATA_INSTRUCTIONS}", bool(omitted)
+
+    def _summary(self, dropped: Sequence[BaseMessage]) -> str:
+        questions = [m.content for m in dropped if m.type == "human"][-self.summary_questions:]
+        if not questions:
+            return ""
+        items = "\n".join(f"- {q[:150]}" for q in questions)
+        return f"Resumo da conversa anterior (perguntas já feitas pelo usuário):\n{items}"
+
+    def build(
+        self,
+        history: Sequence[BaseMessage],
+        user_message: str,
+        data: str = ""
+    ) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """
+        Montar as mensagens do turno
+
+        Args:
+            history: Histórico da sessão (mensagens LangChain)
+            user_message: Pergunta atual
+            data: Dados do banco para a pergunta (vazio se não houver)
+
+        Returns:
+            Tuple (mensagens, estatísticas: prompt_tokens, history_messages,
+            history_dropped, context_truncated)
+        """
+        question_tokens = count_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+        remaining = self.max_tokens - self.system_tokens - question_tokens
+
+        context, truncated = self._database_context(data, min(self.context_tokens, remaining))
+        context_tokens = count_tokens(context)
+        remaining -= context_tokens
+
+        window = recent_unique(history, self.history_messages)
+        history_budget = min(self.history_tokens, remaining)
+        kept: List[BaseMessage] = []
+        used = 0
+        for message in reversed(window):
+            cost = count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > history_budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+
+        history = list(history)
+        while True:
+            oldest_kept = len(history)
+            if kept:
+                oldest_kept = max(i for i, message in enumerate(history) if message is kept[0])
+            dropped = history[:oldest_kept]
+            summary = self._summary(dropped)
+            summary_tokens = count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+            if used + summary_tokens <= history_budget:
+                break
+            if not kept:
+                summary, summary_tokens = "", 0
+                break
+            # Abrir espaço para o resumo descartando a mensagem mais antiga mantida
+            used -= count_tokens(kept[0].content) + MESSAGE_OVERHEAD_TOKENS
+            kept.pop(0)
+
+        messages: List[BaseMessage] = [self.system_message]
+        if summary:
+            messages.append(SystemMessage(content=summary))
+        messages.extend(kept)
+        messages.append(HumanMessage(content=user_message + context))
+
+        return messages, {
+            "prompt_tokens": self.system_tokens + summary_tokens + used + question_tokens + context_tokens,
+            "history_messages": len(kept),
+            "history_dropped": len(dropped),
+            "context_truncated": truncated,
+        }
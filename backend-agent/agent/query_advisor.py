@@ -0,0 +1,333 @@
+"""
+Conselheiro de índices e tabelas pré-calculadas (offline)
+Agrupa o log de queries por formato e recomenda índices ou tabelas int_* para
+as tabelas brutas de 2024, ordenados pelo tempo total que economizariam
+
+Uso (dentro de backend-agent/):
+    python -m agent.query_advisor
+    python -m agent.query_advisor --log /var/lib/tatico/query_log.jsonl --since-hours 24 --top 5
+"""
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import argparse
+import json
+import re
+import time
+
+from .query_log import get_query_log_path, read_query_log
+from .sql_utils import canonicalize_sql, sql_shape
+
+# Onde a query foi respondida: só "db" (ou desconhecido) custa tempo no banco principal
+DATABASE_SOURCES = ("db", None)
+
+_TABLE_RE = re.compile(r'\b(?:from|join)\s+(?:"([^"]+)"|([a-z_][\w.]*))(?:\s+(?:as\s+)?([a-z_]\w*))?')
+_NOT_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using",
+    "group", "order", "limit", "having", "union", "offset", "fetch", "window",
+}
+_COLUMN_RE = r'(?:([a-z_]\w*)\.)?(?:"([^"]+)"|([a-z_]\w*))'
+_FILTER_RE = re.compile(_COLUMN_RE + r"\s*(=|<>|!=|<=|>=|<|>|\bin\b|\blike\b|\bilike\b|\bbetween\b)")
+_AGGREGATE_RE = re.compile(r"\b(count|sum|avg|min|max)\(|\bgroup by\b")
+_CLAUSE_RE = {
+    "where": re.compile(r"\bwhere\b(.*?)(?=\bgroup by\b|\border by\b|\blimit\b|\bhaving\b|$)"),
+    "group": re.compile(r"\bgroup by\b(.*?)(?=\border by\b|\blimit\b|\bhaving\b|$)"),
+    "order": re.compile(r"\border by\b(.*?)(?=\blimit\b|$)"),
+}
+_RANGE_OPERATORS = {"<", ">", "<=", ">=", "between", "like", "ilike"}
+_SELECT_FROM_RE = re.compile(r"^select\b(.*?)\bfrom\b(.*?)(?=\bwhere\b|\bgroup by\b|\border by\b|\blimit\b|$)")
+_SQL_WORDS = {"and", "or", "not", "null", "is", "true", "false", "desc", "asc", "case", "when", "then", "else", "end"}
+
+
+@dataclass
+class ShapeStats:
+    """Estatísticas de um formato de query no log"""
+
+    shape: str
+    example: str
+    tables: List[str]
+    count: int = 0
+    total_ms: float = 0.0
+    rows: int = 0
+    latencies: List[float] = field(default_factory=list)
+    kinds: Counter = field(default_factory=Counter)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    @property
+    def p95_ms(self) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+
+
+@dataclass
+class Recommendation:
+    """Índice ou tabela pré-calculada sugerida, com a economia estimada"""
+
+    kind: str  # "index" ou "materialize"
+    table: str
+    columns: List[str]
+    statement: str
+    saving_ms: float = 0.0
+    queries: int = 0
+    shapes: List[str] = field(default_factory=list)
+
+
+def parse_tables(canonical: str) -> Dict[str, str]:
+    """
+    Tabelas da query e seus aliases
+
+    Args:
+        canonical: Query canônica (canonicalize_sql)
+
+    Returns:
+        Dict alias/nome → nome da tabela
+    """
+    tables: Dict[str, str] = {}
+    for quoted, plain, alias in _TABLE_RE.findall(canonical):
+        name = quoted or plain
+        tables[name] = name
+        if alias and alias not in _NOT_ALIAS:
+            tables[alias] = name
+    return tables
+
+
+def _clause(canonical: str, name: str) -> str:
+    match = _CLAUSE_RE[name].search(canonical)
+    return match.group(1) if match else ""
+
+
+def _resolve(tables: Dict[str, str], qualifier: str, column: str) -> Optional[str]:
+    if qualifier:
+        return tables.get(qualifier)
+    names = set(tables.values())
+    return next(iter(names)) if len(names) == 1 else None  # coluna sem prefixo: só com uma tabela
+
+
+def access_columns(canonical: str) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Colunas usadas em filtros (igualdade/intervalo), GROUP BY e ORDER BY, por tabela
+
+    Heurística por regex sobre a query canônica: suficiente para o SQL gerado
+    pelo agente (um SELECT por pergunta), não é um parser completo.
+
+    Args:
+        canonical: Query canônica
+
+    Returns:
+        Dict tabela → {"equality": [...], "range": [...], "group": [...], "order": [...]}
+    """
+    tables = parse_tables(canonical)
+    result: Dict[str, Dict[str, List[str]]] = defaultdict(
+        lambda: {"equality": [], "range": [], "group": [], "order": []}
+    )
+
+    def add(table: Optional[str], bucket: str, column: str):
+        if table and column not in _SQL_WORDS and column not in result[table][bucket]:
+            result[table][bucket].append(column)
+
+    where = _clause(canonical, "where") + " " + " ".join(
+        re.findall(r"\bon\b(.*?)(?=\bjoin\b|\bwhere\b|\bgroup by\b|\border by\b|\blimit\b|$)", canonical)
+    )
+    for qualifier, quoted, plain, operator in _FILTER_RE.findall(where):
+        column = quoted or plain
+        bucket = "range" if operator in _RANGE_OPERATORS else "equality"
+        add(_resolve(tables, qualifier, column), bucket, column)
+
+    for bucket in ("group", "order"):
+        for qualifier, quoted, plain in re.findall(_COLUMN_RE, _clause(canonical, bucket)):
+            column = quoted or plain
+            add(_resolve(tables, qualifier, column), bucket, column)
+    return dict(result)
+
+
+def collect_shapes(
+    entries: Iterable[Dict[str, Any]],
+    raw_only: bool = True
+) -> List[ShapeStats]:
+    """
+    Agrupar registros do log por formato (só o que rodou no banco principal)
+
+    Args:
+        entries: Registros do log de queries
+        raw_only: Ignorar formatos que só leem tabelas int_*
+
+    Returns:
+        Formatos ordenados por tempo total
+    """
+    shapes: Dict[str, ShapeStats] = {}
+    for entry in entries:
+        sql = entry.get("sql")
+        if not sql or entry.get("src") not in DATABASE_SOURCES or entry.get("ms") is None:
+            continue
+        shape = sql_shape(sql)
+        stats = shapes.get(shape)
+        if stats is None:
+            tables = sorted(set(parse_tables(canonicalize_sql(sql)).values()))
+            if raw_only and all(table.lower().startswith("int_") for table in tables):
+                continue
+            stats = shapes[shape] = ShapeStats(shape=shape, example=sql, tables=tables)
+        stats.count += 1
+        stats.total_ms += entry["ms"]
+        stats.rows += entry.get("rows") or 0
+        stats.latencies.append(entry["ms"])
+        stats.kinds[(entry.get("kind") or "?").split(":")[0]] += 1
+    return sorted(shapes.values(), key=lambda s: s.total_ms, reverse=True)
+
+
+def precomputed_statement(name: str, canonical: str, key_columns: List[str], usage: Dict[str, List[str]]) -> Optional[str]:
+    """
+    CREATE TABLE da tabela pré-calculada: os filtros de igualdade saem do WHERE
+    e entram no GROUP BY (uma linha por combinação, filtrada depois na réplica)
+
+    Só para agregações de uma tabela com filtros de igualdade sem OR; nos
+    demais casos retorna None (a recomendação mostra a query de exemplo).
+    """
+    match = _SELECT_FROM_RE.search(canonical)
+    where = _clause(canonical, "where")
+    if (match is None or usage["range"] or re.search(r"\bor\b|\bjoin\b|\(select\b", canonical)
+            or not key_columns):
+        return None
+    select_list, source = match.group(1).strip(), match.group(2).strip()
+    if where and not usage["equality"]:
+        return None
+    extra = [column for column in key_columns if column not in usage["group"]]
+    columns = ", ".join(extra + [select_list]) if extra else select_list
+    return f"CREATE TABLE {name} AS SELECT {columns} FROM {source} GROUP BY {', '.join(key_columns)};"
+
+
+def _index_name(table: str, columns: List[str]) -> str:
+    base = re.sub(r"\W+", "_", f"idx_{table}_{'_'.join(columns)}".lower())
+    return base[:63]  # limite de identificador do PostgreSQL
+
+
+def recommend(
+    shapes: Iterable[ShapeStats],
+    indexed_ms: float = 5.0,
+    precomputed_ms: float = 1.0
+) -> List[Recommendation]:
+    """
+    Recomendar índices e tabelas pré-calculadas
+
+    - Índice: colunas de igualdade primeiro, depois a primeira de intervalo ou
+      ordenação (até 3), por tabela bruta filtrada. Economia estimada = tempo
+      total dos formatos atendidos - execuções x indexed_ms.
+    - Tabela pré-calculada: formatos com agregação (COUNT/SUM/AVG/GROUP BY)
+      sobre tabelas brutas viram uma tabela int_* agregada pelas colunas de
+      GROUP BY + filtros (servida pela réplica local). Economia = tempo total -
+      execuções x precomputed_ms.
+
+    Args:
+        shapes: Formatos de collect_shapes
+        indexed_ms: Tempo esperado de uma query com índice
+        precomputed_ms: Tempo esperado lendo uma tabela int_* (réplica local)
+
+    Returns:
+        Recomendações ordenadas pela economia estimada
+    """
+    recommendations: Dict[Tuple[str, str, Tuple[str, ...]], Recommendation] = {}
+
+    def add(kind: str, table: str, columns: List[str], statement: str, stats: ShapeStats, expected_ms: float):
+        key = (kind, table, tuple(columns))
+        rec = recommendations.get(key)
+        if rec is None:
+            rec = recommendations[key] = Recommendation(kind, table, columns, statement)
+        rec.saving_ms += max(0.0, stats.total_ms - stats.count * expected_ms)
+        rec.queries += stats.count
+        rec.shapes.append(stats.shape)
+
+    for stats in shapes:
+        canonical = canonicalize_sql(stats.example)
+        columns_by_table = access_columns(canonical)
+        raw_tables = [table for table in columns_by_table if not table.lower().startswith("int_")]
+
+        if _AGGREGATE_RE.search(canonical) and raw_tables:
+            table = raw_tables[0]
+            usage = columns_by_table[table]
+            key_columns = list(dict.fromkeys(usage["group"] + usage["equality"]))
+            name = f"int_{re.sub(r'_?2024.*$', '', table.lower())}_por_{'_'.join(key_columns) or 'total'}"
+            statement = precomputed_statement(name, canonical, key_columns, usage) or (
+                f'CREATE TABLE {name} AS -- agregar por {", ".join(key_columns) or "(nenhuma coluna)"}\n'
+                f"    {stats.example.strip()}"
+            )
+            add("materialize", table, key_columns, statement, stats, precomputed_ms)
+            continue
+
+        disjunctive = bool(re.search(r"\bor\b", _clause(canonical, "where")))
+        for table in raw_tables:
+            usage = columns_by_table[table]
+            if disjunctive:
+                # a = ? OR b = ?: um índice por coluna (bitmap OR), não um composto
+                candidates = [[column] for column in usage["equality"]]
+            else:
+                columns = list(usage["equality"][:2])
+                for column in usage["range"] + usage["order"]:
+                    if column not in columns:
+                        columns.append(column)
+                        break
+                candidates = [columns[:3]] if columns else []
+            for columns in candidates:
+                column_list = ", ".join(f'"{column}"' for column in columns)
+                statement = (
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {_index_name(table, columns)} '
+                    f'ON "{table}" ({column_list});'
+                )
+                add("index", table, columns, statement, stats, indexed_ms)
+
+    return sorted(recommendations.values(), key=lambda r: r.saving_ms, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=get_query_log_path(), help="Arquivo do log de queries (QUERY_LOG_PATH)")
+    parser.add_argument("--since-hours", type=float, default=None, help="Só registros das últimas N horas")
+    parser.add_argument("--top", type=int, default=10, help="Quantidade de formatos/recomendações exibidos")
+    parser.add_argument("--indexed-ms", type=float, default=5.0, help="Tempo esperado de uma query com índice")
+    parser.add_argument("--precomputed-ms", type=float, default=1.0, help="Tempo esperado lendo uma tabela int_*")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    shapes = collect_shapes(read_query_log(args.log, since=since))
+    recommendations = recommend(shapes, args.indexed_ms, args.precomputed_ms)
+
+    if args.json:
+        print(json.dumps({
+            "shapes": [
+                {"shape": s.shape, "tables": s.tables, "count": s.count, "total_ms": round(s.total_ms, 1),
+                 "mean_ms": round(s.mean_ms, 1), "p95_ms": round(s.p95_ms, 1), "rows": s.rows,
+                 "kinds": dict(s.kinds)}
+                for s in shapes[:args.top]
+            ],
+            "recommendations": [
+                {"kind": r.kind, "table": r.table, "columns": r.columns, "saving_ms": round(r.saving_ms, 1),
+                 "queries": r.queries, "statement": r.statement}
+                for r in recommendations[:args.top]
+            ],
+        }, ensure_ascii=False, indent=2))
+        return
+
+    if not shapes:
+        print(f"Nenhuma query em tabela bruta executada no banco em {args.log}")
+        return
+
+    print(f"📊 Formatos de query mais caros ({len(shapes)} no total)\n")
+    print(f"{'total (ms)':>11} {'exec.':>6} {'média':>8} {'p95':>8}  formato")
+    for s in shapes[:args.top]:
+        print(f"{s.total_ms:>11.0f} {s.count:>6} {s.mean_ms:>8.1f} {s.p95_ms:>8.1f}  {s.shape[:110]}")
+
+    print("\n💡 Recomendações (economia estimada)\n")
+    if not recommendations:
+        print("Nenhuma: os formatos não filtram nem agregam tabelas brutas")
+    for rank, rec in enumerate(recommendations[:args.top], start=1):
+        kind = "índice" if rec.kind == "index" else "tabela int_*"
+        print(f"{rank}. [{kind}] {rec.table} ({', '.join(rec.columns) or '-'}): "
+              f"~{rec.saving_ms:.0f} ms em {rec.queries} execuções")
+        print(f"   {rec.statement}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Log de queries executadas pelo agente
+Arquivo JSONL só de acréscimo (uma linha por SQL, com tempo e linhas), lido
+offline pelo agent.query_advisor
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import threading
+import time
+
+DEFAULT_QUERY_LOG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "query_log.jsonl"
+)
+
+
+def get_query_log_path() -> str:
+    """Caminho do log (QUERY_LOG_PATH ou .cache/ do backend)"""
+    return os.getenv("QUERY_LOG_PATH", DEFAULT_QUERY_LOG_PATH)
+
+
+class QueryLog:
+    """
+    Escritor do log de queries
+
+    As linhas ficam num buffer e vão para o disco a cada flush_every registros
+    ou flush_seconds (cada flush é uma escrita em modo append, então vários
+    workers podem compartilhar o arquivo). Acima de max_bytes o arquivo vira
+    <path>.1 e um novo é aberto.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        flush_every: int = 20,
+        flush_seconds: float = 5.0
+    ):
+        """
+        Abrir (ou criar) o log
+
+        Args:
+            path: Arquivo JSONL
+            max_bytes: Tamanho que dispara a rotação
+            flush_every: Registros no buffer antes de gravar
+            flush_seconds: Tempo máximo de um registro no buffer
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self.records = 0
+        self.rotations = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def record(self, **fields: Any) -> None:
+        """
+        Acrescentar um registro (ts é preenchido automaticamente)
+
+        Args:
+            **fields: kind, sql, ms, rows, src...
+        """
+        line = json.dumps(
+            {"ts": round(time.time(), 3), **fields},
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str
+        )
+        with self._lock:
+            self._buffer.append(line + "\n")
+            self.records += 1
+            if (len(self._buffer) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_seconds):
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = "".join(self._buffer)
+        self._buffer.clear()
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+                size = f.tell()
+            if size > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+                self.rotations += 1
+        except OSError as e:
+            print(f"⚠️ Falha ao gravar log de queries ({self.path}): {str(e)}")
+
+    def close(self) -> None:
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "records": self.records,
+                "buffered": len(self._buffer),
+                "rotations": self.rotations,
+            }
+
+
+def read_query_log(path: str, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Ler registros do log (arquivo rotacionado primeiro), ignorando linhas corrompidas
+
+    Args:
+        path: Arquivo JSONL
+        since: Só registros com ts >= since (epoch)
+
+    Yields:
+        Registros (dicts)
+    """
+    for file_path in (path + ".1", path):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or entry.get("ts", 0) >= since:
+                    yield entry
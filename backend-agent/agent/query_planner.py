@@ -0,0 +1,218 @@
+"""
+Planejador de sub-consultas
+Perguntas com várias partes ("compare Flamengo e Internacional nos últimos
+jogos e na classificação") viram sub-consultas independentes, executadas em
+paralelo e juntadas antes da resposta do agente
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+
+from .normalize import fold_text
+from .router import RouteDecision
+from .sql_templates import RoundCalendar, question_rounds
+from .sql_utils import sql_literal
+
+# Pergunta que relaciona os times ("Flamengo x Palmeiras", "jogo do Inter contra o
+# Bahia"): não dá para responder um time de cada vez (texto já sem acentos)
+_RELATION_RE = re.compile(r"\b(x|contra|vs|versus|entre|confrontos?|enfrent\w*|duelos?)\b")
+
+
+@dataclass(frozen=True)
+class Facet:
+    """Parte de uma pergunta com SQL validado (slot {teams}; {rounds} quando aplicável)"""
+
+    intent: str
+    label: str
+    team_sql: str
+    sql: Optional[str] = None  # sem times citados (None = exige time)
+    covers: Tuple[str, ...] = ()  # outras intenções respondidas por esta parte
+    terms: Optional[str] = None  # regex que a pergunta (sem acentos) precisa conter
+    teams_covered: Tuple[str, ...] = ()  # times que a tabela inteira já descreve (sem filtro)
+
+
+FACETS = [
+    Facet(
+        intent="comparacao",
+        label="Estatísticas comparativas",
+        team_sql="SELECT * FROM int_stats_comparativas WHERE time IN ({teams})",
+        sql="SELECT * FROM int_stats_comparativas",
+    ),
+    # Só o histórico Flamengo x Inter: confronto com outro time fica para o NL→SQL
+    Facet(
+        intent="confrontos",
+        label="Confrontos diretos",
+        team_sql="SELECT * FROM int_confrontos_diretos",
+        sql="SELECT * FROM int_confrontos_diretos",
+        covers=("resultados",),
+        teams_covered=("Flamengo", "Internacional"),
+    ),
+    Facet(
+        intent="momentum",
+        label="Momento recente (últimos jogos)",
+        team_sql=(
+            "SELECT time, pontos_recentes, sequencia_recente FROM int_momentum_atual "
+            "WHERE time IN ({teams})"
+        ),
+        sql="SELECT time, pontos_recentes, sequencia_recente FROM int_momentum_atual",
+        covers=("resultados",),
+    ),
+    Facet(
+        intent="classificacao",
+        label="Classificação",
+        team_sql=(
+            "SELECT posicao, time, pontos_total, jogos_disputados, total_vitorias, "
+            "total_empates, total_derrotas FROM int_classificacao_campeonato "
+            "WHERE time IN ({teams}) ORDER BY posicao"
+        ),
+        sql=(
+            "SELECT posicao, time, pontos_total, jogos_disputados, total_vitorias, "
+            "total_empates, total_derrotas FROM int_classificacao_campeonato ORDER BY posicao"
+        ),
+    ),
+    Facet(
+        intent="artilheiros",
+        label="Artilheiros",
+        team_sql=(
+            "SELECT adversario AS time, principais_artilheiros FROM int_jogadores_detalhados "
+            "WHERE adversario IN ({teams})"
+        ),
+    ),
+    Facet(
+        intent="substituicoes",
+        label="Mais substituídos",
+        team_sql=(
+            "SELECT adversario AS time, mais_substituidos FROM int_jogadores_detalhados "
+            "WHERE adversario IN ({teams})"
+        ),
+    ),
+    Facet(
+        intent="escalacao",
+        label="Mais utilizados",
+        team_sql=(
+            "SELECT adversario AS time, jogadores_mais_utilizados FROM int_jogadores_detalhados "
+            "WHERE adversario IN ({teams})"
+        ),
+        terms=r"\bmais (utilizad|usad)\w*",  # titulares, formação... ficam para o NL→SQL
+    ),
+    Facet(
+        intent="proximos_jogos",
+        label="Próximos jogos",
+        team_sql=(
+            'SELECT round, date, home_team_name, away_team_name, venue_name, venue_city '
+            'FROM "Jogos_Completos_2024" '
+            'WHERE (home_team_name IN ({teams}) OR away_team_name IN ({teams})) '
+            'AND round IN ({rounds}) ORDER BY date ASC'
+        ),
+        covers=("resultados",),
+    ),
+]
+
+
+@dataclass(frozen=True)
+class SubQuery:
+    """Sub-consulta do plano: SQL validado ou pergunta para o NL→SQL"""
+
+    label: str
+    sql: Optional[str] = None
+    question: Optional[str] = None
+
+
+class QueryPlanner:
+    """
+    Decompõe perguntas de várias intenções (ou vários times) em sub-consultas
+
+    Cada intenção com SQL validado vira uma sub-consulta filtrada pelos times
+    citados. O que sobra (ex: estatísticas avulsas) vai para o NL→SQL — uma
+    pergunta por time quando há mais de um, para o LLM não precisar juntar
+    tudo em um único SELECT, exceto quando a pergunta relaciona os times
+    (placar de "Flamengo x Palmeiras", jogo "contra"). Sem ganho (uma única sub-consulta pelo LLM),
+    plan() retorna None e a pergunta segue o caminho normal.
+    """
+
+    def __init__(self, facets=FACETS, max_subqueries: int = 6, calendar: Optional[RoundCalendar] = None):
+        """
+        Args:
+            facets: Partes com SQL validado
+            max_subqueries: Máximo de sub-consultas por pergunta
+            calendar: Calendário de rodadas (slot {rounds})
+        """
+        self._by_intent: Dict[str, Facet] = {facet.intent: facet for facet in facets}
+        self.calendar = calendar
+        self.max_subqueries = max_subqueries
+        self._lock = threading.Lock()
+        self.plans = 0
+        self.subqueries = 0
+        self.nl_subqueries = 0
+
+    def plan(self, question: str, route: Optional[RouteDecision]) -> Optional[List[SubQuery]]:
+        """
+        Montar o plano da pergunta
+
+        Args:
+            question: Pergunta original
+            route: Decisão do roteador de intenções
+
+        Returns:
+            Lista de sub-consultas ou None (pergunta de uma parte só)
+        """
+        if route is None or not route.needs_data or route.players or not route.intents:
+            return None
+
+        teams = ", ".join(sql_literal(team) for team in route.teams)
+        rounds = ", ".join(sql_literal(r) for r in question_rounds(question, self.calendar))
+        subqueries: List[SubQuery] = []
+        covered = set()
+        text = fold_text(question)
+        for intent in route.intents:
+            facet = self._by_intent.get(intent)
+            if facet is None or intent in covered:
+                continue
+            if "{rounds}" in facet.team_sql and not rounds:
+                continue  # sem próximas rodadas conhecidas: fica para o NL→SQL
+            if facet.terms and not re.search(facet.terms, text):
+                continue
+            if facet.teams_covered and not set(route.teams) <= set(facet.teams_covered):
+                continue
+            if route.teams:
+                sql = facet.team_sql.format(teams=teams, rounds=rounds)
+            elif facet.sql is not None:
+                sql = facet.sql
+            else:
+                continue
+            subqueries.append(SubQuery(label=facet.label, sql=sql))
+            covered.add(intent)
+            covered.update(facet.covers)
+
+        residual = [intent for intent in route.intents if intent not in covered]
+        if residual:
+            if len(route.teams) > 1 and not _RELATION_RE.search(text):
+                subqueries.extend(
+                    SubQuery(label=f"Dados do {team}", question=f"{question} (considere apenas o {team})")
+                    for team in route.teams
+                )
+            else:
+                subqueries.append(SubQuery(label="Outros dados", question=question))
+
+        validated = [sub for sub in subqueries if sub.sql is not None]
+        if not validated and len(subqueries) < 2:
+            return None
+        if len(validated) == 1 and len(subqueries) == 1 and len(route.teams) < 2:
+            return None  # uma parte só: já é o caso dos templates
+        subqueries = subqueries[:self.max_subqueries]
+
+        with self._lock:
+            self.plans += 1
+            self.subqueries += len(subqueries)
+            self.nl_subqueries += sum(1 for sub in subqueries if sub.sql is None)
+        return subqueries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "plans": self.plans,
+                "subqueries": self.subqueries,
+                "nl_subqueries": self.nl_subqueries,
+            }
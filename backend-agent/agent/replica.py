@@ -0,0 +1,199 @@
+"""
+Réplica local das tabelas analíticas (int_*)
+As tabelas int_* são pequenas e só mudam quando uma rodada é processada; uma
+cópia em SQLite na memória responde as consultas sem ir ao Supabase
+"""
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+import json
+import threading
+import time
+import uuid
+
+
+def _to_sqlite(value: Any) -> Any:
+    """Converter valores do PostgreSQL para tipos aceitos pelo SQLite"""
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class TableReplica:
+    """
+    Cópia em memória (SQLite) de um conjunto pequeno de tabelas
+
+    O recarregamento monta um banco novo e só então troca a referência, então
+    consultas em andamento nunca veem uma cópia pela metade. Enquanto a primeira
+    carga não termina, can_serve() retorna False e tudo vai para o banco principal.
+    """
+
+    def __init__(
+        self,
+        source_engine: Engine,
+        tables: Iterable[str],
+        max_rows: int = 50000,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Configurar réplica (a carga é feita em load())
+
+        Args:
+            source_engine: Engine do banco principal
+            tables: Tabelas a copiar
+            max_rows: Tabelas maiores que isso não são copiadas
+            clock: Fonte de tempo (injetável para testes)
+        """
+        self.source_engine = source_engine
+        self.tables = list(tables)
+        self.max_rows = max_rows
+        self._clock = clock
+        self._engine: Optional[Engine] = None
+        self._loaded_tables: frozenset = frozenset()
+        self._lock = threading.Lock()  # conexão SQLite única, compartilhada entre threads
+        self._load_lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self.load_ms: Optional[float] = None
+        self.row_counts: Dict[str, int] = {}
+        self.local_queries = 0
+        self.fallbacks = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._engine is not None
+
+    def load(self, tables: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        (Re)carregar as tabelas a partir do banco principal
+
+        Args:
+            tables: Subconjunto a recarregar (None = todas); as demais são copiadas da réplica atual
+
+        Returns:
+            Dict tabela → linhas copiadas
+        """
+        with self._load_lock:
+            started = time.perf_counter()
+            reload = set(tables or self.tables) if self.ready else set(self.tables)
+
+            engine = create_engine(
+                "sqlite://",
+                poolclass=StaticPool,
+                connect_args={"check_same_thread": False}
+            )
+            row_counts: Dict[str, int] = {}
+            with engine.begin() as target:
+                for table in self.tables:
+                    if table in reload:
+                        columns, rows = self._read_source(table)
+                    elif table in self._loaded_tables:
+                        columns, rows = self._read_replica(table)
+                    else:
+                        continue
+                    if columns is None:
+                        continue
+                    self._write_table(target, table, columns, rows)
+                    row_counts[table] = len(rows)
+
+            with self._lock:
+                old_engine = self._engine
+                self._engine = engine
+                self._loaded_tables = frozenset(row_counts)
+            if old_engine is not None:
+                old_engine.dispose()
+
+            self.row_counts = row_counts
+            self.loaded_at = self._clock()
+            self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+            return row_counts
+
+    def _read_source(self, table: str) -> Tuple[Optional[List[str]], List[tuple]]:
+        """Ler tabela inteira do banco principal (None se for grande demais)"""
+        with self.source_engine.connect() as conn:
+            result = conn.execute(text(f'SELECT * FROM "{table}" LIMIT {self.max_rows + 1}'))
+            columns = list(result.keys())
+            rows = result.fetchall()
+        if len(rows) > self.max_rows:
+            print(f"⚠️ Réplica: {table} tem mais de {self.max_rows} linhas, fica no banco principal")
+            return None, []
+        return columns, rows
+
+    def _read_replica(self, table: str) -> Tuple[List[str], List[tuple]]:
+        """Ler tabela da réplica atual (recarga parcial)"""
+        with self._lock, self._engine.connect() as conn:
+            result = conn.execute(text(f'SELECT * FROM "{table}"'))
+            return list(result.keys()), result.fetchall()
+
+    @staticmethod
+    def _write_table(conn, table: str, columns: List[str], rows: List[tuple]) -> None:
+        # Colunas sem tipo: o SQLite guarda cada valor com o tipo em que foi inserido
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        conn.execute(text(f'CREATE TABLE "{table}" ({column_list})'))
+        if rows:
+            placeholders = ", ".join("?" for _ in columns)
+            conn.exec_driver_sql(
+                f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})',
+                [tuple(_to_sqlite(value) for value in row) for row in rows]
+            )
+
+    def can_serve(self, tables: Iterable[str]) -> bool:
+        """
+        Verificar se a query pode rodar localmente
+
+        Args:
+            tables: Tabelas referenciadas pela query
+
+        Returns:
+            True se todas estão na réplica
+        """
+        tables = set(tables)
+        return bool(tables) and tables <= self._loaded_tables
+
+    def execute(self, sql: str) -> Tuple[List[str], List[tuple]]:
+        """
+        Executar query na réplica
+
+        Args:
+            sql: Query SQL (dialeto do SQLite; erros devem cair para o banco principal)
+
+        Returns:
+            Tuple (colunas, linhas)
+        """
+        with self._lock, self._engine.connect() as conn:
+            result = conn.execute(text(sql))
+            columns = list(result.keys())
+            rows = result.fetchall()
+        self.local_queries += 1
+        return columns, rows
+
+    def record_fallback(self) -> None:
+        """Registrar query que casou com a réplica mas precisou ir ao banco principal"""
+        self.fallbacks += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estado da réplica
+
+        Returns:
+            Dict com tabelas carregadas, linhas, idade e contadores de uso
+        """
+        return {
+            "ready": self.ready,
+            "tables": len(self._loaded_tables),
+            "rows": sum(self.row_counts.values()),
+            "loaded_at": self.loaded_at,
+            "age_seconds": round(self._clock() - self.loaded_at, 1) if self.loaded_at else None,
+            "load_ms": self.load_ms,
+            "local_queries": self.local_queries,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,239 @@
+"""
+Roteador de intenções
+Decide se a mensagem precisa de dados do banco e extrai times/jogadores citados
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+import time
+
+from .normalize import STOPWORDS, fold_text
+
+# Termos que indicam pergunta sobre dados, por intenção (texto já sem acentos).
+# A ordem define a prioridade quando mais de uma intenção casa.
+INTENT_PATTERNS: List[Tuple[str, str]] = [
+    ("proximos_jogos", r"proxim\w*|agenda|calendario|rodadas?|enfrenta\w*"),
+    ("substituicoes", r"substitu\w*|banco de reservas"),
+    ("artilheiros", r"artilheir\w*|goleador\w*|assistenc\w*"),
+    ("escalacao", r"escala\w*|titular\w*|formac\w*|onze inicial|mais utilizad\w*|resistent\w*|relacionad\w*"),
+    ("classificacao", r"classifica\w*|tabela|posic\w*|pontos?|lider\w*|aproveitamento|rebaixa\w*|g4|z4"),
+    ("confrontos", r"confrontos?|historico|retrospecto|frente a frente"),
+    ("comparacao", r"compar\w*|versus|vs|diferenc\w*"),
+    ("momentum", r"momentum|momento|sequencia|fase|ultimos"),
+    ("estatisticas", r"estatistic\w*|medias?|total|gols?|marc(ou|aram)|sofr\w*|chutes?|finaliza\w*|posse"
+                     r"|escanteios?|faltas?|cart(ao|oes)|passes?|desarmes?|dribles?|rating|minutos?|tempo de jogo"),
+    ("resultados", r"resultados?|placar\w*|ganh\w*|venc\w*|perd\w*|empat\w*|jogos?|partidas?"),
+    ("tatico", r"tatic\w*|vulnerab\w*|pressao|psicolog\w*|fraquez\w*|pontos fortes|adversari\w*"
+               r"|tecnicos?|treinador\w*|jogadores?|elenco|plantel"),
+]
+
+# Apelidos comuns → grafias possíveis do time no banco (comparadas sem acentos,
+# caixa e hífen; vale a primeira que existir entre os times carregados)
+TEAM_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "inter": ("Internacional",),
+    "colorado": ("Internacional",),
+    "fla": ("Flamengo",),
+    "mengao": ("Flamengo",),
+    "mengo": ("Flamengo",),
+    "flu": ("Fluminense",),
+    "timao": ("Corinthians",),
+    "verdao": ("Palmeiras",),
+    "tricolor paulista": ("Sao Paulo",),
+    "galo": ("Atletico-MG", "Atletico Mineiro"),
+    "fogao": ("Botafogo", "Botafogo RJ"),
+    "vasco": ("Vasco DA Gama",),
+    "peixe": ("Santos",),
+}
+
+
+@dataclass
+class RouteDecision:
+    """Resultado do roteamento de uma mensagem"""
+
+    needs_data: bool
+    intent: str
+    intents: List[str] = field(default_factory=list)  # todas as intenções que casaram
+    teams: List[str] = field(default_factory=list)
+    players: List[str] = field(default_factory=list)
+    elapsed_us: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "needs_data": self.needs_data,
+            "intent": self.intent,
+            "intents": self.intents,
+            "teams": self.teams,
+            "players": self.players,
+            "elapsed_us": self.elapsed_us,
+        }
+
+
+class EntityTrie:
+    """
+    Trie de sequências de palavras (nomes com várias palavras, ex: "bruno henrique")
+
+    A busca percorre a mensagem uma vez, tentando em cada posição o maior nome
+    que começa ali.
+    """
+
+    _END = "\0"
+
+    def __init__(self):
+        self._root: Dict = {}
+        self.size = 0
+
+    def add(self, name: str, value: Tuple[str, str]) -> None:
+        tokens = fold_text(name).split()
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if self._END not in node:
+            self.size += 1
+        node[self._END] = value
+
+    def find_all(self, tokens: List[str]) -> List[Tuple[str, str]]:
+        found = []
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            match: Optional[Tuple[str, str]] = None
+            match_end = i
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if self._END in node:
+                    match, match_end = node[self._END], j
+            if match:
+                found.append(match)
+                i = match_end
+            else:
+                i += 1
+        return found
+
+
+class IntentRouter:
+    """
+    Roteador compilado: regex única por intenção + trie de entidades
+
+    Palavras genéricas ("qual", "time", "quando") sozinhas não levam ao banco;
+    só termos de dados ou a citação de um time/jogador. Normaliza acentos e caixa
+    uma única vez; o resto é regex já compilada e dicionários, então o custo por
+    mensagem é de microssegundos.
+    """
+
+    def __init__(self, teams: Iterable[str] = (), players: Iterable[str] = ()):
+        """
+        Compilar roteador
+
+        Args:
+            teams: Nomes de times (ex: carregados de Times_2024)
+            players: Nomes de jogadores (ex: carregados de Jogadores_por_Time_2024_2)
+        """
+        self._intent_re = re.compile(
+            "|".join(f"\\b(?P<{name}>{pattern})\\b" for name, pattern in INTENT_PATTERNS)
+        )
+        self.load_entities(teams, players)
+
+    def load_entities(self, teams: Iterable[str], players: Iterable[str]) -> None:
+        """
+        (Re)construir a trie de entidades
+
+        Além do nome completo, indexa o sobrenome de jogadores quando ele é único
+        e não é palavra comum nem nome de time (ex: "borre" → "R. Borré"). Os
+        apelidos de TEAM_ALIASES apontam para o nome do time como está no banco
+        ("galo" → "Atletico-MG"); apelido de time que não foi carregado fica de fora.
+
+        Args:
+            teams: Nomes de times
+            players: Nomes de jogadores
+        """
+        trie = EntityTrie()
+        team_names = set()
+        by_folded: Dict[str, str] = {}
+        for team in teams:
+            if team:
+                trie.add(team, ("team", team))
+                team_names.add(fold_text(team))
+                by_folded.setdefault(fold_text(team), team)
+        for alias, spellings in TEAM_ALIASES.items():
+            team = next((by_folded[fold_text(s)] for s in spellings if fold_text(s) in by_folded), None)
+            if team is not None:
+                trie.add(alias, ("team", team))
+                team_names.add(alias)
+
+        players = [player for player in players if player]
+        surname_count: Dict[str, int] = {}
+        for player in players:
+            tokens = fold_text(player).split()
+            if tokens:
+                surname_count[tokens[-1]] = surname_count.get(tokens[-1], 0) + 1
+        for player in players:
+            trie.add(player, ("player", player))
+            tokens = fold_text(player).split()
+            surname = tokens[-1] if tokens else ""
+            if (
+                len(tokens) > 1
+                and len(surname) >= 5
+                and surname_count.get(surname) == 1
+                and surname not in STOPWORDS
+                and surname not in team_names
+                and not self._intent_re.fullmatch(surname)
+            ):
+                trie.add(surname, ("player", player))
+
+        self._trie = trie
+
+    @property
+    def entity_count(self) -> int:
+        return self._trie.size
+
+    def route(self, message: str) -> RouteDecision:
+        """
+        Rotear mensagem
+
+        Args:
+            message: Mensagem do usuário
+
+        Returns:
+            RouteDecision com a decisão, a intenção principal e as entidades
+        """
+        started = time.perf_counter()
+        text = fold_text(message)
+
+        intents = []
+        for match in self._intent_re.finditer(text):
+            if match.lastgroup not in intents:
+                intents.append(match.lastgroup)
+
+        teams: List[str] = []
+        players: List[str] = []
+        for kind, name in self._trie.find_all(text.split()):
+            target = teams if kind == "team" else players
+            if name not in target:
+                target.append(name)
+
+        has_entity = bool(teams or players)
+        if intents:
+            priority = [name for name, _ in INTENT_PATTERNS]
+            intent = min(intents, key=priority.index)
+            needs_data = True
+        elif has_entity:
+            # "e o Flamengo?" / "qual o time do Wesley?" → continua sendo pergunta de dados
+            intent = "dados"
+            needs_data = True
+        else:
+            intent = "conversa"
+            needs_data = False
+
+        return RouteDecision(
+            needs_data=needs_data,
+            intent=intent,
+            intents=intents,
+            teams=teams,
+            players=players,
+            elapsed_us=round((time.perf_counter() - started) * 1_000_000, 1)
+        )
@@ -0,0 +1,125 @@
+"""
+Snapshot do schema em disco
+Evita refletir as 23 tabelas pela rede a cada inicialização do servidor
+"""
+
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import time
+
+# Incrementar quando o formato do arquivo mudar
+SNAPSHOT_VERSION = 1
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".cache",
+    "schema_snapshot.json"
+)
+
+
+def get_snapshot_path() -> str:
+    """Caminho do snapshot (SCHEMA_SNAPSHOT_PATH ou .cache/ do backend)"""
+    return os.getenv("SCHEMA_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+
+
+def compute_fingerprint(engine: Engine, tables: List[str]) -> str:
+    """
+    Calcular impressão digital barata do catálogo (colunas e tipos das tabelas)
+
+    No PostgreSQL é uma única query em information_schema; nos demais bancos
+    usa o inspector do SQLAlchemy.
+
+    Args:
+        engine: Engine SQLAlchemy síncrono
+        tables: Tabelas monitoradas
+
+    Returns:
+        Hash hexadecimal do catálogo
+    """
+    if engine.dialect.name == "postgresql":
+        query = text(
+            "SELECT md5(string_agg("
+            "table_name || '.' || column_name || ':' || data_type, ',' "
+            "ORDER BY table_name, ordinal_position)) "
+            "FROM information_schema.columns WHERE table_name IN :tables"
+        ).bindparams(bindparam("tables", expanding=True))
+        with engine.connect() as conn:
+            return conn.execute(query, {"tables": tables}).scalar() or ""
+
+    inspector = inspect(engine)
+    catalog = {
+        table: [(col["name"], str(col["type"])) for col in inspector.get_columns(table)]
+        for table in sorted(tables)
+    }
+    return hashlib.md5(json.dumps(catalog).encode("utf-8")).hexdigest()
+
+
+def build_snapshot(
+    dialect: str,
+    fingerprint: str,
+    table_info: Dict[str, str]
+) -> Dict[str, Any]:
+    """
+    Montar snapshot serializável
+
+    Args:
+        dialect: Dialeto do banco (ex: "postgresql")
+        fingerprint: Impressão digital do catálogo
+        table_info: Descrição de cada tabela (formato do SQLDatabase)
+
+    Returns:
+        Dict pronto para salvar em JSON
+    """
+    return {
+        "version": SNAPSHOT_VERSION,
+        "dialect": dialect,
+        "fingerprint": fingerprint,
+        "created_at": time.time(),
+        "tables": table_info,
+    }
+
+
+def load_snapshot(path: str, tables: List[str], dialect: str) -> Optional[Dict[str, Any]]:
+    """
+    Carregar snapshot se ele for compatível com a configuração atual
+
+    Args:
+        path: Caminho do arquivo
+        tables: Tabelas esperadas (include_tables)
+        dialect: Dialeto do banco atual
+
+    Returns:
+        Snapshot ou None (ausente, corrompido ou de outra versão/conjunto de tabelas)
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        snapshot.get("version") != SNAPSHOT_VERSION
+        or snapshot.get("dialect") != dialect
+        or set(snapshot.get("tables", {})) != set(tables)
+    ):
+        return None
+    return snapshot
+
+
+def save_snapshot(path: str, snapshot: Dict[str, Any]) -> None:
+    """
+    Salvar snapshot de forma atômica (vários workers podem escrever ao mesmo tempo)
+
+    Args:
+        path: Caminho do arquivo
+        snapshot: Snapshot a salvar
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,550 @@
+"""
+Armazenamento de sessões de conversa
+Histórico compacto por sessão com limite de sessões (LRU) e expiração por inatividade
+
+Backends:
+- memory: dicionário no processo (um único worker)
+- sqlite: arquivo SQLite em modo WAL, compartilhado entre workers do uvicorn
+"""
+
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+# Mensagens maiores que isso são guardadas comprimidas
+COMPRESS_THRESHOLD = 512
+
+_ROLE_USER = "h"
+_ROLE_ASSISTANT = "a"
+
+
+def encode_content(content: str) -> Tuple[bool, bytes]:
+    """
+    Codificar conteúdo de mensagem de forma compacta
+
+    Args:
+        content: Texto da mensagem
+
+    Returns:
+        Tuple (comprimido?, bytes)
+    """
+    data = content.encode("utf-8")
+    if len(data) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return True, compressed
+    return False, data
+
+
+def decode_content(compressed: bool, data: bytes) -> str:
+    """Inverso de encode_content"""
+    return (zlib.decompress(data) if compressed else data).decode("utf-8")
+
+
+def message_role(message: BaseMessage) -> str:
+    return _ROLE_USER if message.type == "human" else _ROLE_ASSISTANT
+
+
+def message_digest(role: str, content: str) -> bytes:
+    """
+    Hash curto (8 bytes) que identifica uma mensagem pelo papel e conteúdo
+
+    Args:
+        role: Papel compacto ("h" ou "a")
+        content: Texto da mensagem
+
+    Returns:
+        Digest da mensagem
+    """
+    return hashlib.blake2b(f"{role}\x00{content}".encode("utf-8"), digest_size=8).digest()
+
+
+def merge_history(history: "SyncableChatHistory", messages: Sequence[BaseMessage]) -> int:
+    """
+    Sincronizar histórico enviado pelo cliente com o do servidor
+
+    Acrescenta apenas mensagens que o servidor ainda não tem. A comparação é por
+    multiconjunto de digests, então uma mensagem repetida de verdade ("ok" duas
+    vezes) continua entrando, mas reenvios do mesmo histórico não duplicam nada.
+
+    Args:
+        history: Histórico da sessão no servidor
+        messages: Mensagens enviadas pelo cliente (em ordem)
+
+    Returns:
+        Quantidade de mensagens novas acrescentadas
+    """
+    remaining = Counter(history.message_digests())
+    new_messages = []
+    for message in messages:
+        digest = message_digest(message_role(message), str(message.content))
+        if remaining[digest] > 0:
+            remaining[digest] -= 1
+        else:
+            new_messages.append(message)
+
+    if new_messages:
+        history.add_messages(new_messages)
+    return len(new_messages)
+
+
+def recent_unique(messages: Sequence[BaseMessage], limit: int) -> List[BaseMessage]:
+    """
+    Janela com as últimas mensagens, sem repetições consecutivas
+
+    Args:
+        messages: Histórico completo
+        limit: Tamanho máximo da janela
+
+    Returns:
+        Até `limit` mensagens mais recentes, em ordem
+    """
+    window: List[BaseMessage] = []
+    last_key = None
+    for message in reversed(messages):
+        key = (message.type, message.content)
+        if key == last_key:
+            continue
+        window.append(message)
+        last_key = key
+        if len(window) >= limit:
+            break
+    window.reverse()
+    return window
+
+
+class SyncableChatHistory(BaseChatMessageHistory):
+    """
+    Histórico que expõe o digest de cada mensagem guardada (para merge_history)
+    """
+
+    def message_digests(self) -> List[bytes]:
+        """Digests das mensagens guardadas, em ordem"""
+        raise NotImplementedError
+
+
+class CompactChatHistory(SyncableChatHistory):
+    """
+    Histórico de mensagens compacto
+
+    Guarda apenas (papel, conteúdo em bytes, comprimido se grande) e mantém no
+    máximo max_messages mensagens por sessão.
+    """
+
+    def __init__(self, max_messages: int = 50):
+        self.max_messages = max_messages
+        self._entries: List[Tuple[str, bool, bytes, bytes]] = []
+        self.nbytes = 0
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        result = []
+        for role, compressed, data, _ in self._entries:
+            message_cls = HumanMessage if role == _ROLE_USER else AIMessage
+            result.append(message_cls(content=decode_content(compressed, data)))
+        return result
+
+    def message_digests(self) -> List[bytes]:
+        return [digest for _, _, _, digest in self._entries]
+
+    def add_message(self, message: BaseMessage) -> None:
+        role = message_role(message)
+        content = str(message.content)
+        compressed, data = encode_content(content)
+        self._entries.append((role, compressed, data, message_digest(role, content)))
+        self.nbytes += len(data)
+
+        while len(self._entries) > self.max_messages:
+            _, _, removed, _ = self._entries.pop(0)
+            self.nbytes -= len(removed)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        for message in messages:
+            self.add_message(message)
+
+    def clear(self) -> None:
+        self._entries = []
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SessionStore(ABC):
+    """
+    Interface dos backends de sessão
+
+    Backends com blocking = True fazem I/O nas chamadas (get_or_create,
+    histórico, stats): o TaticoProAgent as executa fora do event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get_or_create(self, session_id: Optional[str] = None) -> Tuple[str, SyncableChatHistory]:
+        """
+        Obter sessão existente ou criar uma nova
+
+        Args:
+            session_id: ID da sessão (opcional)
+
+        Returns:
+            Tuple (session_id, histórico)
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do backend (sessões vivas, evictions, bytes)"""
+
+    def close(self) -> None:
+        """Liberar recursos do backend"""
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Sessões em memória com limite de quantidade (LRU) e TTL de inatividade
+
+    As sessões ficam ordenadas pelo último acesso, então as expiradas estão sempre
+    no início e são removidas em O(1) amortizado a cada acesso.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        idle_ttl: float = 3600,
+        max_messages: int = 50,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Inicializar store
+
+        Args:
+            max_sessions: Número máximo de sessões vivas
+            idle_ttl: Segundos sem uso até a sessão expirar
+            max_messages: Mensagens guardadas por sessão
+            clock: Fonte de tempo (injetável para testes)
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Tuple[CompactChatHistory, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions_lru = 0
+        self.evictions_idle = 0
+
+    def _evict_idle(self, now: float) -> None:
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions_idle += 1
+
+    def get_or_create(self, session_id: Optional[str] = None) -> Tuple[str, CompactChatHistory]:
+        """
+        Obter sessão existente ou criar uma nova
+
+        Args:
+            session_id: ID da sessão (opcional)
+
+        Returns:
+            Tuple (session_id, histórico)
+        """
+        now = self._clock()
+        with self._lock:
+            self._evict_idle(now)
+
+            if session_id and session_id in self._sessions:
+                history, _ = self._sessions[session_id]
+                self._sessions[session_id] = (history, now)
+                self._sessions.move_to_end(session_id)
+                return session_id, history
+
+            new_session_id = session_id or str(uuid.uuid4())
+            history = CompactChatHistory(max_messages=self.max_messages)
+            self._sessions[new_session_id] = (history, now)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions_lru += 1
+
+            return new_session_id, history
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Contadores do store
+
+        Returns:
+            Dict com sessões vivas, evictions e bytes ocupados pelas mensagens
+        """
+        with self._lock:
+            histories = [history for history, _ in self._sessions.values()]
+        return {
+            "backend": "memory",
+            "live_sessions": len(histories),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions_lru": self.evictions_lru,
+            "evictions_idle": self.evictions_idle,
+            "messages_held": sum(len(history) for history in histories),
+            "bytes_held": sum(history.nbytes for history in histories),
+        }
+
+
+class SQLiteChatHistory(SyncableChatHistory):
+    """
+    Histórico de uma sessão guardado no SQLite (visível para todos os workers)
+    """
+
+    def __init__(self, store: "SQLiteSessionStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        rows = self.store._conn().execute(
+            "SELECT role, compressed, content FROM messages WHERE session_id = ? ORDER BY seq",
+            (self.session_id,)
+        ).fetchall()
+        result = []
+        for role, compressed, data in rows:
+            message_cls = HumanMessage if role == _ROLE_USER else AIMessage
+            result.append(message_cls(content=decode_content(bool(compressed), data)))
+        return result
+
+    def message_digests(self) -> List[bytes]:
+        rows = self.store._conn().execute(
+            "SELECT digest FROM messages WHERE session_id = ? ORDER BY seq",
+            (self.session_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        rows = []
+        for message in messages:
+            role = message_role(message)
+            content = str(message.content)
+            compressed, data = encode_content(content)
+            rows.append((self.session_id, role, int(compressed), data, message_digest(role, content)))
+
+        conn = self.store._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, compressed, content, digest) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            # Manter apenas as últimas max_messages mensagens da sessão
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq NOT IN ("
+                "SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                (self.session_id, self.session_id, self.store.max_messages)
+            )
+
+    def clear(self) -> None:
+        conn = self.store._conn()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessões em um arquivo SQLite (modo WAL) compartilhado entre processos
+
+    Permite rodar `uvicorn --workers N`: a mensagem seguinte de uma conversa pode
+    cair em outro worker sem perder o contexto. Cada thread usa sua própria conexão.
+    """
+
+    blocking = True  # leituras e commits no disco: chamar via asyncio.to_thread
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions (last_access);
+        CREATE TABLE IF NOT EXISTS messages (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            compressed INTEGER NOT NULL,
+            content BLOB NOT NULL,
+            digest BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, seq);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 10000,
+        idle_ttl: float = 3600,
+        max_messages: int = 50,
+        sweep_interval: float = 30,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Inicializar store
+
+        Args:
+            path: Caminho do arquivo SQLite
+            max_sessions: Número máximo de sessões vivas
+            idle_ttl: Segundos sem uso até a sessão expirar
+            max_messages: Mensagens guardadas por sessão
+            sweep_interval: Intervalo mínimo entre limpezas de sessões expiradas
+            clock: Fonte de tempo (relógio de parede, comum a todos os processos)
+        """
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []  # uma por thread (fechadas em close)
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.evictions_lru = 0
+        self.evictions_idle = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Usada só pela thread que a criou; check_same_thread=False permite o close() final
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        """Remover sessões expiradas e excedentes (no máximo uma vez por sweep_interval)"""
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+
+        with conn:
+            expired = conn.execute(
+                "DELETE FROM sessions WHERE last_access < ?", (now - self.idle_ttl,)
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            ).rowcount
+            if expired or overflow:
+                conn.execute(
+                    "DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)"
+                )
+        with self._lock:
+            self.evictions_idle += expired
+            self.evictions_lru += overflow
+
+    def get_or_create(self, session_id: Optional[str] = None) -> Tuple[str, SQLiteChatHistory]:
+        now = self._clock()
+        conn = self._conn()
+        self._sweep(conn, now)
+
+        session_id = session_id or str(uuid.uuid4())
+        with conn:
+            # Sessão expirada é tratada como nova (sem o histórico antigo)
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND EXISTS ("
+                "SELECT 1 FROM sessions WHERE session_id = ? AND last_access < ?)",
+                (session_id, session_id, now - self.idle_ttl)
+            )
+            conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now)
+            )
+        return session_id, SQLiteChatHistory(self, session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ? AND last_access >= ?",
+            (session_id, self._clock() - self.idle_ttl)
+        ).fetchone()
+        return row is not None
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        live = conn.execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_access >= ?",
+            (self._clock() - self.idle_ttl,)
+        ).fetchone()[0]
+        messages, nbytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM messages"
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "live_sessions": live,
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions_lru": self.evictions_lru,
+            "evictions_idle": self.evictions_idle,
+            "messages_held": messages,
+            "bytes_held": nbytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def create_session_store() -> SessionStore:
+    """
+    Criar backend de sessões a partir das variáveis de ambiente
+
+    SESSION_BACKEND=memory (padrão) ou sqlite (necessário com --workers N)
+
+    Returns:
+        SessionStore configurado
+    """
+    options = {
+        "max_sessions": int(os.getenv("SESSION_MAX_COUNT", "10000")),
+        "idle_ttl": float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600")),
+        "max_messages": int(os.getenv("SESSION_MAX_MESSAGES", "50")),
+    }
+    backend = os.getenv("SESSION_BACKEND", "memory")
+
+    if backend == "sqlite":
+        default_path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            ".cache",
+            "sessions.sqlite3"
+        )
+        return SQLiteSessionStore(os.getenv("SESSION_SQLITE_PATH", default_path), **options)
+    if backend != "memory":
+        raise ValueError(f"SESSION_BACKEND inválido: {backend}")
+    return InMemorySessionStore(**options)
@@ -0,0 +1,111 @@
+"""
+Single-flight (coalescência de requisições)
+Chamadas concorrentes com a mesma chave aguardam uma única execução
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """
+    Coalescência para corrotinas (event loop)
+
+    A execução roda em uma task própria: se a requisição que a iniciou for
+    cancelada (cliente desconectou), as demais continuam esperando o resultado.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Executar func uma única vez por chave entre chamadas concorrentes
+
+        Args:
+            key: Chave de coalescência (ex: pergunta normalizada)
+            func: Corrotina sem argumentos a executar
+
+        Returns:
+            Tuple (resultado, True se reaproveitou uma execução em andamento)
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executions": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+
+class ThreadSingleFlight:
+    """Coalescência para código síncrono executado no pool de threads"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: BaseException = None
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "ThreadSingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Executar func uma única vez por chave entre threads concorrentes
+
+        Args:
+            key: Chave de coalescência (ex: SQL canônico)
+            func: Função sem argumentos a executar
+
+        Returns:
+            Tuple (resultado, True se reaproveitou uma execução em andamento)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                self.leaders += 1
+                call = self._calls[key] = self._Call()
+
+        if shared:
+            call.done.wait()
+        else:
+            try:
+                call.result = func()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, shared
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "executions": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
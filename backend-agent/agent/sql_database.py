@@ -0,0 +1,250 @@
+"""
+SQLDatabase do Tático Pro
+Extensão do SQLDatabase do LlamaIndex usada pelo NLSQLTableQueryEngine
+"""
+
+from llama_index.core import SQLDatabase
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.engine import Engine, Inspector
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+from .cache import TTLCache
+from .metrics import current_trace, log_sampled, record_stage
+from .replica import TableReplica
+from .singleflight import ThreadSingleFlight
+from .sql_guard import SQLCostGuard
+from .sql_utils import canonicalize_sql, referenced_tables
+
+
+class _SnapshotMetaData(MetaData):
+    """MetaData do snapshot: reflect() não acessa o banco (as descrições já vêm do snapshot)"""
+
+    def reflect(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+class _SnapshotInspector:
+    """Nomes de tabelas do snapshot, no lugar do Inspector durante o __init__ do SQLDatabase"""
+
+    def __init__(self, tables: List[str]):
+        self._tables = list(tables)
+
+    def get_table_names(self, schema: Optional[str] = None) -> List[str]:
+        return list(self._tables)
+
+    def get_view_names(self, schema: Optional[str] = None) -> List[str]:
+        return []
+
+
+def _mark_source(source: str) -> None:
+    """Registrar no trace da requisição onde o SQL foi respondido (log de queries)"""
+    trace = current_trace()
+    if trace is not None:
+        trace.sql_source = source
+
+
+class TaticoSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase com cache de resultados
+
+    Toda query gerada pelo LLM passa por run_sql; o resultado fica em cache pela
+    forma canônica do SQL e é marcado com as tabelas lidas, permitindo invalidar
+    apenas as entradas de uma tabela atualizada.
+
+    A descrição das tabelas também fica em memória e pode vir de um snapshot em
+    disco, dispensando a reflexão do schema na inicialização.
+
+    Com uma réplica configurada, queries que leem apenas tabelas replicadas
+    rodam localmente; se a réplica não aceitar o SQL, a query vai ao banco.
+
+    Com um guarda de custo, SELECTs sem LIMIT recebem um e, no banco
+    principal, passam pelo EXPLAIN com statement_timeout próprio.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        result_cache: TTLCache,
+        snapshot: Optional[Dict[str, Any]] = None,
+        replica: Optional[TableReplica] = None,
+        guard: Optional[SQLCostGuard] = None,
+        **kwargs: Any
+    ):
+        """
+        Inicializar banco
+
+        Args:
+            engine: Engine SQLAlchemy síncrono
+            result_cache: Cache de resultados (chave = SQL canônico)
+            snapshot: Snapshot do schema (pula a reflexão pela rede)
+            replica: Réplica local das tabelas int_*
+            guard: Guarda de custo das queries geradas
+            **kwargs: Argumentos do SQLDatabase (include_tables etc.)
+        """
+        self.result_cache = result_cache
+        self.replica = replica
+        self.guard = guard
+        self.inflight = ThreadSingleFlight()  # mesmo SQL em execução → uma ida ao banco
+        self._inspector_obj: Optional[Inspector] = None
+        self._snapshot_inspector: Optional[_SnapshotInspector] = None
+
+        if snapshot is not None:
+            # Construtor público do SQLDatabase com os nomes de tabelas do snapshot e
+            # sem reflexão do schema (MetaData com reflect() vazio)
+            self._snapshot_inspector = _SnapshotInspector(snapshot["tables"])
+            kwargs.setdefault("metadata", _SnapshotMetaData())
+        try:
+            super().__init__(engine, **kwargs)
+        finally:
+            self._snapshot_inspector = None
+        self._table_info: Dict[str, str] = dict(snapshot["tables"]) if snapshot is not None else {}
+
+    @property
+    def _inspector(self) -> Inspector:
+        if self._snapshot_inspector is not None:
+            return self._snapshot_inspector
+        # Criado sob demanda: inspect(engine) abre uma conexão
+        if self._inspector_obj is None:
+            self._inspector_obj = inspect(self._engine)
+        return self._inspector_obj
+
+    @_inspector.setter
+    def _inspector(self, value: Inspector):
+        self._inspector_obj = value
+
+    def get_single_table_info(self, table_name: str) -> str:
+        """
+        Descrição da tabela (memória → snapshot → banco)
+
+        Args:
+            table_name: Nome da tabela
+
+        Returns:
+            String com colunas e chaves estrangeiras
+        """
+        info = self._table_info.get(table_name)
+        if info is None:
+            info = super().get_single_table_info(table_name)
+            self._table_info[table_name] = info
+        return info
+
+    def cached_table_info(self, table_name: str) -> Optional[str]:
+        """Descrição em memória/snapshot, sem acessar o banco"""
+        return self._table_info.get(table_name)
+
+    def describe_tables(self) -> Dict[str, str]:
+        """
+        Refletir novamente a descrição de todas as tabelas usáveis
+
+        Returns:
+            Dict tabela → descrição
+        """
+        self._inspector_obj = None  # inspector novo, sem cache interno
+        return {
+            table: super(TaticoSQLDatabase, self).get_single_table_info(table)
+            for table in self.get_usable_table_names()
+        }
+
+    def apply_table_info(self, table_info: Dict[str, str]) -> None:
+        """
+        Substituir as descrições em memória (após atualizar o snapshot)
+
+        Args:
+            table_info: Dict tabela → descrição
+        """
+        self._table_info = dict(table_info)
+
+    def run_sql(self, command: str) -> Tuple[str, Dict]:
+        """
+        Executar SQL usando o cache de resultados
+
+        Args:
+            command: Query SQL
+
+        Returns:
+            Tuple (resultado em texto, metadados com linhas e colunas)
+        """
+        started = time.perf_counter()
+        rows = None
+        try:
+            result = self._run_sql_cached(command)
+            rows = len(result[1].get("result") or []) if result[1] else 0
+            return result
+        finally:
+            record_stage("sql_execution", seconds=time.perf_counter() - started, rows=rows)
+            trace = current_trace()
+            if trace is not None:
+                # Chamadas LLM seguintes do LlamaIndex são a síntese da resposta
+                trace.llm_stage = "synthesis"
+                trace.marks["sql_executed"] = time.perf_counter()
+
+    def _run_sql_cached(self, command: str) -> Tuple[str, Dict]:
+        """Cache → single-flight → réplica ou banco"""
+        canonical = canonicalize_sql(command)
+        if not canonical.startswith(("select", "with")):
+            _mark_source("db")
+            return super().run_sql(command)
+
+        cached = self.result_cache.get(canonical)
+        if cached is not None:
+            _mark_source("cache")
+            return cached
+
+        result, shared = self.inflight.do(canonical, lambda: self._run_select(command, canonical))
+        if shared:
+            _mark_source("coalesced")
+        return result
+
+    def _run_select(self, command: str, canonical: str) -> Tuple[str, Dict]:
+        """Executar SELECT (réplica ou banco) e guardar no cache"""
+        tables = referenced_tables(command, self.get_usable_table_names())
+        if self.guard is not None:
+            command = self.guard.prepare(command)
+        result = None
+        if self.replica is not None and self.replica.can_serve(tables):
+            result = self._run_on_replica(command)
+            _mark_source("replica")
+        if result is None:
+            result = self._run_on_database(command)
+            _mark_source("db")
+        self.result_cache.set(canonical, result, tags=tables)
+        return result
+
+    def _run_on_database(self, command: str) -> Tuple[str, Dict]:
+        """Executar no banco principal, passando pelo guarda de custo (mesmo formato do run_sql)"""
+        if self.guard is None:
+            return super().run_sql(command)
+
+        with self._engine.begin() as connection:
+            try:
+                self.guard.admit(connection, command)
+                cursor = connection.execute(text(command))
+            except (ProgrammingError, OperationalError) as exc:
+                # Mesmo erro do SQLDatabase: o LlamaIndex devolve a mensagem ao LLM
+                raise NotImplementedError(
+                    f"Statement {command!r} is invalid SQL.\nError: {exc.orig}"
+                ) from exc
+            if not cursor.returns_rows:
+                return "", {}
+            truncated = [
+                tuple(self.truncate_word(value, length=self._max_string_length) for value in row)
+                for row in cursor.fetchall()
+            ]
+            return str(truncated), {"result": truncated, "col_keys": list(cursor.keys())}
+
+    def _run_on_replica(self, command: str) -> Optional[Tuple[str, Dict]]:
+        """Executar na réplica, no mesmo formato do run_sql (None = usar o banco)"""
+        try:
+            columns, rows = self.replica.execute(command)
+        except Exception as e:
+            log_sampled(f"⚠️ Réplica não executou a query, usando o banco: {str(e)}")
+            self.replica.record_fallback()
+            return None
+
+        truncated = [
+            tuple(self.truncate_word(value, length=self._max_string_length) for value in row)
+            for row in rows
+        ]
+        return str(truncated), {"result": truncated, "col_keys": columns}
@@ -0,0 +1,152 @@
+"""
+Guarda de custo das queries geradas pelo LLM
+Antes de ir ao banco principal, o SQL recebe um LIMIT (se não tiver), um
+statement_timeout próprio e passa pelo EXPLAIN: planos caros demais são recusados
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from typing import Any, Dict, Optional, Tuple
+import json
+import threading
+
+from .metrics import SQL_GUARD
+from .sql_utils import ensure_limit
+
+
+class SQLRejectedError(ValueError):
+    """Query recusada pelo guarda de custo (o plano estimado passou dos limites)"""
+
+
+def plan_estimates(plan: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    Extrair custo total e maior estimativa de linhas de um plano (EXPLAIN FORMAT JSON)
+
+    A maior estimativa entre todos os nós pega o full scan escondido embaixo de
+    um agregado (o nó do topo de um COUNT(*) estima uma única linha).
+
+    Args:
+        plan: Nó "Plan" do EXPLAIN
+
+    Returns:
+        Tuple (custo total, linhas estimadas no nó mais largo)
+    """
+    max_rows = float(plan.get("Plan Rows", 0))
+    stack = list(plan.get("Plans", []))
+    while stack:
+        node = stack.pop()
+        max_rows = max(max_rows, float(node.get("Plan Rows", 0)))
+        stack.extend(node.get("Plans", []))
+    return float(plan.get("Total Cost", 0)), max_rows
+
+
+class SQLCostGuard:
+    """
+    Admissão de SELECTs gerados antes da execução no banco principal
+
+    O EXPLAIN (sem ANALYZE) só planeja a query, então custa uma ida ao banco e
+    nenhuma leitura de tabela. Fora do PostgreSQL (ex: SQLite local) só o LIMIT
+    é aplicado.
+    """
+
+    def __init__(
+        self,
+        max_cost: float = 100000,
+        max_rows_estimate: float = 1000000,
+        default_limit: int = 200,
+        statement_timeout_ms: int = 5000
+    ):
+        """
+        Configurar limites
+
+        Args:
+            max_cost: Custo máximo estimado pelo planner (0 = sem limite)
+            max_rows_estimate: Máximo de linhas estimadas em qualquer nó do plano (0 = sem limite)
+            default_limit: LIMIT acrescentado em queries sem LIMIT (0 = não acrescentar)
+            statement_timeout_ms: statement_timeout das queries geradas (0 = o do engine)
+        """
+        self.max_cost = max_cost
+        self.max_rows_estimate = max_rows_estimate
+        self.default_limit = default_limit
+        self.statement_timeout_ms = statement_timeout_ms
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.limited = 0
+        self.rejected = 0
+        self.last_rejection: Optional[str] = None
+
+    def prepare(self, sql: str) -> str:
+        """
+        Reescrever a query antes da execução (LIMIT quando falta)
+
+        Args:
+            sql: SELECT gerado
+
+        Returns:
+            Query a executar
+        """
+        if self.default_limit <= 0:
+            return sql
+        sql, added = ensure_limit(sql, self.default_limit)
+        if added:
+            with self._lock:
+                self.limited += 1
+            SQL_GUARD.inc(outcome="limited")
+        return sql
+
+    def admit(self, connection: Connection, sql: str) -> None:
+        """
+        Aplicar timeout e verificar o plano na transação que vai executar a query
+
+        Args:
+            connection: Conexão em transação (engine.begin())
+            sql: Query já preparada
+
+        Raises:
+            SQLRejectedError: Se o plano passar de max_cost ou max_rows_estimate
+        """
+        if connection.dialect.name != "postgresql":
+            return
+
+        if self.statement_timeout_ms > 0:
+            # SET LOCAL vale só até o fim desta transação (seguro com pgbouncer em modo transaction)
+            connection.execute(text(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"))
+
+        if self.max_cost <= 0 and self.max_rows_estimate <= 0:
+            return
+
+        raw = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        plan = json.loads(raw) if isinstance(raw, str) else raw
+        cost, rows = plan_estimates(plan[0]["Plan"])
+        with self._lock:
+            self.checked += 1
+
+        reason = None
+        if self.max_cost > 0 and cost > self.max_cost:
+            reason = "cost"
+        elif self.max_rows_estimate > 0 and rows > self.max_rows_estimate:
+            reason = "rows"
+        if reason is None:
+            SQL_GUARD.inc(outcome="admitted")
+            return
+
+        message = f"custo estimado {cost:.0f} (máx {self.max_cost:.0f}), {rows:.0f} linhas estimadas (máx {self.max_rows_estimate:.0f})"
+        with self._lock:
+            self.rejected += 1
+            self.last_rejection = message
+        SQL_GUARD.inc(outcome="rejected", reason=reason)
+        print(f"🛑 Query recusada pelo guarda de custo: {message}\n   {sql[:300]}")
+        raise SQLRejectedError(f"Query muito cara para executar: {message}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_cost": self.max_cost,
+                "max_rows_estimate": self.max_rows_estimate,
+                "default_limit": self.default_limit,
+                "statement_timeout_ms": self.statement_timeout_ms,
+                "checked": self.checked,
+                "limited": self.limited,
+                "rejected": self.rejected,
+                "last_rejection": self.last_rejection,
+            }
@@ -0,0 +1,70 @@
+"""
+Leitura de resultados SQL em blocos
+Cursor no servidor + limite de linhas: a memória usada não depende do tamanho
+do resultado
+"""
+
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+
+
+class SQLRowStream:
+    """
+    Resultado de uma query lido bloco a bloco
+
+    Iterar devolve listas de linhas (tuplas). columns fica disponível após o
+    primeiro bloco; row_count, truncated e last_key são atualizados a cada bloco
+    (last_key é o cursor da próxima página na paginação por chave).
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[Tuple[List[str], Sequence[Any]]],
+        max_rows: Optional[int] = None,
+        key: Optional[str] = None
+    ):
+        """
+        Args:
+            chunks: Gerador de (colunas, linhas); o primeiro item traz só as colunas
+            max_rows: Limite de linhas (None = sem limite)
+            key: Coluna de paginação (para last_key)
+        """
+        self._chunks = chunks
+        self.max_rows = max_rows
+        self.key = key
+        self.columns: List[str] = []
+        self.row_count = 0
+        self.truncated = False
+        self.last_key: Any = None
+        self._key_index: Optional[int] = None
+
+    async def open(self) -> "SQLRowStream":
+        """Executar a query e ler as colunas (erros de SQL aparecem aqui)"""
+        self.columns, _ = await self._chunks.__anext__()
+        if self.key is not None:
+            if self.key not in self.columns:
+                await self.aclose()
+                raise ValueError(f"Coluna de paginação ausente no resultado: {self.key!r}")
+            self._key_index = self.columns.index(self.key)
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[List[tuple]]:
+        try:
+            async for _, rows in self._chunks:
+                if not rows:
+                    continue
+                if self.max_rows is not None and self.row_count + len(rows) > self.max_rows:
+                    rows = rows[:self.max_rows - self.row_count]
+                    self.truncated = True
+                if rows:
+                    self.row_count += len(rows)
+                    if self._key_index is not None:
+                        self.last_key = rows[-1][self._key_index]
+                    yield [tuple(row) for row in rows]
+                if self.truncated:
+                    break
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """Fechar cursor e devolver a conexão ao pool"""
+        await self._chunks.aclose()
@@ -0,0 +1,326 @@
+"""
+Biblioteca de SQL verificado
+Perguntas de intenção conhecida (artilheiros, classificação, próximos jogos...)
+executam a query validada diretamente, sem o LLM gerar SQL
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+
+from .normalize import fold_text
+from .router import RouteDecision
+from .sql_utils import sql_literal
+
+# "rodada 37", "37a rodada", "37ª rodada" (texto já sem acentos)
+_ROUND_RE = re.compile(r"\brodada (\d{1,2})\b|\b(\d{1,2})a? rodada\b")
+_ROUND_NUMBER_RE = re.compile(r"(\d+)\s*$")
+
+# Calendário dos jogos (uma linha por partida) para descobrir as próximas rodadas
+ROUND_CALENDAR_SQL = 'SELECT round, date, status FROM "Jogos_Completos_2024"'
+
+# Status de partida encerrada (API-Football)
+FINISHED_STATUSES = {"FT", "AET", "PEN", "AWD", "WO"}
+
+
+class RoundCalendar:
+    """
+    Rodadas do campeonato lidas do banco, para saber quais são as próximas
+
+    Uma rodada está pendente se tem partida não encerrada (status) ou marcada
+    para hoje ou depois (date); as próximas rodadas são as primeiras
+    pendentes, logo depois da última jogada. Temporada encerrada = nenhuma.
+    """
+
+    def __init__(self, upcoming_count: int = 3):
+        """
+        Args:
+            upcoming_count: Quantas rodadas contam como "próximos jogos"
+        """
+        self.upcoming_count = upcoming_count
+        self._rounds: Dict[int, Tuple[str, Optional[str], bool]] = {}  # número → (valor, última data, pendente)
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._rounds)
+
+    def load(self, fixtures) -> int:
+        """
+        Substituir o calendário
+
+        Args:
+            fixtures: Linhas (round, date, status) de ROUND_CALENDAR_SQL
+
+        Returns:
+            Número de rodadas
+        """
+        rounds: Dict[int, Tuple[str, Optional[str], bool]] = {}
+        for round_value, fixture_date, status in fixtures:
+            match = _ROUND_NUMBER_RE.search(str(round_value or ""))
+            if not match:
+                continue
+            number = int(match.group(1))
+            day = str(fixture_date)[:10] if fixture_date is not None else None
+            pending = status is not None and str(status).upper() not in FINISHED_STATUSES
+            _, last_day, was_pending = rounds.get(number, (round_value, None, False))
+            if day is not None and (last_day is None or day > last_day):
+                last_day = day
+            rounds[number] = (round_value, last_day, was_pending or pending)
+        with self._lock:
+            self._rounds = rounds
+        return len(rounds)
+
+    def upcoming(self, today: Optional[date] = None) -> Tuple[str, ...]:
+        """
+        Próximas rodadas (vazio se o calendário não foi carregado ou acabou)
+
+        Args:
+            today: Data de referência (padrão: hoje)
+
+        Returns:
+            Valores da coluna round, em ordem
+        """
+        today_iso = (today or date.today()).isoformat()
+        with self._lock:
+            rounds = sorted(self._rounds.items())
+        pending = [
+            value for _, (value, last_day, is_pending) in rounds
+            if is_pending or (last_day is not None and last_day >= today_iso)
+        ]
+        return tuple(pending[:self.upcoming_count])
+
+
+def question_rounds(question: str, calendar: Optional[RoundCalendar] = None) -> Tuple[str, ...]:
+    """
+    Rodadas citadas na pergunta ("rodada 37") ou, sem citação, as próximas
+    rodadas do calendário
+
+    Args:
+        question: Pergunta original
+        calendar: Calendário carregado do banco
+
+    Returns:
+        Valores da coluna round (ex: ("Regular Season - 37",)); vazio se não há
+        rodada citada nem próxima rodada conhecida
+    """
+    match = _ROUND_RE.search(fold_text(question))
+    if match:
+        return (f"Regular Season - {int(match.group(1) or match.group(2))}",)
+    return calendar.upcoming() if calendar is not None else ()
+
+
+@dataclass(frozen=True)
+class SQLTemplate:
+    """Query validada para uma intenção, com slots {team} e {rounds}"""
+
+    name: str
+    intent: str
+    sql: str
+    team_sql: Optional[str] = None  # variante filtrada por time (quando o time é opcional)
+    requires_team: bool = False
+    allows: Tuple[str, ...] = ()  # outras intenções que podem aparecer junto (ex: "jogos")
+    terms: Optional[str] = None  # regex que a pergunta (sem acentos) precisa conter
+    teams_covered: Tuple[str, ...] = ()  # times que a tabela inteira já descreve (sem filtro)
+
+
+TEMPLATES = [
+    SQLTemplate(
+        name="mais_substituidos",
+        intent="substituicoes",
+        sql="SELECT mais_substituidos FROM int_jogadores_detalhados WHERE adversario = {team}",
+        requires_team=True,
+    ),
+    SQLTemplate(
+        name="artilheiros",
+        intent="artilheiros",
+        sql="SELECT principais_artilheiros FROM int_jogadores_detalhados WHERE adversario = {team}",
+        requires_team=True,
+        # "gols sofridos" / "quem marcou no campeonato" não são a lista de artilheiros
+        terms=r"\b(artilheir|goleador|assistenc)\w*",
+    ),
+    # "escalacao" junta perguntas de colunas diferentes: cada template exige a sua
+    # formulação; "jogadores resistentes", "relacionados"... seguem para o NL→SQL
+    SQLTemplate(
+        name="mais_utilizados",
+        intent="escalacao",
+        sql="SELECT jogadores_mais_utilizados FROM int_jogadores_detalhados WHERE adversario = {team}",
+        requires_team=True,
+        terms=r"\bmais (utilizad|usad)\w*",
+    ),
+    SQLTemplate(
+        name="titulares_provaveis",
+        intent="escalacao",
+        sql="SELECT titulares_provaveis FROM int_jogadores_detalhados WHERE adversario = {team}",
+        requires_team=True,
+        terms=r"\b(titular|escala)\w*|\bonze inicial\b",
+    ),
+    SQLTemplate(
+        name="formacao_preferida",
+        intent="escalacao",
+        sql="SELECT formacao_preferida FROM int_jogadores_detalhados WHERE adversario = {team}",
+        requires_team=True,
+        terms=r"\bformac\w*",
+    ),
+    SQLTemplate(
+        name="classificacao",
+        intent="classificacao",
+        sql=(
+            "SELECT posicao, time, pontos_total, jogos_disputados, total_vitorias, "
+            "total_empates, total_derrotas FROM int_classificacao_campeonato ORDER BY posicao"
+        ),
+    ),
+    SQLTemplate(
+        name="stats_comparativas",
+        intent="comparacao",
+        sql="SELECT * FROM int_stats_comparativas",
+        team_sql="SELECT * FROM int_stats_comparativas WHERE time = {team}",
+    ),
+    # A tabela só tem o histórico Flamengo x Inter: retrospecto de outro time vai para o NL→SQL
+    SQLTemplate(
+        name="confrontos_diretos",
+        intent="confrontos",
+        sql="SELECT * FROM int_confrontos_diretos",
+        allows=("resultados",),
+        teams_covered=("Flamengo", "Internacional"),
+    ),
+    SQLTemplate(
+        name="momentum",
+        intent="momentum",
+        sql="SELECT time, pontos_recentes, sequencia_recente FROM int_momentum_atual",
+        team_sql=(
+            "SELECT time, pontos_recentes, sequencia_recente FROM int_momentum_atual "
+            "WHERE time = {team}"
+        ),
+    ),
+    SQLTemplate(
+        name="proximos_jogos",
+        intent="proximos_jogos",
+        sql=(
+            'SELECT round, date, home_team_name, away_team_name, venue_name, venue_city '
+            'FROM "Jogos_Completos_2024" '
+            'WHERE (home_team_name = {team} OR away_team_name = {team}) '
+            'AND round IN ({rounds}) ORDER BY date ASC LIMIT 3'
+        ),
+        requires_team=True,
+        allows=("resultados",),
+    ),
+]
+
+
+class SQLTemplateLibrary:
+    """
+    Casa a decisão do roteador com uma query validada
+
+    Só há match quando a pergunta tem uma única intenção de dados (além das
+    permitidas pelo template), os termos exigidos pelo template e nenhum
+    jogador citado. O time citado (no máximo um) precisa entrar no filtro da
+    query; templates com teams_covered aceitam só os times da tabela. Entre
+    os templates de uma intenção vale o primeiro cujos termos aparecem na
+    pergunta. Qualquer outra pergunta segue para o NLSQLTableQueryEngine.
+    """
+
+    def __init__(self, templates=TEMPLATES, calendar: Optional[RoundCalendar] = None):
+        """
+        Indexar templates por intenção
+
+        Args:
+            templates: Lista de SQLTemplate
+            calendar: Calendário de rodadas (slot {rounds}; sem ele, só rodadas citadas)
+        """
+        self._by_intent: Dict[str, List[SQLTemplate]] = {}
+        for template in templates:
+            self._by_intent.setdefault(template.intent, []).append(template)
+        self.calendar = calendar
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.empty_results = 0
+        self.hits_by_template: Dict[str, int] = {}
+
+    def match(self, question: str, route: Optional[RouteDecision]) -> Optional[Tuple[SQLTemplate, str]]:
+        """
+        Encontrar template e renderizar o SQL (sem match conta como miss;
+        o hit é registrado por quem executa, após confirmar que há linhas)
+
+        Args:
+            question: Pergunta original (para slots como a rodada)
+            route: Decisão do roteador de intenções
+
+        Returns:
+            Tuple (template, SQL pronto) ou None
+        """
+        template = None
+        if route is not None and route.intents and not route.players:
+            text = fold_text(question)
+            template = next(
+                (t for t in self._by_intent.get(route.intent, ())
+                 if not t.terms or re.search(t.terms, text)),
+                None
+            )
+        if template is not None and any(
+            intent != template.intent and intent not in template.allows
+            for intent in route.intents
+        ):
+            template = None
+
+        sql = None
+        if template is not None and template.teams_covered:
+            if set(route.teams) <= set(template.teams_covered):
+                sql = template.sql
+        elif template is not None and len(route.teams) <= 1:
+            team = route.teams[0] if route.teams else None
+            rounds = question_rounds(question, self.calendar) if "{rounds}" in template.sql else ()
+            if "{rounds}" in template.sql and not rounds:
+                pass  # calendário ainda não carregado ou temporada encerrada
+            elif team is None and not template.requires_team:
+                sql = template.sql
+            elif team is not None and "{team}" in (template.team_sql or template.sql):
+                # Template sem filtro por time devolveria dados de outros times
+                sql = (template.team_sql or template.sql).format(
+                    team=sql_literal(team),
+                    rounds=", ".join(sql_literal(r) for r in rounds)
+                )
+
+        if sql is None:
+            self.record_miss()
+            return None
+        return template, sql
+
+    def record_hit(self, template: SQLTemplate) -> None:
+        """Registrar pergunta respondida pelo template"""
+        with self._lock:
+            self.hits += 1
+            self.hits_by_template[template.name] = self.hits_by_template.get(template.name, 0) + 1
+
+    def record_miss(self, empty_result: bool = False) -> None:
+        """
+        Registrar pergunta que vai para o LLM
+
+        Args:
+            empty_result: O template casou mas não retornou linhas
+        """
+        with self._lock:
+            self.misses += 1
+            if empty_result:
+                self.empty_results += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Taxa de acerto dos templates
+
+        Returns:
+            Dict com hits, misses, hit_rate, resultados vazios e hits por template
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "templates": sum(len(templates) for templates in self._by_intent.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "empty_results": self.empty_results,
+                "hits_by_template": dict(self.hits_by_template),
+            }
@@ -0,0 +1,169 @@
+"""
+Utilitários de SQL
+Canonicalização de queries, formato (shape), detecção das tabelas lidas, LIMIT
+e paginação por chave
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import re
+
+# Literais de string, identificadores entre aspas, comentários e o restante
+_TOKEN_RE = re.compile(
+    r"('(?:[^']|'')*')"        # 'literal'
+    r'|("(?:[^"]|"")*")'       # "Identificador"
+    r"|(--[^\n]*|/\*.*?\*/)"   # comentários
+    r"|([^'\"\-/]+|[\-/])",  # demais trechos
+    re.DOTALL
+)
+_SPACES_RE = re.compile(r"\s+")
+_PUNCT_SPACES_RE = re.compile(r"\s*([(),=<>])\s*")
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_LIMIT_RE = re.compile(r"\blimit\b|\bfetch\s+(first|next)\b")
+_QUOTED_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?(?![\w\"])")
+_PARAM_LIST_RE = re.compile(r"\(\?(?:,\?)+\)")
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Gerar forma canônica de uma query (mesma query → mesma string)
+
+    Remove comentários, ";" final e espaços redundantes, e coloca em minúsculas
+    tudo que não for literal ou identificador entre aspas (o PostgreSQL já trata
+    identificadores sem aspas como minúsculos).
+
+    Args:
+        sql: Query SQL gerada
+
+    Returns:
+        Query canônica
+    """
+    parts = []
+    pending = []  # trecho fora de literais ainda não normalizado
+
+    def flush():
+        chunk = _SPACES_RE.sub(" ", "".join(pending).lower())
+        parts.append(_PUNCT_SPACES_RE.sub(r"\1", chunk))
+        pending.clear()
+
+    for literal, quoted, comment, other in _TOKEN_RE.findall(sql):
+        if literal or quoted:
+            flush()
+            parts.append(literal or quoted)
+        else:
+            pending.append(" " if comment else other)
+    flush()
+
+    canonical = "".join(parts).strip()
+    while canonical.endswith(";"):
+        canonical = canonical[:-1].rstrip()
+    return canonical
+
+
+def sql_shape(sql: str) -> str:
+    """
+    Formato da query: forma canônica com literais trocados por "?"
+
+    Queries que só diferem nos valores (time, rodada, LIMIT...) têm o mesmo
+    formato; é a chave de agrupamento do log de queries.
+
+    Args:
+        sql: Query SQL
+
+    Returns:
+        Formato, ex: select * from "Jogos_Completos_2024" where home_team_name=? limit ?
+    """
+    shape = _STRING_RE.sub("?", canonicalize_sql(sql))
+    parts = []
+    for literal, quoted, _, other in _TOKEN_RE.findall(shape):
+        parts.append(quoted or _NUMBER_RE.sub("?", literal or other))
+    return _PARAM_LIST_RE.sub("(?)", "".join(parts))
+
+
+def referenced_tables(sql: str, known_tables: Iterable[str]) -> List[str]:
+    """
+    Listar quais tabelas conhecidas aparecem na query
+
+    Args:
+        sql: Query SQL
+        known_tables: Tabelas candidatas (ex: include_tables)
+
+    Returns:
+        Nomes das tabelas referenciadas, na grafia original
+    """
+    found = []
+    for table in known_tables:
+        pattern = r'(?<![\w"])"?' + re.escape(table) + r'"?(?![\w"])'
+        if re.search(pattern, sql, re.IGNORECASE):
+            found.append(table)
+    return found
+
+
+def sql_literal(value: str) -> str:
+    """
+    Converter valor em literal de string SQL (aspas simples escapadas)
+
+    Args:
+        value: Valor a inserir na query
+
+    Returns:
+        Literal pronto para concatenar, ex: 'Sao Paulo'
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def ensure_limit(sql: str, limit: int) -> Tuple[str, bool]:
+    """
+    Acrescentar LIMIT a uma query que não tem nenhum
+
+    Args:
+        sql: Query SELECT
+        limit: Linhas máximas
+
+    Returns:
+        Tuple (query, True se o LIMIT foi acrescentado)
+    """
+    if _LIMIT_RE.search(_QUOTED_RE.sub("", canonicalize_sql(sql))):
+        return sql, False
+    # Em linha nova: um comentário "--" no fim da query não engole o LIMIT
+    return f"{sql.strip().rstrip(';').rstrip()}\nLIMIT {int(limit)}", True
+
+
+def keyset_query(
+    sql: str,
+    key: str,
+    after: Optional[Any] = None,
+    limit: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Envolver uma query para paginação por chave (keyset)
+
+    Cada página continua de onde a anterior parou (key > after), sem OFFSET:
+    o custo de uma página não cresce com a posição dela no resultado.
+
+    Args:
+        sql: Query original (deve retornar a coluna key)
+        key: Coluna de ordenação, com valores únicos (ex: fixture_id)
+        after: Último valor de key da página anterior (None = primeira página)
+        limit: Linhas por página (None = sem limite)
+
+    Returns:
+        Tuple (query paginada, parâmetros)
+
+    Raises:
+        ValueError: Se key não for um identificador simples
+    """
+    if not _IDENTIFIER_RE.match(key):
+        raise ValueError(f"Coluna de paginação inválida: {key!r}")
+
+    inner = sql.strip().rstrip(";")
+    params: Dict[str, Any] = {}
+    query = f'SELECT * FROM ({inner}) AS keyset_page'
+    if after is not None:
+        query += f' WHERE "{key}" > :after'
+        params["after"] = after
+    query += f' ORDER BY "{key}"'
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query, params
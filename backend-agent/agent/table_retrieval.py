@@ -0,0 +1,202 @@
+"""
+Seleção de tabelas por pergunta
+Escolhe as top-k tabelas relevantes antes da geração de SQL, para que o prompt
+carregue apenas os schemas necessários
+"""
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.objects import ObjectIndex, SQLTableNodeMapping, SQLTableSchema
+from llama_index.core.schema import QueryBundle
+from llama_index.core.utilities.sql_wrapper import SQLDatabase
+from pydantic import Field
+from typing import Any, Dict, List, Optional
+import hashlib
+import math
+import threading
+
+from .normalize import STOPWORDS, fold_text
+from .tokens import count_tokens
+
+# Mínimo de tabelas por pergunta (o embedding local erra com poucas)
+MIN_TOP_K = 4
+
+# Palavra da descrição que aparece em mais tabelas que isso não identifica tabela nenhuma
+KEYWORD_MAX_TABLES = 3
+
+# Tabelas acrescentadas por palavra-chave, no máximo (as de palavras mais específicas primeiro)
+KEYWORD_MAX_EXTRA = 3
+
+
+def _keywords(text: str) -> set:
+    """Radicais (6 letras) das palavras relevantes do texto"""
+    return {
+        token[:6] for token in fold_text(text).split()
+        if len(token) >= 4 and token not in STOPWORDS
+    }
+
+
+class LocalHashEmbedding(BaseEmbedding):
+    """
+    Embedding local (sem rede) por hashing de palavras
+
+    Cada palavra normalizada (e seu radical de 6 letras) é mapeada para uma
+    dimensão do vetor. Suficiente para casar perguntas com as descrições das
+    tabelas e permite testar tudo offline.
+    """
+
+    dimensions: int = Field(default=512, description="Tamanho do vetor")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalHashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in fold_text(text).split():
+            if token in STOPWORDS or len(token) < 2:
+                continue
+            for feature in {token, token[:6]}:
+                digest = hashlib.md5(feature.encode("utf-8")).digest()
+                vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def get_embed_model(name: str) -> BaseEmbedding:
+    """
+    Criar modelo de embedding para a seleção de tabelas
+
+    Args:
+        name: "local" (hashing, offline) ou "openai"
+
+    Returns:
+        Modelo de embedding
+    """
+    if name == "openai":
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        return OpenAIEmbedding(model="text-embedding-3-small")
+    return LocalHashEmbedding()
+
+
+class TableSelector:
+    """
+    Retriever de tabelas (ObjectIndex sobre SQLTableSchema)
+
+    Compatível com o parâmetro table_retriever do NLSQLTableQueryEngine. Às
+    top-k do embedding (no mínimo MIN_TOP_K) somam-se as tabelas cuja descrição
+    cita uma palavra da pergunta ("placar", "cartões"), para o embedding local
+    não deixar de fora a tabela certa. Guarda, por thread, a última seleção
+    feita para que o LlamaSQLRetriever possa reportar a economia de tokens da
+    requisição.
+    """
+
+    def __init__(
+        self,
+        sql_database: SQLDatabase,
+        table_descriptions: Dict[str, str],
+        top_k: int,
+        embed_model: BaseEmbedding
+    ):
+        """
+        Construir índice das tabelas
+
+        Args:
+            sql_database: Banco (fornece a descrição de colunas de cada tabela)
+            table_descriptions: Descrição em linguagem natural de cada tabela
+            top_k: Quantidade de tabelas por pergunta (no mínimo MIN_TOP_K)
+            embed_model: Modelo de embedding
+        """
+        self.sql_database = sql_database
+        self.top_k = max(top_k, MIN_TOP_K)
+        self.table_descriptions = table_descriptions
+        self._local = threading.local()
+
+        self._schemas = {
+            table: SQLTableSchema(table_name=table, context_str=table_descriptions.get(table))
+            for table in sql_database.get_usable_table_names()
+        }
+        self._index = ObjectIndex.from_objects(
+            list(self._schemas.values()),
+            SQLTableNodeMapping(sql_database),
+            VectorStoreIndex,
+            embed_model=embed_model
+        )
+        self._retriever = self._index.as_retriever(similarity_top_k=self.top_k)
+
+        # Palavra (radical) → tabelas cuja descrição a cita (só palavras que distinguem tabelas)
+        keyword_tables: Dict[str, List[str]] = {}
+        for table in self._schemas:
+            for keyword in _keywords(f"{table} {table_descriptions.get(table) or ''}"):
+                keyword_tables.setdefault(keyword, []).append(table)
+        self._keyword_tables = {
+            keyword: tables for keyword, tables in keyword_tables.items()
+            if len(tables) <= KEYWORD_MAX_TABLES
+        }
+        self.refresh_token_counts()
+
+    def refresh_token_counts(self) -> None:
+        """
+        Contar os tokens de schema de cada tabela (no boot e após atualizar o snapshot)
+
+        A seleção por pergunta só soma esses valores, sem retokenizar os schemas.
+        """
+        table_tokens = {}
+        all_tables = []
+        for table, schema in self._schemas.items():
+            info = self.sql_database.get_single_table_info(table)
+            all_tables.append(info)
+            if schema.context_str:
+                info += " The table description is: " + schema.context_str
+            table_tokens[table] = count_tokens(info)
+        self._table_tokens = table_tokens
+        # Sem seleção o NLSQLRetriever envia todas as tabelas, sem as descrições
+        self.all_tables_tokens = count_tokens("\n\n".join(all_tables))
+
+    def retrieve(self, query_str: Any) -> List[SQLTableSchema]:
+        """
+        Selecionar as tabelas mais relevantes para a pergunta
+
+        Args:
+            query_str: Pergunta (str ou QueryBundle)
+
+        Returns:
+            Lista de SQLTableSchema
+        """
+        tables = self._retriever.retrieve(query_str)
+        question = query_str.query_str if isinstance(query_str, QueryBundle) else str(query_str)
+        selected = {table.table_name for table in tables}
+        matches = sorted(
+            (self._keyword_tables[keyword] for keyword in _keywords(question) if keyword in self._keyword_tables),
+            key=len
+        )
+        extra = dict.fromkeys(
+            table for keyword_tables in matches for table in keyword_tables if table not in selected
+        )
+        tables.extend(self._schemas[table] for table in list(extra)[:KEYWORD_MAX_EXTRA])
+        self._local.last_selection = self._selection_stats(tables)
+        return tables
+
+    def last_selection(self) -> Optional[Dict[str, Any]]:
+        """Estatísticas da última seleção feita nesta thread"""
+        return getattr(self._local, "last_selection", None)
+
+    def _selection_stats(self, tables: List[SQLTableSchema]) -> Dict[str, Any]:
+        table_tokens = self._table_tokens
+        selected_tokens = sum(table_tokens.get(table.table_name, 0) for table in tables)
+        return {
+            "tables": [table.table_name for table in tables],
+            "schema_tokens": selected_tokens,
+            "schema_tokens_all_tables": self.all_tables_tokens,
+            "tokens_saved": self.all_tables_tokens - selected_tokens,
+        }
@@ -0,0 +1,44 @@
+"""
+Contagem de tokens
+Usa o tokenizer do GPT-4o (tiktoken) quando disponível, senão uma estimativa
+"""
+
+from typing import Optional
+import threading
+
+_encoder = None
+_encoder_loaded = False
+_lock = threading.Lock()
+
+
+def _get_encoder():
+    """Carregar o encoder uma única vez (tiktoken pode precisar baixar o vocabulário)"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _lock:
+            if not _encoder_loaded:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoder = None  # Sem tiktoken/rede: usar estimativa
+                _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Contar tokens de um texto
+
+    Args:
+        text: Texto (prompt, contexto, etc.)
+
+    Returns:
+        Número de tokens (exato com tiktoken, ~4 caracteres por token sem ele)
+    """
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
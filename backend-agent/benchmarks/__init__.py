@@ -0,0 +1,3 @@
+"""
+Benchmarks do Tático Pro (rodam offline, sem OpenAI nem Supabase)
+"""
@@ -0,0 +1,140 @@
+"""
+Benchmark: latência e throughput do main.app de ponta a ponta (offline)
+
+Sobe o app FastAPI em processo (httpx + ASGI) com LLMs determinísticos
+(benchmarks/stubs.py) e um banco de fixture com as 23 tabelas
+(benchmarks/fixture.py), dispara uma mistura de perguntas (templates, NL→SQL,
+conversa) em vários níveis de concorrência e reporta p50/p95/p99 e req/s.
+
+Por padrão os caches de respostas/SQL ficam desligados para medir o pipeline
+inteiro em toda requisição (--cache liga).
+
+Uso (dentro de backend-agent/):
+    python -m benchmarks.bench_chat_latency --concurrency 1,8,32 --requests 200
+    python -m benchmarks.bench_chat_latency --endpoint stream --database-url postgresql://localhost/tatico_bench
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+QUESTIONS = [
+    "Quem são os artilheiros do {team}?",                        # template
+    "Como está o momentum do {team}?",                           # template
+    "Quais os próximos jogos do {team}?",                        # template
+    "Classificação do campeonato",                               # template
+    "Qual a média de chutes e posse de bola do {team}?",        # NL→SQL
+    "Quais as vulnerabilidades táticas do {team} na pressão?",  # NL→SQL
+    "Quantos cartões o {team} recebeu fora de casa?",            # NL→SQL
+    "Obrigado pela ajuda!",                                      # conversa
+]
+
+
+def build_workload(count: int):
+    from benchmarks.fixture import TEAMS  # importa agent.*: só depois de configurar o ambiente
+
+    return [
+        QUESTIONS[i % len(QUESTIONS)].format(team=TEAMS[(i // len(QUESTIONS)) % len(TEAMS)])
+        for i in range(count)
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def run_level(client, endpoint, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(index, question):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            payload = {"message": question, "session_id": f"bench-{concurrency}-{index}"}
+            if endpoint == "stream":
+                async with client.stream("POST", "/webhook/chat/stream", json=payload) as response:
+                    async for _ in response.aiter_raw():
+                        pass
+                    ok = response.status_code == 200
+            else:
+                response = await client.post("/webhook/chat", json=payload)
+                ok = response.status_code == 200
+            latencies.append(time.perf_counter() - started)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i, q) for i, q in enumerate(questions)])
+    return latencies, time.perf_counter() - started, errors
+
+
+async def run(args):
+    import httpx
+    import main
+
+    await main.startup_event()
+    await asyncio.gather(*main.background_tasks)  # réplica, entidades do roteador, snapshot
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            questions = build_workload(args.requests)
+            if args.warmup:
+                await run_level(client, args.endpoint, questions[:len(QUESTIONS)], len(QUESTIONS))
+
+            print(f"{'conc.':>6} {'req/s':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} {'erros':>6}")
+            for concurrency in args.concurrency:
+                latencies, elapsed, errors = await run_level(client, args.endpoint, questions, concurrency)
+                ms = [value * 1000 for value in latencies]
+                print(f"{concurrency:>6} {len(latencies) / elapsed:>9.1f} {statistics.median(ms):>10.1f} "
+                      f"{percentile(ms, 95):>10.1f} {percentile(ms, 99):>10.1f} {errors:>6}")
+    finally:
+        await main.shutdown_event()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="Níveis de concorrência")
+    parser.add_argument("--requests", type=int, default=160, help="Requisições por nível")
+    parser.add_argument("--endpoint", default="chat", choices=["chat", "stream"])
+    parser.add_argument("--chat-latency-ms", type=float, default=50, help="Latência do LLM conversacional")
+    parser.add_argument("--sql-latency-ms", type=float, default=80, help="Latência de cada chamada LLM do LlamaIndex")
+    parser.add_argument("--database-url", default=None, help="Banco da fixture (padrão: SQLite temporário)")
+    parser.add_argument("--cache", action="store_true", help="Manter caches de respostas e SQL ligados")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+        os.environ.update({
+            "DATABASE_URL": database_url,
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-benchmark"),
+            "SCHEMA_SNAPSHOT_PATH": os.path.join(tmp, "schema_snapshot.json"),
+            "SESSION_SQLITE_PATH": os.path.join(tmp, "sessions.sqlite3"),
+            "QUERY_LOG_PATH": os.path.join(tmp, "query_log.jsonl"),
+            "SQL_CACHE_PROBE_SECONDS": "0",
+            "REPLICA_REFRESH_SECONDS": "0",
+            "LOG_SAMPLE_RATE": "0",
+        })
+        if not args.cache:
+            os.environ.update({"ANSWER_CACHE_SIZE": "0", "SQL_CACHE_SIZE": "0"})
+
+        from benchmarks.fixture import create_fixture
+        from benchmarks.stubs import install_stubs
+
+        create_fixture(database_url)
+        install_stubs(args.chat_latency_ms, args.sql_latency_ms)
+
+        print(f"endpoint={args.endpoint} requisições={args.requests} cache={'on' if args.cache else 'off'} "
+              f"llm_chat={args.chat_latency_ms}ms llm_sql={args.sql_latency_ms}ms banco={database_url.split(':')[0]}")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: cauda de latência das chamadas LLM com o transporte compartilhado
+
+Dispara chamadas /chat/completions pelo SDK da OpenAI contra o servidor local
+de benchmarks/stub_openai_server.py (cauda lenta e falhas configuráveis) e
+compara o agent.llm_transport sem e com hedging: p50/p95/p99, retries,
+hedges e conexões abertas no servidor (keep-alive).
+
+Uso (dentro de backend-agent/):
+    python -m benchmarks.bench_llm_transport --requests 400 --concurrency 16
+    python -m benchmarks.bench_llm_transport --slow-rate 0.1 --fail-rate 0.02
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_chat_latency import percentile
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+
+async def run_mode(args, hedge: bool):
+    from openai import AsyncOpenAI
+
+    from agent.llm_transport import LLMTransport
+
+    with StubOpenAIServer(args.fast_ms, args.slow_ms, args.slow_rate, args.fail_rate) as server:
+        transport = LLMTransport(
+            max_connections=args.concurrency * 2,
+            max_keepalive=args.concurrency * 2,
+            read_timeout=args.deadline,
+            retry_base_ms=20,
+            retry_max_ms=200,
+            hedge=hedge,
+            hedge_min_delay_ms=args.hedge_min_delay_ms,
+            hedge_min_samples=20
+        )
+        client = AsyncOpenAI(
+            api_key="stub",
+            base_url=server.url,
+            max_retries=0,
+            http_client=transport.async_client("answer", args.deadline)
+        )
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(index):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await client.chat.completions.create(
+                        model="gpt-4o", messages=[{"role": "user", "content": f"pergunta {index}"}]
+                    )
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(args.requests)])
+        elapsed = time.perf_counter() - started
+        stats = transport.stats()["stages"]["answer"]
+        await client.close()
+        await transport.aclose()
+
+    ms = [value * 1000 for value in latencies]
+    print(f"{'on' if hedge else 'off':>6} {len(ms) / elapsed:>9.1f} {statistics.median(ms):>10.1f} "
+          f"{percentile(ms, 95):>10.1f} {percentile(ms, 99):>10.1f} {stats['retries']:>8} "
+          f"{stats['hedges']:>7} {stats['hedge_wins']:>6} {server.connections:>6} {errors:>6}")
+
+
+async def run(args):
+    print(f"{'hedge':>6} {'req/s':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} "
+          f"{'retries':>8} {'hedges':>7} {'wins':>6} {'conns':>6} {'erros':>6}")
+    for hedge in (False, True):
+        await run_mode(args, hedge)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--fast-ms", type=float, default=20, help="Latência normal do stub")
+    parser.add_argument("--slow-ms", type=float, default=500, help="Latência da cauda lenta")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fração de respostas lentas")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fração de respostas 503")
+    parser.add_argument("--deadline", type=float, default=10, help="Prazo por chamada (s)")
+    parser.add_argument("--hedge-min-delay-ms", type=float, default=50, help="Espera mínima antes do hedge")
+    args = parser.parse_args()
+
+    print(f"requisições={args.requests} concorrência={args.concurrency} stub={args.fast_ms}ms "
+          f"(cauda {args.slow_rate:.0%} a {args.slow_ms}ms, falhas {args.fail_rate:.0%})")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark: throughput do chat com N processos compartilhando as sessões
+
+Simula `uvicorn --workers N`: cada processo roda um TaticoProAgent com LLM falso
+(latência + custo de CPU configuráveis) e as mensagens de uma mesma sessão são
+distribuídas em round-robin entre os processos. Ao final confere se cada sessão
+guardou o histórico completo, independente do worker que atendeu cada turno.
+
+Uso (dentro de backend-agent/):
+    python -m benchmarks.bench_session_workers --workers 1,2,4 --backend sqlite
+"""
+
+from langchain_core.messages import AIMessage
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+
+class FakeChatLLM:
+    """LLM falso: gasta cpu_ms de CPU (montagem/parse do prompt) e espera latency_ms"""
+
+    def __init__(self, latency_ms: float, cpu_ms: float):
+        self.latency = latency_ms / 1000
+        self.cpu = cpu_ms / 1000
+
+    async def ainvoke(self, messages):
+        deadline = time.perf_counter() + self.cpu
+        while time.perf_counter() < deadline:
+            pass
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=f"Resposta para: {messages[-1].content[:40]}")
+
+
+class FakeSQLRetriever:
+    """Retriever mínimo: as mensagens do benchmark não consultam o banco"""
+
+    include_tables = []
+
+    def __init__(self):
+        from agent.llm_transport import LLMTransport
+
+        self.llm_transport = LLMTransport()  # o LLM falso não usa, mas o agente monta o ChatOpenAI com ele
+
+    async def natural_language_query(self, question, route=None):
+        return {"answer": "", "sql_query": None, "success": False}
+
+
+def run_worker(worker_index, workers, args, ready, start, results):
+    from agent.langchain_chat import TaticoProAgent
+
+    agent = TaticoProAgent(FakeSQLRetriever())
+    agent.llm = FakeChatLLM(args.llm_latency_ms, args.cpu_ms)
+
+    # Turno t da sessão s é atendido pelo worker (s + t) % workers
+    jobs = [
+        (session, turn)
+        for turn in range(args.turns)
+        for session in range(args.sessions)
+        if (session + turn) % workers == worker_index
+    ]
+
+    async def main():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(session, turn):
+            async with semaphore:
+                await agent.process_message(
+                    user_message=f"obrigado pela ajuda, turno {turn}",
+                    session_id=f"bench-{session}"
+                )
+
+        await asyncio.gather(*[one(session, turn) for session, turn in jobs])
+
+    ready.release()
+    start.wait()
+    asyncio.run(main())
+    results.put(len(jobs))
+    agent.sessions.close()
+
+
+def run(workers, args):
+    ctx = multiprocessing.get_context("fork")
+    ready = ctx.Semaphore(0)
+    start = ctx.Event()
+    results = ctx.Queue()
+
+    processes = [
+        ctx.Process(target=run_worker, args=(index, workers, args, ready, start, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+
+    # Mede só o processamento (sem o tempo de importação/inicialização dos workers)
+    started_at = time.perf_counter()
+    start.set()
+    total_requests = sum(results.get() for _ in processes)
+    elapsed = time.perf_counter() - started_at
+    for process in processes:
+        process.join()
+
+    if args.backend == "memory":
+        return total_requests / elapsed, elapsed, None  # Sessões morreram com os workers
+
+    from agent.sessions import create_session_store
+    store = create_session_store()
+    complete = sum(
+        1 for session in range(args.sessions)
+        if len(store.get_or_create(f"bench-{session}")[1].messages)
+        == min(2 * args.turns, int(os.getenv("SESSION_MAX_MESSAGES", "50")))
+    )
+    store.close()
+    return total_requests / elapsed, elapsed, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 4}", help="Lista de quantidades de processos")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "memory"])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=32, help="Requisições simultâneas por processo")
+    parser.add_argument("--llm-latency-ms", type=float, default=20)
+    parser.add_argument("--cpu-ms", type=float, default=5, help="CPU gasta por requisição")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["SESSION_BACKEND"] = args.backend
+
+    print(f"backend={args.backend} sessões={args.sessions} turnos={args.turns} "
+          f"latência_llm={args.llm_latency_ms}ms cpu={args.cpu_ms}ms")
+    print(f"{'workers':>8} {'req/s':>10} {'tempo (s)':>10} {'sessões completas':>20}")
+
+    for workers in [int(value) for value in args.workers.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["SESSION_SQLITE_PATH"] = os.path.join(tmp, "sessions.sqlite3")
+            throughput, elapsed, complete = run(workers, args)
+        complete_str = "n/a" if complete is None else f"{complete}/{args.sessions}"
+        print(f"{workers:>8} {throughput:>10.1f} {elapsed:>10.2f} {complete_str:>20}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Banco de dados de fixture para os benchmarks
+
+Recria as 23 tabelas de include_tables com as colunas usadas pelos templates e
+pelo contexto de SQL, preenchidas com dados determinísticos (20 times, 38
+rodadas). Usa só tipos genéricos do SQLAlchemy, então funciona em SQLite e em
+um PostgreSQL local.
+"""
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine
+from typing import Dict, List
+import random
+
+from agent.llama_sql import TABLE_DESCRIPTIONS
+
+TEAMS = [
+    "Flamengo", "Internacional", "Palmeiras", "Botafogo", "Fortaleza", "Sao Paulo",
+    "Cruzeiro", "Bahia", "Vasco DA Gama", "Atletico-MG", "Gremio", "Corinthians",
+    "Fluminense", "Vitoria", "Bragantino", "Juventude", "Criciuma", "Athletico Paranaense",
+    "Atletico Goianiense", "Cuiaba",
+]
+
+FIRST_NAMES = ["Bruno", "Rafael", "Thiago", "Gabriel", "Pedro", "Lucas", "Matheus", "Alan", "Wesley", "Vitor"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Costa", "Pereira", "Almeida", "Ribeiro", "Carvalho"]
+
+# Colunas específicas (as demais tabelas int_* usam o formato genérico abaixo)
+_COLUMNS = {
+    "Times_2024": [("team_id", Integer), ("team_name", String), ("team_code", String), ("venue_name", String)],
+    "Jogadores_por_Time_2024_2": [("player_id", Integer), ("player_name", String), ("team_name", String),
+                                  ("position", String), ("age", Integer)],
+    "Tecnicos_2024": [("coach_name", String), ("team_name", String), ("age", Integer)],
+    "Jogos_Completos_2024": [("fixture_id", Integer), ("round", String), ("date", String),
+                             ("home_team_name", String), ("away_team_name", String),
+                             ("home_goals", Integer), ("away_goals", Integer),
+                             ("venue_name", String), ("venue_city", String), ("status", String)],
+    "Resultados_Jogos_2024": [("fixture_id", Integer), ("round", String), ("home_team_name", String),
+                              ("away_team_name", String), ("home_goals", Integer), ("away_goals", Integer)],
+    "Estatisticas_Por_Jogo_2024": [("fixture_id", Integer), ("team_name", String), ("shots_total", Integer),
+                                   ("shots_on_goal", Integer), ("ball_possession", Float), ("fouls", Integer),
+                                   ("corner_kicks", Integer), ("yellow_cards", Integer)],
+    "Estatisticas_Jogadores_Por_Jogo_2024": [("fixture_id", Integer), ("player_name", String),
+                                             ("team_name", String), ("minutes", Integer), ("rating", Float),
+                                             ("goals", Integer), ("assists", Integer), ("passes", Integer)],
+    "Eventos_Jogos_2024": [("fixture_id", Integer), ("team_name", String), ("player_name", String),
+                           ("type", String), ("detail", String), ("elapsed", Integer)],
+    "Relacionados_por_Jogo_2024": [("fixture_id", Integer), ("team_name", String), ("player_name", String),
+                                   ("lineup_type", String)],
+    "int_jogadores_detalhados": [("adversario", String), ("mais_substituidos", String),
+                                 ("principais_artilheiros", String), ("jogadores_mais_utilizados", String),
+                                 ("titulares_provaveis", String), ("formacao_preferida", String)],
+    "int_classificacao_campeonato": [("posicao", Integer), ("time", String), ("pontos_total", Integer),
+                                     ("jogos_disputados", Integer), ("total_vitorias", Integer),
+                                     ("total_empates", Integer), ("total_derrotas", Integer)],
+    "int_momentum_atual": [("time", String), ("pontos_recentes", Integer), ("sequencia_recente", String)],
+    "int_stats_comparativas": [("time", String), ("media_gols_marcados", Float), ("media_gols_sofridos", Float),
+                               ("media_chutes", Float), ("media_posse", Float)],
+}
+_GENERIC_INT_COLUMNS = [("time", String), ("adversario", String), ("metrica", String),
+                        ("valor", Float), ("descricao", String)]
+
+
+def _players() -> Dict[str, List[str]]:
+    players = {}
+    for index, team in enumerate(TEAMS):
+        players[team] = [
+            f"{FIRST_NAMES[(index + i) % len(FIRST_NAMES)]} {LAST_NAMES[(index * 3 + i) % len(LAST_NAMES)]} {team[:3]}"
+            for i in range(18)
+        ]
+    return players
+
+
+def _rows(table: str, rng: random.Random, players: Dict[str, List[str]]) -> List[dict]:
+    fixtures = []
+    for round_number in range(1, 39):
+        for i in range(0, len(TEAMS), 2):
+            home, away = TEAMS[(i + round_number) % len(TEAMS)], TEAMS[(i + 1 + round_number * 3) % len(TEAMS)]
+            if home != away:
+                fixtures.append((len(fixtures) + 1, round_number, home, away))
+
+    if table == "Times_2024":
+        return [{"team_id": i + 1, "team_name": t, "team_code": t[:3].upper(), "venue_name": f"Estadio {t}"}
+                for i, t in enumerate(TEAMS)]
+    if table == "Jogadores_por_Time_2024_2":
+        return [{"player_id": team_index * 100 + i, "player_name": p, "team_name": team,
+                 "position": rng.choice(["G", "D", "M", "F"]), "age": rng.randint(18, 36)}
+                for team_index, (team, names) in enumerate(players.items()) for i, p in enumerate(names)]
+    if table == "Tecnicos_2024":
+        return [{"coach_name": f"Tecnico {t}", "team_name": t, "age": rng.randint(40, 65)} for t in TEAMS]
+    if table in ("Jogos_Completos_2024", "Resultados_Jogos_2024"):
+        rows = []
+        for fixture_id, round_number, home, away in fixtures:
+            row = {"fixture_id": fixture_id, "round": f"Regular Season - {round_number}",
+                   "home_team_name": home, "away_team_name": away,
+                   "home_goals": rng.randint(0, 4), "away_goals": rng.randint(0, 3)}
+            if table == "Jogos_Completos_2024":
+                # Rodadas 36-38 ainda por jogar (como em int_classificacao_campeonato)
+                row.update(date=f"2024-{4 + round_number // 5:02d}-{1 + round_number % 28:02d}",
+                           venue_name=f"Estadio {home}", venue_city="Cidade",
+                           status="FT" if round_number <= 35 else "NS")
+            rows.append(row)
+        return rows
+    if table == "Estatisticas_Por_Jogo_2024":
+        return [{"fixture_id": f[0], "team_name": team, "shots_total": rng.randint(5, 25),
+                 "shots_on_goal": rng.randint(1, 10), "ball_possession": round(rng.uniform(30, 70), 1),
+                 "fouls": rng.randint(5, 20), "corner_kicks": rng.randint(0, 12), "yellow_cards": rng.randint(0, 5)}
+                for f in fixtures for team in f[2:]]
+    if table in ("Estatisticas_Jogadores_Por_Jogo_2024", "Relacionados_por_Jogo_2024", "Eventos_Jogos_2024"):
+        rows = []
+        for f in fixtures[:120]:
+            for team in f[2:]:
+                for i, player in enumerate(players[team][:14]):
+                    if table == "Estatisticas_Jogadores_Por_Jogo_2024":
+                        rows.append({"fixture_id": f[0], "player_name": player, "team_name": team,
+                                     "minutes": rng.randint(10, 90), "rating": round(rng.uniform(5.5, 8.5), 1),
+                                     "goals": int(rng.random() < 0.1), "assists": int(rng.random() < 0.08),
+                                     "passes": rng.randint(5, 80)})
+                    elif table == "Relacionados_por_Jogo_2024":
+                        rows.append({"fixture_id": f[0], "team_name": team, "player_name": player,
+                                     "lineup_type": "Starting XI" if i < 11 else "Substitute"})
+                    elif rng.random() < 0.15:
+                        rows.append({"fixture_id": f[0], "team_name": team, "player_name": player,
+                                     "type": rng.choice(["Goal", "Card", "subst"]), "detail": "-",
+                                     "elapsed": rng.randint(1, 90)})
+        return rows
+    if table == "int_jogadores_detalhados":
+        return [{"adversario": t,
+                 "mais_substituidos": ", ".join(f"{p} ({rng.randint(3, 15)}x aos {rng.uniform(55, 80):.1f}min)"
+                                                for p in players[t][:3]),
+                 "principais_artilheiros": ", ".join(f"{p} ({rng.randint(2, 12)}g, {rng.randint(0, 5)}a)"
+                                                     for p in players[t][8:11]),
+                 "jogadores_mais_utilizados": ", ".join(f"{p} (~{rng.randint(18, 30)} jogos)"
+                                                        for p in players[t][:3]),
+                 "titulares_provaveis": ", ".join(players[t][:11]),
+                 "formacao_preferida": rng.choice(["4-3-3", "4-4-2", "4-2-3-1", "3-5-2"])}
+                for t in TEAMS]
+    if table == "int_classificacao_campeonato":
+        rows = []
+        for position, team in enumerate(TEAMS, start=1):
+            wins, draws = 24 - position, 8 + position % 4
+            rows.append({"posicao": position, "time": team, "pontos_total": wins * 3 + draws,
+                         "jogos_disputados": 35, "total_vitorias": wins, "total_empates": draws,
+                         "total_derrotas": 35 - wins - draws})
+        return rows
+    if table == "int_momentum_atual":
+        return [{"time": t, "pontos_recentes": rng.randint(0, 15),
+                 "sequencia_recente": "".join(rng.choice("VED") for _ in range(5))} for t in TEAMS]
+    if table == "int_stats_comparativas":
+        return [{"time": t, "media_gols_marcados": round(rng.uniform(0.8, 2.2), 2),
+                 "media_gols_sofridos": round(rng.uniform(0.6, 1.8), 2),
+                 "media_chutes": round(rng.uniform(9, 17), 1), "media_posse": round(rng.uniform(40, 60), 1)}
+                for t in TEAMS]
+    return [{"time": t, "adversario": rng.choice(TEAMS), "metrica": f"{table}_{i}",
+             "valor": round(rng.uniform(0, 100), 2), "descricao": f"{table} de {t}"}
+            for t in TEAMS for i in range(5)]
+
+
+def create_fixture(database_url: str, seed: int = 42) -> List[str]:
+    """
+    Criar (ou recriar) as 23 tabelas com dados determinísticos
+
+    Args:
+        database_url: URL SQLAlchemy (ex: sqlite:///bench.sqlite3)
+        seed: Semente dos dados
+
+    Returns:
+        Lista de tabelas criadas
+    """
+    rng = random.Random(seed)
+    players = _players()
+    engine = create_engine(database_url)
+    metadata = MetaData()
+    tables = []
+    for name in TABLE_DESCRIPTIONS:
+        columns = _COLUMNS.get(name, _GENERIC_INT_COLUMNS)
+        tables.append(Table(name, metadata, Column("id", Integer, primary_key=True),
+                            *[Column(column, type_) for column, type_ in columns]))
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table in tables:
+            rows = _rows(table.name, rng, players)
+            if rows:
+                conn.execute(table.insert(), rows)
+    engine.dispose()
+    return [table.name for table in tables]
@@ -0,0 +1,161 @@
+"""
+Servidor HTTP local que imita /v1/chat/completions da OpenAI
+
+Latência configurável com cauda (slow_rate das respostas demora slow_ms) e
+falhas 503 (fail_rate), para exercitar o agent.llm_transport sem rede:
+keep-alive, retries, prazos e hedging. Aceita stream=true (SSE).
+
+Uso (dentro de backend-agent/):
+    python -m benchmarks.stub_openai_server --port 8090 --slow-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 uvicorn main:app
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # cliente desistiu (hedge cancelado, prazo esgotado)
+
+
+class StubOpenAIServer:
+    """Servidor em thread própria; use como context manager (url = base da API)"""
+
+    def __init__(
+        self,
+        fast_ms: float = 20,
+        slow_ms: float = 500,
+        slow_rate: float = 0.05,
+        fail_rate: float = 0.0,
+        port: int = 0,
+        seed: int = 7
+    ):
+        self.fast_ms = fast_ms
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _QuietServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.fail_rate
+            slow = self._random.random() < self.slow_rate
+        return failed, (self.slow_ms if slow else self.fast_ms) / 1000
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+                failed, delay = stub._draw()
+                time.sleep(delay)
+                if failed:
+                    self._send_json(503, {"error": {"message": "stub overloaded", "type": "server_error"}})
+                    return
+
+                messages = request.get("messages", [])
+                question = str(messages[-1].get("content", ""))[:80] if messages else ""
+                content = f"SELECT 1; -- resposta simulada para: {question}"
+                model = request.get("model", "stub")
+                if request.get("stream"):
+                    self._stream(model, content)
+                    return
+                self._send_json(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+                })
+
+            def _stream(self, model, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = content.split(" ")
+                events = [{"choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]} for word in words]
+                events.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                               "usage": {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)}})
+                for event in events:
+                    event.update({"id": "chatcmpl-stub", "object": "chat.completion.chunk",
+                                  "created": int(time.time()), "model": model})
+                    self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def __enter__(self) -> "StubOpenAIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--fast-ms", type=float, default=20)
+    parser.add_argument("--slow-ms", type=float, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    with StubOpenAIServer(args.fast_ms, args.slow_ms, args.slow_rate, args.fail_rate, port=args.port) as server:
+        print(f"🧪 Stub OpenAI em {server.url} (Ctrl+C para sair)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
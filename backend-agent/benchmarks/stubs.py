@@ -0,0 +1,137 @@
+"""
+LLMs determinísticos para os benchmarks (sem rede, latência configurável)
+
+- StubChatModel substitui o ChatOpenAI do TaticoProAgent (ainvoke/astream com
+  usage_metadata, como a API real)
+- StubSQLLLM substitui o OpenAI do LlamaIndex: responde com um SELECT sobre a
+  primeira tabela do schema recebido no prompt, no formato "SQLQuery: ..."
+"""
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from typing import Any, AsyncIterator, Sequence
+import asyncio
+import re
+import time
+
+from agent.tokens import count_tokens
+
+_TABLE_RE = re.compile(r"Table '([^']+)'")
+_QUESTION_RE = re.compile(r"Question: (.*)")
+
+
+def _text_of(messages) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+class StubChatModel(BaseChatModel):
+    """ChatOpenAI falso: espera latency_ms e devolve uma resposta fixa por pergunta"""
+
+    latency_ms: float = 50.0
+    chunks: int = 8  # trechos emitidos no astream
+
+    @property
+    def _llm_type(self) -> str:
+        return "tatico-stub-chat"
+
+    def _answer(self, messages) -> AIMessage:
+        prompt = _text_of(messages)
+        question = str(messages[-1].content).split("\n")[0][:80]
+        content = f"Resposta simulada para: {question}. " * 3
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": count_tokens(prompt),
+                "output_tokens": count_tokens(content),
+                "total_tokens": count_tokens(prompt) + count_tokens(content),
+            }
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._answer(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._answer(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        answer = self._answer(messages)
+        words = answer.content.split(" ")
+        step = max(1, len(words) // self.chunks)
+        for start in range(0, len(words), step):
+            await asyncio.sleep(self.latency_ms / 1000 / self.chunks)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=" ".join(words[start:start + step]) + " "))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=answer.usage_metadata))
+
+
+class StubSQLLLM(CustomLLM):
+    """OpenAI (LlamaIndex) falso: gera SQL determinístico e espera latency_ms"""
+
+    latency_ms: float = 80.0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TaticoStubSQLLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="stub-sql", is_chat_model=True)
+
+    def _sql_for(self, prompt: str) -> str:
+        tables = _TABLE_RE.findall(prompt)
+        table = tables[0] if tables else "int_stats_comparativas"
+        return f'SQLQuery: SELECT * FROM "{table}" LIMIT 10'
+
+    def _respond(self, prompt: str) -> str:
+        time.sleep(self.latency_ms / 1000)
+        if "SQLQuery:" in prompt:
+            return self._sql_for(prompt)
+        question = _QUESTION_RE.search(prompt)
+        return f"Resumo simulado: {question.group(1) if question else ''}"
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        prompt = _text_of(messages)
+        text = self._respond(prompt)
+        return ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=text),
+            additional_kwargs={
+                "prompt_tokens": count_tokens(prompt),
+                "completion_tokens": count_tokens(text),
+                "total_tokens": count_tokens(prompt) + count_tokens(text),
+            }
+        )
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self._respond(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        yield self.complete(prompt, formatted=formatted, **kwargs)
+
+
+def install_stubs(chat_latency_ms: float, sql_latency_ms: float) -> None:
+    """
+    Substituir os LLMs reais pelos stubs (antes do startup do main.app)
+
+    Args:
+        chat_latency_ms: Latência do LLM conversacional
+        sql_latency_ms: Latência de cada chamada LLM do LlamaIndex
+    """
+    import agent.langchain_chat
+    import agent.llama_sql
+
+    agent.langchain_chat.ChatOpenAI = lambda **kwargs: StubChatModel(latency_ms=chat_latency_ms)
+    agent.llama_sql.OpenAI = lambda **kwargs: StubSQLLLM(latency_ms=sql_latency_ms)
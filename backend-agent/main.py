@@ -8,19 +8,27 @@ Arquitetura:
 3. FastAPI → Webhook REST API
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+import asyncio
+import json
 import os
+import time
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 # Importar módulos do agente
+from agent.admission import AdmissionController, AdmissionRejected
 from agent.llama_sql import LlamaSQLRetriever
 from agent.langchain_chat import TaticoProAgent
+from agent.metrics import render_gauges, render_metrics
 
 # Inicializar FastAPI
 app = FastAPI(
@@ -61,16 +69,78 @@ class ChatResponse(BaseModel):
     response: str
     sql_query: Optional[str] = None
     data_preview: Optional[dict] = None
+    prompt_tokens: Optional[int] = None  # tokens do prompt montado (None = resposta do cache)
     session_id: str
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+    max_concurrency: Optional[int] = None  # padrão: BATCH_MAX_CONCURRENCY
+    stream: bool = False  # True = NDJSON, um item por linha na ordem de conclusão
+
+class BatchChatItem(ChatResponse):
+    index: int  # posição do item em BatchChatRequest.requests
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
+    elapsed_ms: float
+
+class CacheInvalidateRequest(BaseModel):
+    tables: Optional[List[str]] = None  # None = todas as tabelas
+
 # Inicializar agentes globais
 llama_sql = None
 tatico_agent = None
+admission = None
+background_tasks = []
+
+async def refresh_schema_snapshot():
+    """Validar o snapshot do schema em segundo plano (sem atrasar o boot)"""
+    try:
+        await llama_sql.refresh_schema_snapshot()
+    except Exception as e:
+        print(f"⚠️ Erro ao atualizar snapshot do schema: {str(e)}")
+
+async def load_router_entities():
+    """Indexar times/jogadores no roteador em segundo plano"""
+    try:
+        await tatico_agent.load_router_entities()
+    except Exception as e:
+        print(f"⚠️ Erro ao carregar entidades do roteador: {str(e)}")
+
+async def load_round_calendar():
+    """Ler o calendário de rodadas (próximos jogos) em segundo plano"""
+    try:
+        await llama_sql.load_round_calendar()
+    except Exception as e:
+        print(f"⚠️ Erro ao carregar calendário de rodadas: {str(e)}")
+
+async def refresh_replica_periodically(interval: float):
+    """Carregar a réplica local das tabelas int_* e recarregá-la periodicamente"""
+    while True:
+        try:
+            reloaded = await llama_sql.refresh_replica()
+            llama_sql.invalidate_tables(list(reloaded))
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar réplica local: {str(e)}")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
+
+async def watch_table_versions(interval: float):
+    """Verificar periodicamente se as tabelas mudaram e invalidar os caches afetados"""
+    while True:
+        try:
+            changed = await llama_sql.refresh_changed_tables()
+            if changed and tatico_agent:
+                tatico_agent.invalidate_cache(changed)
+        except Exception as e:
+            print(f"⚠️ Erro ao verificar versões das tabelas: {str(e)}")
+        await asyncio.sleep(interval)
 
 @app.on_event("startup")
 async def startup_event():
     """Inicializar agentes na inicialização do servidor"""
-    global llama_sql, tatico_agent
+    global llama_sql, tatico_agent, admission
     
     print("🚀 Inicializando Tático Pro Agent...")
     
@@ -83,8 +153,35 @@ async def startup_event():
     tatico_agent = TaticoProAgent(llama_sql)
     print("✅ LangChain Conversational Agent inicializado")
     
+    # Controle de admissão do chat (ADMISSION_ENABLED=false desativa)
+    admission = AdmissionController.from_env()
+    
+    background_tasks.append(asyncio.create_task(refresh_schema_snapshot()))
+    background_tasks.append(asyncio.create_task(load_router_entities()))
+    background_tasks.append(asyncio.create_task(load_round_calendar()))
+    
+    # Réplica local das tabelas int_* (REPLICA_REFRESH_SECONDS=0 carrega só uma vez)
+    if llama_sql.replica is not None:
+        replica_interval = float(os.getenv("REPLICA_REFRESH_SECONDS", "900"))
+        background_tasks.append(asyncio.create_task(refresh_replica_periodically(replica_interval)))
+    
+    # Verificação periódica de alterações nas tabelas (0 desativa)
+    probe_interval = float(os.getenv("SQL_CACHE_PROBE_SECONDS", "60"))
+    if probe_interval > 0:
+        background_tasks.append(asyncio.create_task(watch_table_versions(probe_interval)))
+    
     print("🎉 Agente pronto para uso!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Liberar recursos dos agentes"""
+    for task in background_tasks:
+        task.cancel()
+    if llama_sql:
+        await llama_sql.close()
+    if tatico_agent:
+        tatico_agent.sessions.close()
+
 @app.get("/")
 async def root():
     """Health check"""
@@ -100,15 +197,99 @@ async def health_check():
     return {
         "status": "healthy",
         "llama_sql": llama_sql is not None,
-        "tatico_agent": tatico_agent is not None
+        "tatico_agent": tatico_agent is not None,
+        "sql_concurrency": llama_sql.get_concurrency_stats() if llama_sql else None,
+        "answer_cache": tatico_agent.answer_cache.stats() if tatico_agent else None,
+        "sql_cache": llama_sql.result_cache.stats() if llama_sql else None,
+        "replica": llama_sql.replica.stats() if llama_sql and llama_sql.replica else None,
+        "coalescing": {
+            "answers": tatico_agent.inflight.stats(),
+            "questions": llama_sql.inflight.stats(),
+            "sql": llama_sql.sql_database.inflight.stats()
+        } if llama_sql and tatico_agent else None,
+        "sql_templates": llama_sql.templates.stats() if llama_sql and llama_sql.templates else None,
+        "sql_guard": llama_sql.guard.stats() if llama_sql and llama_sql.guard else None,
+        "query_planner": llama_sql.planner.stats() if llama_sql and llama_sql.planner else None,
+        "llm_transport": llama_sql.llm_transport.stats() if llama_sql else None,
+        "admission": admission.stats() if admission else None,
+        "sessions": await tatico_agent.session_stats() if tatico_agent else None,
+        "router_entities": tatico_agent.router.entity_count if tatico_agent else None
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas no formato texto do Prometheus (histogramas por etapa + estado dos caches)"""
+    gauges = []
+    if llama_sql:
+        gauges += render_gauges("tatico_sql_concurrency", llama_sql.get_concurrency_stats())
+        gauges += render_gauges("tatico_sql_cache", llama_sql.result_cache.stats())
+        gauges += render_gauges("tatico_sql_coalescing", llama_sql.inflight.stats())
+        if llama_sql.templates:
+            gauges += render_gauges("tatico_sql_templates", llama_sql.templates.stats())
+        if llama_sql.replica:
+            gauges += render_gauges("tatico_replica", llama_sql.replica.stats())
+    if tatico_agent:
+        gauges += render_gauges("tatico_answer_cache", tatico_agent.answer_cache.stats())
+        gauges += render_gauges("tatico_answer_coalescing", tatico_agent.inflight.stats())
+        gauges += render_gauges("tatico_sessions", await tatico_agent.session_stats())
+    if admission:
+        gauges += render_gauges("tatico_admission", admission.stats())
+    return render_metrics(gauges)
+
+async def admit_chat(session_id: Optional[str], http_request: Request, weight: int = 1):
+    """
+    Passar a pergunta pelo controle de admissão
+    
+    A chave de justiça é o session_id. Sem sessão, o rodízio da fila usa a
+    identidade do cliente (primeiro endereço do X-Forwarded-For ou o IP), mas
+    o limite por sessão não se aplica: atrás de proxy/NAT (inclusive o
+    servidor do frontend) muitos usuários compartilham o mesmo endereço. O
+    header X-Request-Timeout-Ms informa o prazo do cliente: se a fila não
+    andaria a tempo, a pergunta é recusada antes de gastar tokens.
+    
+    Args:
+        session_id: Sessão da pergunta (None = cliente anônimo)
+        http_request: Requisição HTTP (headers e IP)
+        weight: Vagas ocupadas (lotes: itens em paralelo)
+    
+    Returns:
+        AdmissionTicket (ou None com a admissão desativada)
+    
+    Raises:
+        HTTPException: 429/503 com Retry-After quando saturado
+    """
+    if admission is None:
+        return None
+    
+    client_timeout = None
+    header = http_request.headers.get("x-request-timeout-ms")
+    if header:
+        try:
+            client_timeout = float(header) / 1000
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"X-Request-Timeout-Ms inválido: {header}")
+    
+    if session_id:
+        key = f"session:{session_id}"
+    else:
+        forwarded = http_request.headers.get("x-forwarded-for", "").split(",")[0].strip()
+        key = f"client:{forwarded or (http_request.client.host if http_request.client else 'anon')}"
+    try:
+        return await admission.acquire(key, client_timeout, limit_session=bool(session_id), weight=weight)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
 @app.post("/webhook/chat", response_model=ChatResponse)
-async def chat_webhook(request: ChatRequest):
+async def chat_webhook(request: ChatRequest, http_request: Request):
     """
     Webhook principal para o chat
     
-    Recebe mensagem do usuário e retorna resposta do agente
+    Recebe mensagem do usuário e retorna resposta do agente. Sob saturação
+    responde 429 (limite da sessão) ou 503 (fila cheia) com Retry-After.
     """
     try:
         if not tatico_agent:
@@ -117,15 +298,22 @@ async def chat_webhook(request: ChatRequest):
                 detail="Agente não inicializado. Aguarde alguns segundos."
             )
         
-        # Processar mensagem com o agente
-        response_data = await tatico_agent.process_message(
-            user_message=request.message,
-            conversation_history=request.conversation_history,
-            session_id=request.session_id
-        )
+        ticket = await admit_chat(request.session_id, http_request)
+        try:
+            # Processar mensagem com o agente
+            response_data = await tatico_agent.process_message(
+                user_message=request.message,
+                conversation_history=request.conversation_history,
+                session_id=request.session_id
+            )
+        finally:
+            if ticket is not None:
+                ticket.release()
         
         return ChatResponse(**response_data)
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erro no webhook: {str(e)}")
         raise HTTPException(
@@ -133,29 +321,254 @@ async def chat_webhook(request: ChatRequest):
             detail=f"Erro ao processar mensagem: {str(e)}"
         )
 
+def sse_event(event: str, data: dict) -> str:
+    """Formatar evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que devolve a vaga do controle de admissão ao terminar
+    
+    O release fica no __call__ (e não só no gerador): um gerador que nunca foi
+    iterado (cliente desconectou antes do primeiro trecho) não executa o
+    próprio finally.
+    """
+    
+    def __init__(self, content, ticket, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.ticket is not None:
+                self.ticket.release()
+
+@app.post("/webhook/chat/stream")
+async def chat_stream_webhook(request: ChatRequest, http_request: Request):
+    """
+    Webhook de chat com streaming (SSE)
+    
+    Emite "status" ao consultar os dados, "sql" com a query gerada, "token" com
+    cada trecho da resposta e "done" com os campos do ChatResponse. Passa pelo
+    mesmo controle de admissão do /webhook/chat (a vaga fica ocupada até o fim
+    do stream).
+    """
+    if not tatico_agent:
+        raise HTTPException(
+            status_code=503,
+            detail="Agente não inicializado. Aguarde alguns segundos."
+        )
+    
+    ticket = await admit_chat(request.session_id, http_request)
+    
+    async def event_stream():
+        try:
+            async for event, data in tatico_agent.stream_message(
+                user_message=request.message,
+                conversation_history=request.conversation_history,
+                session_id=request.session_id
+            ):
+                if event == "done":
+                    data = ChatResponse(**data).model_dump()
+                yield sse_event(event, data)
+        finally:
+            if ticket is not None:
+                ticket.release()
+    
+    try:
+        return AdmittedStreamingResponse(
+            event_stream(),
+            ticket,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except BaseException:
+        if ticket is not None:
+            ticket.release()
+        raise
+
+@app.post("/webhook/chat/batch")
+async def chat_batch_webhook(request: BatchChatRequest, http_request: Request):
+    """
+    Webhook de chat em lote (ex: relatório pré-jogo)
+    
+    Processa os itens em paralelo até o limite de concorrência. Sem streaming,
+    devolve todos os resultados na ordem do pedido; com "stream": true, emite
+    NDJSON com cada resultado assim que ele fica pronto.
+    
+    O lote passa pelo controle de admissão como uma unidade que ocupa uma vaga
+    por item em paralelo; se todos os itens são da mesma sessão, o paralelismo
+    fica limitado a ADMISSION_MAX_PER_SESSION.
+    """
+    if not tatico_agent:
+        raise HTTPException(
+            status_code=503,
+            detail="Agente não inicializado. Aguarde alguns segundos."
+        )
+    
+    max_size = int(os.getenv("BATCH_MAX_SIZE", "200"))
+    if len(request.requests) > max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lote com {len(request.requests)} perguntas (máximo {max_size})"
+        )
+    
+    max_concurrency = min(
+        request.max_concurrency or int(os.getenv("BATCH_MAX_CONCURRENCY", "16")),
+        int(os.getenv("BATCH_MAX_CONCURRENCY_LIMIT", "32"))
+    )
+    items = [
+        {
+            "user_message": item.message,
+            "conversation_history": item.conversation_history,
+            "session_id": item.session_id
+        }
+        for item in request.requests
+    ]
+    max_concurrency = max(1, min(max_concurrency, len(items)))
+    
+    sessions = {item.session_id for item in request.requests}
+    batch_session = sessions.pop() if len(sessions) == 1 else None
+    if batch_session and admission is not None and admission.max_per_session > 0:
+        max_concurrency = min(max_concurrency, admission.max_per_session)
+    ticket = await admit_chat(batch_session, http_request, weight=max_concurrency)
+    if ticket is not None:
+        max_concurrency = ticket.weight  # nunca mais itens em paralelo do que vagas admitidas
+    
+    try:
+        results = tatico_agent.process_batch(items, max_concurrency)
+        
+        if request.stream:
+            async def ndjson_stream():
+                try:
+                    async for index, data in results:
+                        item = BatchChatItem(index=index, **data).model_dump()
+                        yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+                finally:
+                    if ticket is not None:
+                        ticket.release()
+            
+            return AdmittedStreamingResponse(ndjson_stream(), ticket, media_type="application/x-ndjson")
+        
+        started = time.perf_counter()
+        ordered = [None] * len(items)
+        async for index, data in results:
+            ordered[index] = BatchChatItem(index=index, **data)
+    except BaseException:
+        if ticket is not None:
+            ticket.release()
+        raise
+    
+    if ticket is not None:
+        ticket.release()
+    return BatchChatResponse(
+        results=ordered,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+def json_default(value):
+    """Valores do banco sem tipo JSON equivalente (Decimal, datas...)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    return str(value)
+
+def parse_cursor(value: Optional[str]):
+    """Cursor da paginação por chave: o next_after da página anterior (número ou texto)"""
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
 @app.post("/webhook/sql-query")
-async def sql_query_webhook(query: str):
+async def sql_query_webhook(
+    query: str,
+    format: str = "json",
+    max_rows: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    key: Optional[str] = None,
+    after: Optional[str] = None
+):
     """
     Webhook para executar query SQL direta (opcional, para debug)
+    
+    O resultado é lido do banco em blocos (cursor no servidor) e limitado a
+    max_rows (teto SQL_QUERY_MAX_ROWS). Formatos: "json" (resposta única),
+    "ndjson" (uma linha por registro) e "columnar" (um bloco de colunas por
+    linha). Com key, pagina por chave: passe o next_after recebido em after.
     """
+    if not llama_sql:
+        raise HTTPException(
+            status_code=503,
+            detail="SQL Retriever não inicializado"
+        )
+    if format not in ("json", "ndjson", "columnar"):
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {format}")
+    
     try:
-        if not llama_sql:
+        stream = await llama_sql.stream_raw_query(
+            query,
+            chunk_size=chunk_size,
+            max_rows=max_rows,
+            key=key,
+            after=parse_cursor(after)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro na query: {str(e)}"
+        )
+    
+    def summary() -> dict:
+        return {
+            "row_count": stream.row_count,
+            "truncated": stream.truncated,
+            "next_after": stream.last_key if key and stream.truncated else None
+        }
+    
+    if format == "json":
+        try:
+            rows = [dict(zip(stream.columns, row)) async for chunk in stream for row in chunk]
+        except Exception as e:
             raise HTTPException(
-                status_code=503,
-                detail="SQL Retriever não inicializado"
+                status_code=500,
+                detail=f"Erro na query: {str(e)}"
             )
-        
-        result = await llama_sql.execute_raw_query(query)
         return {
             "success": True,
-            "data": result
+            "data": rows,
+            **summary()
         }
     
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro na query: {str(e)}"
-        )
+    def line(data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False, default=json_default) + "\n"
+    
+    async def ndjson_stream():
+        try:
+            yield line({"columns": stream.columns})
+            async for chunk in stream:
+                if format == "ndjson":
+                    yield "".join(line(dict(zip(stream.columns, row))) for row in chunk)
+                else:
+                    yield line({"data": {
+                        column: [row[i] for row in chunk]
+                        for i, column in enumerate(stream.columns)
+                    }})
+            yield line({"done": True, **summary()})
+        except Exception as e:
+            print(f"❌ Erro ao executar SQL (stream): {str(e)}")
+            yield line({"error": str(e)})
+        finally:
+            await stream.aclose()  # cliente desconectou antes do fim: liberar a conexão
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
 
 @app.get("/tables")
 async def list_tables():
@@ -170,6 +583,23 @@ async def list_tables():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cache/invalidate")
+async def invalidate_cache(request: Optional[CacheInvalidateRequest] = None):
+    """Limpar caches após atualização das tabelas (todas ou só as informadas)"""
+    if not tatico_agent:
+        raise HTTPException(status_code=503, detail="Agente não inicializado")
+    
+    tables = request.tables if request else None
+    
+    # Recarregar a réplica antes de limpar, para a próxima consulta já ler os dados novos
+    replica_reloaded = await llama_sql.refresh_replica(tables)
+    return {
+        "success": True,
+        "replica_reloaded": replica_reloaded,
+        "sql_results_removed": llama_sql.invalidate_tables(tables),
+        "answers_removed": tatico_agent.invalidate_cache(tables)
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
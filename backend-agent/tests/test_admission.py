@@ -0,0 +1,157 @@
+"""
+Controle de admissão: a vaga do /webhook/chat/stream volta ao controlador
+mesmo quando o cliente desconecta antes do primeiro trecho
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+import asyncio
+import json
+
+import main
+from agent.admission import AdmissionController
+
+
+class FakeAgent:
+    """TaticoProAgent mínimo: o stream demora a emitir o primeiro evento"""
+
+    async def stream_message(self, user_message, conversation_history=None, session_id=None):
+        await asyncio.sleep(10)
+        yield "token", {"content": "tarde demais"}
+
+
+def _scope(spec_version: str) -> dict:
+    body = json.dumps({"message": "Oi", "session_id": "s1"}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": spec_version},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/webhook/chat/stream",
+        "raw_path": b"/webhook/chat/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    return scope, body
+
+
+async def _call(spec_version: str, send) -> None:
+    scope, body = _scope(spec_version)
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}  # cliente já foi embora
+
+    try:
+        await main.app(scope, receive, send)
+    except Exception:
+        pass  # ClientDisconnect / OSError propagados pelo servidor
+
+
+def _run(spec_version: str, send) -> AdmissionController:
+    controller = AdmissionController(max_in_flight=1, max_queue=0, max_per_session=0)
+    main.tatico_agent, main.admission = FakeAgent(), controller
+    try:
+        asyncio.run(asyncio.wait_for(_call(spec_version, send), timeout=5))
+    finally:
+        main.tatico_agent = main.admission = None
+    return controller
+
+
+def test_stream_disconnect_before_first_chunk_releases_slot():
+    async def send(message):
+        if message["type"] == "http.response.start":
+            await asyncio.sleep(1)  # desconexão chega antes de o gerador ser iterado
+
+    controller = _run("2.0", send)
+    assert controller.admitted == 1
+    assert controller.in_flight == 0
+
+
+def test_stream_broken_socket_releases_slot():
+    async def send(message):
+        raise OSError("connection reset")
+
+    controller = _run("2.4", send)
+    assert controller.admitted == 1
+    assert controller.in_flight == 0
+
+
+def test_anonymous_requests_share_an_address_without_session_limit():
+    controller = AdmissionController(max_in_flight=8, max_queue=0, max_per_session=1)
+
+    async def scenario():
+        tickets = [await controller.acquire("client:10.0.0.1", limit_session=False) for _ in range(3)]
+        assert controller.in_flight == 3
+        for ticket in tickets:
+            ticket.release()
+
+    asyncio.run(scenario())
+    assert controller.in_flight == 0
+    assert controller.shed["session_limit"] == 0
+
+
+def test_batch_is_admitted_as_weighted_unit():
+    controller = AdmissionController(max_in_flight=4, max_queue=4, max_per_session=0)
+    order = []
+
+    async def scenario():
+        batch = await controller.acquire("client:a", weight=3)
+        single = await controller.acquire("client:b")
+        assert controller.in_flight == 4
+
+        async def second_batch():
+            ticket = await controller.acquire("client:c", weight=2)
+            order.append("batch")
+            return ticket
+
+        waiting = asyncio.create_task(second_batch())
+        await asyncio.sleep(0)
+        single.release()  # 1 vaga livre: o lote de peso 2 continua esperando
+        await asyncio.sleep(0)
+        assert order == [] and controller.in_flight == 3
+        batch.release()
+        ticket = await waiting
+        assert order == ["batch"] and controller.in_flight == 2
+        ticket.release()
+
+    asyncio.run(scenario())
+    assert controller.in_flight == 0
+
+
+def test_batch_endpoint_sheds_when_saturated():
+    import httpx
+
+    class BatchAgent:
+        async def process_batch(self, items, max_concurrency):
+            for index, item in enumerate(items):
+                yield index, {"response": "ok", "session_id": item["session_id"] or "s"}
+
+    controller = AdmissionController(max_in_flight=2, max_queue=0, max_per_session=0)
+
+    async def scenario():
+        held = [await controller.acquire("client:x"), await controller.acquire("client:y")]
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            payload = {"requests": [{"message": "Oi"}, {"message": "Tudo bem?"}]}
+            shed = await client.post("/webhook/chat/batch", json=payload)
+            for ticket in held:
+                ticket.release()
+            served = await client.post("/webhook/chat/batch", json=payload)
+        return shed, served
+
+    main.tatico_agent, main.admission = BatchAgent(), controller
+    try:
+        shed, served = asyncio.run(scenario())
+    finally:
+        main.tatico_agent = main.admission = None
+    assert shed.status_code == 503 and "retry-after" in shed.headers
+    assert served.status_code == 200 and len(served.json()["results"]) == 2
+    assert controller.in_flight == 0
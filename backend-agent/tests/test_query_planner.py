@@ -0,0 +1,43 @@
+"""
+Planejador: perguntas que relacionam os times não são divididas por time
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+from agent.query_planner import QueryPlanner
+from agent.router import IntentRouter
+
+ROUTER = IntentRouter(teams=["Flamengo", "Internacional", "Palmeiras", "Bahia"])
+
+
+def _plan(question: str):
+    return QueryPlanner().plan(question, ROUTER.route(question))
+
+
+def test_head_to_head_questions_stay_whole():
+    assert _plan("Qual foi o placar de Flamengo x Palmeiras?") is None
+    assert _plan("Como foi o último jogo do Flamengo contra o Palmeiras?") is None
+
+
+def test_separate_facts_are_split_per_team():
+    plan = _plan("Quantos cartões o Flamengo e o Bahia receberam?")
+    assert [sub.question for sub in plan] == [
+        "Quantos cartões o Flamengo e o Bahia receberam? (considere apenas o Flamengo)",
+        "Quantos cartões o Flamengo e o Bahia receberam? (considere apenas o Bahia)",
+    ]
+
+
+def test_head_to_head_history_reads_confrontos_diretos():
+    plan = _plan("Histórico de confrontos entre Flamengo e Inter e a classificação")
+    assert [sub.label for sub in plan] == ["Confrontos diretos", "Classificação"]
+    assert plan[0].sql == "SELECT * FROM int_confrontos_diretos"
+
+    plan = _plan("Histórico de confrontos entre Flamengo e Palmeiras e a classificação")
+    assert [sub.label for sub in plan] == ["Classificação", "Outros dados"]
+
+
+def test_lineup_facet_needs_mais_utilizados_wording():
+    plan = _plan("Quem são os mais utilizados do Flamengo e do Bahia?")
+    assert [sub.label for sub in plan] == ["Mais utilizados"] and "'Bahia'" in plan[0].sql
+    assert all(sub.sql is None for sub in _plan("Qual a formação do Flamengo e do Bahia?"))
@@ -0,0 +1,22 @@
+"""
+Roteador: apelidos apontam para o nome do time como está no banco
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+from agent.normalize import normalize_question
+from agent.router import IntentRouter
+from benchmarks.fixture import TEAMS
+
+
+def test_aliases_resolve_to_database_team_names():
+    router = IntentRouter(teams=TEAMS)
+    assert router.route("Como está o Galo?").teams == ["Atletico-MG"]
+    assert router.route("E o tricolor paulista?").teams == ["Sao Paulo"]
+    assert router.route("O Vasco venceu?").teams == ["Vasco DA Gama"]
+    assert router.route("E o Peixe?").teams == []  # Santos não está na tabela de times
+
+
+def test_sao_paulo_survives_normalization():
+    assert normalize_question("Próximos jogos do São Paulo") == "proximos jogos sao paulo"
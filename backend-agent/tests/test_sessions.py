@@ -0,0 +1,54 @@
+"""
+Sessões em SQLite: o acesso ao disco roda fora do event loop
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+from types import SimpleNamespace
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.langchain_chat import TaticoProAgent
+from agent.sessions import InMemorySessionStore, SQLiteSessionStore
+
+
+def test_sqlite_session_io_runs_off_the_event_loop(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    agent = SimpleNamespace(sessions=store, history_sync_window=10)
+    agent.get_or_create_session = store.get_or_create
+    loop_threads = set()
+
+    def loaded_in(session_id, client_messages):
+        loop_threads.add(threading.get_ident())
+        return TaticoProAgent._load_session(agent, session_id, client_messages)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        results = await asyncio.gather(*[
+            TaticoProAgent._session_io(agent, loaded_in, f"s{i}", [HumanMessage(content="Oi")])
+            for i in range(4)
+        ])
+        _, history, _ = results[0]
+        await TaticoProAgent._session_io(agent, history.add_messages, [AIMessage(content="Olá!")])
+        return loop_thread, history
+
+    loop_thread, history = asyncio.run(scenario())
+    assert loop_thread not in loop_threads
+    assert [m.content for m in history.messages] == ["Oi", "Olá!"]
+
+    connections = list(store._connections)
+    assert len(connections) > 1  # uma conexão por thread do pool
+    store.close()
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_memory_sessions_stay_on_the_event_loop():
+    assert not InMemorySessionStore.blocking
+    assert SQLiteSessionStore.blocking
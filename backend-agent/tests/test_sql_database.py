@@ -0,0 +1,29 @@
+"""
+TaticoSQLDatabase: com snapshot, o construtor do SQLDatabase não consulta o catálogo
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+from sqlalchemy import event
+
+from agent.cache import TTLCache
+from agent.database import create_sync_engine
+from agent.sql_database import TaticoSQLDatabase
+from benchmarks.fixture import create_fixture
+
+
+def test_snapshot_init_skips_reflection(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fixture.db'}"
+    tables = create_fixture(url)
+    engine = create_sync_engine(url)
+    snapshot = {"tables": TaticoSQLDatabase(engine, TTLCache(8, 60), include_tables=tables).describe_tables()}
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    database = TaticoSQLDatabase(engine, TTLCache(8, 60), snapshot=snapshot, include_tables=tables)
+    assert statements == []
+
+    assert sorted(database.get_usable_table_names()) == sorted(tables)
+    assert database.get_single_table_info("Times_2024") == snapshot["tables"]["Times_2024"]
+    assert database.run_sql('SELECT COUNT(*) FROM "Times_2024"')[1]["result"] == [(20,)]
@@ -0,0 +1,87 @@
+"""
+Biblioteca de SQL verificado: só perguntas de intenção inequívoca usam o
+template, e os próximos jogos vêm do calendário do banco
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+from datetime import date
+
+from agent.router import IntentRouter
+from agent.sql_templates import RoundCalendar, SQLTemplateLibrary
+
+ROUTER = IntentRouter(teams=["Internacional", "Flamengo"])
+
+
+def _template_name(question: str):
+    matched = SQLTemplateLibrary().match(question, ROUTER.route(question))
+    return matched[0].name if matched else None
+
+
+def test_scorer_questions_use_artilheiros_template():
+    assert _template_name("Quem são os artilheiros do Inter?") == "artilheiros"
+    assert _template_name("Quem é o goleador do Flamengo?") == "artilheiros"
+    assert _template_name("Quem dá mais assistências no Internacional?") == "artilheiros"
+
+
+def test_goal_questions_do_not_use_artilheiros_template():
+    assert _template_name("Quantos gols o Inter sofreu?") is None
+    assert _template_name("Quem marcou no campeonato pelo Flamengo?") is None
+    assert _template_name("Quantos gols o artilheiro do Inter fez em casa?") is None
+
+
+def test_lineup_questions_pick_template_by_wording():
+    assert _template_name("Quem são os mais utilizados do Inter?") == "mais_utilizados"
+    assert _template_name("Qual a provável escalação do Flamengo?") == "titulares_provaveis"
+    assert _template_name("Quem são os titulares do Inter?") == "titulares_provaveis"
+    assert _template_name("Qual a formação do Flamengo?") == "formacao_preferida"
+    assert _template_name("Quem foi relacionado no Inter?") is None
+
+
+def test_team_questions_skip_templates_without_team_filter():
+    router = IntentRouter(teams=["Internacional", "Flamengo", "Palmeiras"])
+    library = SQLTemplateLibrary()
+
+    def match(question):
+        return library.match(question, router.route(question))
+
+    template, sql = match("Como o Palmeiras se compara aos outros?")
+    assert template.name == "stats_comparativas" and "'Palmeiras'" in sql
+    assert match("Qual o histórico de confrontos entre Flamengo e Inter?")[0].name == "confrontos_diretos"
+    assert match("Quem venceu mais vezes nos confrontos diretos?")[0].name == "confrontos_diretos"
+    assert match("Qual o retrospecto do Palmeiras?") is None
+
+
+def _calendar(rows):
+    calendar = RoundCalendar()
+    calendar.load(rows)
+    return calendar
+
+
+def test_upcoming_rounds_come_from_pending_fixtures():
+    rows = [(f"Regular Season - {n}", f"2024-11-{n - 10:02d}", "FT" if n <= 35 else "NS") for n in range(30, 39)]
+    calendar = _calendar(rows)
+    assert calendar.upcoming(date(2026, 10, 17)) == (
+        "Regular Season - 36", "Regular Season - 37", "Regular Season - 38"
+    )
+
+    library = SQLTemplateLibrary(calendar=calendar)
+    template, sql = library.match("Quais os próximos jogos do Inter?", ROUTER.route("Quais os próximos jogos do Inter?"))
+    assert template.name == "proximos_jogos" and "'Regular Season - 36'" in sql
+
+
+def test_upcoming_rounds_follow_dates_without_status():
+    rows = [(f"Regular Season - {n}", f"2024-{n:02d}-01", None) for n in range(1, 13)]
+    assert _calendar(rows).upcoming(date(2024, 9, 15)) == (
+        "Regular Season - 10", "Regular Season - 11", "Regular Season - 12"
+    )
+    assert _calendar(rows).upcoming(date(2025, 1, 1)) == ()
+
+
+def test_next_games_without_known_rounds_skip_template():
+    question = "Quais os próximos jogos do Inter?"
+    finished = _calendar([("Regular Season - 38", "2024-12-08", "FT")])
+    assert SQLTemplateLibrary(calendar=finished).match(question, ROUTER.route(question)) is None
+    assert SQLTemplateLibrary().match(question, ROUTER.route(question)) is None
+    assert ROUTER.route("Como o Inter joga?").intents == []
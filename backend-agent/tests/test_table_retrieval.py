@@ -0,0 +1,35 @@
+"""
+Seleção de tabelas: palavras-chave da pergunta completam o embedding local
+
+Uso (dentro de backend-agent/):
+    python -m pytest -q tests
+"""
+
+from agent.cache import TTLCache
+from agent.database import create_sync_engine
+from agent.llama_sql import TABLE_DESCRIPTIONS
+from agent.sql_database import TaticoSQLDatabase
+from agent.table_retrieval import MIN_TOP_K, LocalHashEmbedding, TableSelector
+from benchmarks.fixture import create_fixture
+
+
+def _selector(tmp_path, top_k):
+    url = f"sqlite:///{tmp_path / 'fixture.db'}"
+    tables = create_fixture(url)
+    database = TaticoSQLDatabase(create_sync_engine(url), TTLCache(16, 60), include_tables=tables)
+    return TableSelector(database, TABLE_DESCRIPTIONS, top_k=top_k, embed_model=LocalHashEmbedding())
+
+
+def test_keyword_fallback_and_top_k_floor(tmp_path):
+    selector = _selector(tmp_path, top_k=1)
+    assert selector.top_k == MIN_TOP_K
+
+    placar = [t.table_name for t in selector.retrieve("Qual foi o placar do último jogo do Inter?")]
+    cartoes = [t.table_name for t in selector.retrieve("Quantos cartões o Flamengo levou?")]
+    assert "Resultados_Jogos_2024" in placar
+    assert {"Eventos_Jogos_2024", "Estatisticas_Por_Jogo_2024"} <= set(cartoes)
+
+    selection = selector.last_selection()
+    assert selection["tables"] == cartoes
+    assert selection["schema_tokens_all_tables"] == selector.all_tables_tokens
+    assert 0 < selection["schema_tokens"] < selector.all_tables_tokens